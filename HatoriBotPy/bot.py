@@ -1,32 +1,143 @@
 from __future__ import annotations
 
 import asyncio
-import json
+import hmac
 import logging
 import threading
 import time
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from typing import Dict
+from urllib.parse import parse_qs, urlsplit
 
 import discord
+from discord import app_commands
 from discord.ext import commands
 
 from .config import settings
-from .db import add_currency_for_message, add_currency_for_voice, init_db
+from .db import (
+    DatabaseUnavailable,
+    add_currency_for_message,
+    add_currency_for_voice,
+    close_db,
+    database_health,
+    init_db,
+    replicas,
+)
+from .digest import flush_digests, start_digests
+from .entities import entities
+from .guild_config import guild_configs
+from .interactions import notify_database_unavailable
+from .logs import bind_interaction, bind_log_context, setup_logging
+from .members import MemberResolver, member_cache_options
+from .memory import MEMORY_ACTIONS, memory_report
+from .profiler import ProfilerBusy, profile_from_thread, register_loop
+from .recorder import EventRecorder
+from .runtime import RUNTIME_FAST, apply_runtime_profile, freeze_heap, json_dumps, json_loads
+from .supervisor import supervisor
+from .tracing import http_trace_config, setup_tracing, trace_task, tracing_enabled
+from tasks.scheduler import start_scheduler
 from views.voice import VoiceWelcomeView
 
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("HatoriBotPy")
 
+# Индексы ролей строятся запросом участников у шлюза, одновременно не больше двух гильдий
+ROLE_INDEX_CONCURRENCY = 2
+# Версия приветствий в голосовых каналах; 2 — кнопки с постоянными custom_id
+VOICE_WELCOME_VERSION = 2
+
+
+class HatoriTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Выполняется в той же задаче, что и сама команда, поэтому контекст
+        # логирования распространяется на все вызовы внутри обработчика
+        command = interaction.command
+        name = f"/{command.qualified_name}" if command else None
+        bind_interaction(interaction, name)
+        if name:
+            trace_task(f"command {name}", guild=interaction.guild_id or 0)
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError) -> None:
+        if isinstance(getattr(error, "original", None), DatabaseUnavailable):
+            logger.warning("Команда %s: база данных недоступна (%s)", interaction.command, error.original)
+            await notify_database_unavailable(interaction)
+            return
+        await super().on_error(interaction, error)
+
 
 class _HealthHandler(BaseHTTPRequestHandler):
+    bot: "HatoriBot | None" = None
+
     def do_GET(self) -> None:  # type: ignore[override]
-        self.send_response(200)
+        url = urlsplit(self.path)
+        if url.path.startswith("/debug/"):
+            self._debug(url.path, parse_qs(url.query))
+            return
+        self._reply(200, "Bot is running!\n")
+
+    def _reply(self, status: int, body: str) -> None:
+        payload = body.encode("utf-8")
+        self.send_response(status)
         self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
         self.end_headers()
-        self.wfile.write(b"Bot is running!\n")
+        self.wfile.write(payload)
+
+    def _authorized(self) -> bool:
+        # Отладочные точки доступны только при заданном DEBUG_TOKEN
+        token = settings.DEBUG_TOKEN
+        if not token:
+            return False
+        header = self.headers.get("Authorization", "")
+        return hmac.compare_digest(header.encode(), f"Bearer {token}".encode())
+
+    def _debug(self, path: str, query: Dict[str, list[str]]) -> None:
+        if not self._authorized():
+            self._reply(404, "Not found\n")
+            return
+        if path == "/debug/profile":
+            try:
+                seconds = float(query.get("seconds", ["10"])[0])
+            except ValueError:
+                self._reply(400, "seconds must be a number\n")
+                return
+            try:
+                result = profile_from_thread(seconds)
+            except ProfilerBusy:
+                self._reply(409, "Profile already running\n")
+                return
+            except Exception as e:
+                self._reply(503, f"{e}\n")
+                return
+            self._reply(200, result.collapsed())
+            return
+        if path == "/debug/database":
+            self._reply(200, json_dumps(database_health()) + "\n")
+            return
+        if path == "/debug/memory":
+            self._memory(query.get("action", ["report"])[0])
+            return
+        self._reply(404, "Not found\n")
+
+    def _memory(self, action: str) -> None:
+        bot = self.bot
+        if bot is None or action not in MEMORY_ACTIONS and action != "report":
+            self._reply(404, "Not found\n")
+            return
+
+        # Структуры бота читаются в потоке цикла событий, а не в потоке HTTP-сервера
+        async def run() -> str:
+            if action == "report":
+                return memory_report(bot)
+            return MEMORY_ACTIONS[action]()
+
+        try:
+            body = asyncio.run_coroutine_threadsafe(run(), bot.loop).result(timeout=30)
+        except Exception as e:
+            self._reply(503, f"{e}\n")
+            return
+        self._reply(200, body + "\n")
 
     def log_message(self, format: str, *args: object) -> None:  # noqa: A003
         return
@@ -51,19 +162,63 @@ class HatoriBot(commands.Bot):
         intents.members = True
         intents.reactions = True
         intents.voice_states = True
-        super().__init__(command_prefix=commands.when_mentioned_or("!"), intents=intents)
+        super().__init__(
+            command_prefix=commands.when_mentioned_or("!"),
+            intents=intents,
+            tree_cls=HatoriTree,
+            owner_ids=set(settings.OWNER_IDS),
+            http_trace=http_trace_config() if tracing_enabled() else None,
+            **member_cache_options(settings.MEMBER_CACHE_MODE, intents),
+        )
+
+        defaults = guild_configs.defaults
+        self.member_resolver = MemberResolver(
+            settings.MEMBER_CACHE_MODE,
+            (defaults.admin_role_id, defaults.manager_role_id),
+        )
+        guild_configs.on_change(
+            lambda guild_id, config: self.member_resolver.track_roles(
+                guild_id, (config.admin_role_id, config.manager_role_id)
+            )
+        )
 
-        self._message_ts: Dict[int, float] = {}
+        # Откат наград за сообщения считается в каждой гильдии отдельно
+        self._message_ts: Dict[tuple[int, int], float] = {}
         self._voice_reward_tasks: Dict[int, asyncio.Task[None]] = {}
         self._voice_channels_file = Path("data") / "channels.json"
         self._voice_message_channels = self._load_voice_channels()
+        self._scheduler_task: asyncio.Task[None] | None = None
+        self._voice_welcome_view: VoiceWelcomeView | None = None
+
+        self._recorder: EventRecorder | None = None
+        if settings.RECORD_EVENTS_FILE:
+            self._recorder = EventRecorder(settings.RECORD_EVENTS_FILE)
+            self._recorder.install(self._connection)
 
     async def setup_hook(self) -> None:
+        register_loop()
+        supervisor.set_limit("members.role_index", ROLE_INDEX_CONCURRENCY)
         await init_db()
+        if replicas.enabled:
+            supervisor.spawn(replicas.monitor(), name="db-replica-monitor", category="db")
+        try:
+            await guild_configs.load_all()
+        except DatabaseUnavailable:
+            logger.warning("Настройки гильдий не загружены, используются значения из окружения")
+        supervisor.spawn(guild_configs.watch(), name="guild-config-watch", category="guild_config")
+        self.add_view(VoiceWelcomeView())
+        # Остановленная копия только рендерит кнопки в приветствиях и не
+        # регистрируется на каждое сообщение: нажатия обрабатывает постоянное представление
+        self._voice_welcome_view = VoiceWelcomeView()
+        self._voice_welcome_view.stop()
         for ext in (
             "HatoriBotPy.cogs.balance",
             "HatoriBotPy.cogs.custom_game",
             "HatoriBotPy.cogs.shop",
+            "HatoriBotPy.cogs.admin",
+            "HatoriBotPy.cogs.matchmaking",
+            "HatoriBotPy.cogs.stats",
+            "HatoriBotPy.cogs.complaints",
         ):
             try:
                 await self.load_extension(ext)
@@ -71,9 +226,70 @@ class HatoriBot(commands.Bot):
             except Exception:
                 logger.exception("Не удалось загрузить расширение %s", ext)
         await self.sync_commands()
+        self._scheduler_task = start_scheduler(self)
+        start_digests()
+
+    async def close(self) -> None:
+        # Задачи останавливаются до закрытия соединения: выдаче покупок еще нужен REST
+        await supervisor.shutdown()
+        await flush_digests()
+        await super().close()
+        # Хранилище закрывается последним: SQLite дописывает очередь записей
+        await close_db()
+        if self._recorder is not None:
+            self._recorder.close()
+            logger.info("Записано событий шлюза: %d", self._recorder.recorded)
 
     async def on_ready(self) -> None:
         logger.info("Вошел в систему как %s (%s)", self.user, self.user.id if self.user else "-" )
+        await entities.resolve(self)
+        if settings.RUNTIME_PROFILE == RUNTIME_FAST:
+            freeze_heap()
+        if self.member_resolver.lean:
+            for guild in self.guilds:
+                supervisor.spawn(
+                    self.member_resolver.ensure_role_index(guild),
+                    name=f"role-index-{guild.id}",
+                    category="members.role_index",
+                )
+
+    async def on_interaction(self, interaction: discord.Interaction) -> None:
+        if self.member_resolver.lean and isinstance(interaction.user, discord.Member):
+            self.member_resolver.remember(interaction.user)
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        if self.member_resolver.lean:
+            self.member_resolver.remember(after)
+
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent) -> None:
+        self.member_resolver.forget(payload.guild_id, payload.user.id)
+
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        entities.guild_available(guild)
+
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        entities.guild_available(guild)
+
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        entities.guild_removed(guild)
+
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel) -> None:
+        entities.channel_changed(channel)
+
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel) -> None:
+        entities.channel_changed(after)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        entities.channel_deleted(channel)
+
+    async def on_guild_role_create(self, role: discord.Role) -> None:
+        entities.role_changed(role)
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role) -> None:
+        entities.role_changed(after)
+
+    async def on_guild_role_delete(self, role: discord.Role) -> None:
+        entities.role_deleted(role)
 
     async def sync_commands(self) -> None:
         try:
@@ -95,16 +311,19 @@ class HatoriBot(commands.Bot):
     async def on_message(self, message: discord.Message) -> None:
         if message.author.bot or message.guild is None:
             return
+        bind_log_context(message.guild.id, message.author.id, "on_message")
 
         now = time.monotonic()
         uid = message.author.id
-        last = self._message_ts.get(uid, 0.0)
-        cooldown = settings.MESSAGE_COOLDOWN_MS / 1000.0
+        key = (message.guild.id, uid)
+        last = self._message_ts.get(key, 0.0)
+        config = guild_configs.get(message.guild.id)
+        cooldown = config.message_cooldown_ms / 1000.0
 
         if now - last >= cooldown:
             try:
-                await add_currency_for_message(uid, settings.MESSAGE_REWARD_AMOUNT)
-                self._message_ts[uid] = now
+                await add_currency_for_message(uid, config.message_reward_amount)
+                self._message_ts[key] = now
             except Exception:
                 logger.exception("Не удалось добавить валюту за сообщение")
 
@@ -118,6 +337,7 @@ class HatoriBot(commands.Bot):
     ) -> None:
         if member.bot or member.guild is None:
             return
+        bind_log_context(member.guild.id, member.id, "on_voice_state_update")
 
         new_channel = after.channel
         old_channel = before.channel
@@ -134,14 +354,18 @@ class HatoriBot(commands.Bot):
         await self._send_voice_welcome(new_channel)
 
         if member.id not in self._voice_reward_tasks:
-            self._start_voice_reward(member.id)
+            self._start_voice_reward(member.guild.id, member.id)
 
     def _load_voice_channels(self) -> set[int]:
         try:
             if self._voice_channels_file.is_file():
-                with self._voice_channels_file.open("r", encoding="utf-8") as fp:
-                    data = json.load(fp)
-                    return {int(cid) for cid in data}
+                with self._voice_channels_file.open("rb") as fp:
+                    data = json_loads(fp.read())
+                # В старых приветствиях кнопки без постоянных custom_id не отвечают:
+                # список другой версии сбрасывается, и приветствия отправляются заново
+                if isinstance(data, dict) and data.get("version") == VOICE_WELCOME_VERSION:
+                    return {int(cid) for cid in data["channels"]}
+                logger.info("Приветствия в голосовых каналах устарели и будут отправлены заново")
         except Exception:
             logger.exception("Не удалось загрузить список обработанных голосовых каналов")
         return set()
@@ -150,7 +374,7 @@ class HatoriBot(commands.Bot):
         try:
             self._voice_channels_file.parent.mkdir(parents=True, exist_ok=True)
             with self._voice_channels_file.open("w", encoding="utf-8") as fp:
-                json.dump(sorted(self._voice_message_channels), fp, ensure_ascii=False)
+                fp.write(json_dumps({"version": VOICE_WELCOME_VERSION, "channels": sorted(self._voice_message_channels)}))
         except Exception:
             logger.exception("Не удалось сохранить список обработанных голосовых каналов")
 
@@ -159,42 +383,45 @@ class HatoriBot(commands.Bot):
         if channel_id is None or channel_id in self._voice_message_channels:
             return
 
-        view = VoiceWelcomeView()
         try:
             await channel.send(
                 "Добро пожаловать в голосовой канал! Выберите действие ниже:",
-                view=view,
+                view=self._voice_welcome_view,
             )
             self._voice_message_channels.add(channel_id)
             self._save_voice_channels()
         except Exception:
             logger.exception("Не удалось отправить приветствие в голосовой канал")
 
-    def _start_voice_reward(self, user_id: int) -> None:
+    def _start_voice_reward(self, guild_id: int, user_id: int) -> None:
         if user_id in self._voice_reward_tasks:
             return
 
         async def runner() -> None:
-            interval = max(1, int(settings.VOICE_REWARD_INTERVAL))
-            amount = settings.VOICE_REWARD_AMOUNT
             try:
+                amount = guild_configs.get(guild_id).voice_reward_amount
                 await add_currency_for_voice(user_id, amount)
-                logger.info("Начислено %s валюты за вход в голосовой канал", amount)
+                logger.debug("Начислено %s валюты пользователю %s за вход в голосовой канал", amount, user_id)
                 while True:
-                    await asyncio.sleep(interval)
+                    # Настройки гильдии читаются на каждом шаге: изменения действуют без перезахода
+                    await asyncio.sleep(max(1, guild_configs.get(guild_id).voice_reward_interval))
+                    amount = guild_configs.get(guild_id).voice_reward_amount
                     await add_currency_for_voice(user_id, amount)
                     logger.debug(
                         "Начислено %s валюты пользователю %s за активность в голосе",
                         amount,
                         user_id,
                     )
-            except asyncio.CancelledError:
-                raise
-            except Exception:
-                logger.exception("Не удалось начислить валюту за активность в голосе")
+            finally:
+                # После сбоя следующий вход в голос запустит начисление заново
+                if self._voice_reward_tasks.get(user_id) is asyncio.current_task():
+                    del self._voice_reward_tasks[user_id]
 
-        task = self.loop.create_task(runner())
-        self._voice_reward_tasks[user_id] = task
+        self._voice_reward_tasks[user_id] = supervisor.spawn(
+            runner(),
+            name=f"voice-reward-{user_id}",
+            category="voice.reward",
+        )
 
     def _stop_voice_reward(self, user_id: int) -> None:
         task = self._voice_reward_tasks.pop(user_id, None)
@@ -204,9 +431,14 @@ class HatoriBot(commands.Bot):
 
 
 def main() -> None:
+    setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_FILE, settings.LOG_DEBUG_RATE)
+    apply_runtime_profile(settings.RUNTIME_PROFILE)
+    setup_tracing(settings.TRACE_EXPORTER, settings.TRACE_SAMPLE_RATE, settings.TRACE_FILE, settings.TRACE_OTLP_URL)
     bot = HatoriBot()
+    _HealthHandler.bot = bot
     _start_keepalive_server()
-    bot.run(settings.DISCORD_TOKEN)
+    # Логи discord.py идут через ту же очередь, свой обработчик ему не нужен
+    bot.run(settings.DISCORD_TOKEN, log_handler=None)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import csv
+import dataclasses
+import io
+import re
+import tempfile
+from typing import IO, Iterator, Optional
+
+import aiohttp
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from ..db import (
+    EXPORT_COLUMNS,
+    IMPORT_MODE_ADD,
+    IMPORT_MODE_SET,
+    database_health,
+    export_table_csv,
+    import_balances,
+)
+from ..guild_config import GUILD_CONFIG_LABELS, guild_configs
+from ..interactions import handler_stats
+from ..memory import MEMORY_ACTIONS, memory_report
+from ..permissions import OWNER_ONLY, is_admin, is_owner
+from ..profiler import MAX_PROFILE_SECONDS, ProfilerBusy, is_running, profile_event_loop
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def _read_balance_rows(fp: IO[bytes]) -> Iterator[tuple[int, str, int]]:
+    reader = csv.reader(io.TextIOWrapper(fp, encoding="utf-8-sig", newline=""))
+    for line, row in enumerate(reader, start=1):
+        if not row or not "".join(row).strip():
+            continue
+        if len(row) < 2:
+            raise ValueError(f"Строка {line}: ожидается user_id,amount")
+        user_id, amount = row[0].strip(), row[1].strip()
+        if line == 1 and not amount.lstrip("-").isdigit():
+            continue
+        if not user_id.isdigit():
+            raise ValueError(f"Строка {line}: некорректный user_id {user_id!r}")
+        try:
+            yield line, user_id, int(amount)
+        except ValueError:
+            raise ValueError(f"Строка {line}: некорректная сумма {amount!r}") from None
+
+
+class Admin(commands.Cog):
+    admin = app_commands.Group(
+        name="admin",
+        description="Администрирование бота",
+        guild_only=True,
+        default_permissions=discord.Permissions(administrator=True),
+    )
+
+    def __init__(self, bot: commands.Bot) -> None:
+        self.bot = bot
+
+    @admin.command(name="export", description="Выгрузить таблицу в CSV")
+    @app_commands.describe(table="Таблица для выгрузки")
+    @app_commands.choices(table=[app_commands.Choice(name=name, value=name) for name in EXPORT_COLUMNS])
+    async def export(self, interaction: discord.Interaction, table: app_commands.Choice[str]) -> None:
+        if not await is_owner(self.bot, interaction.user):
+            await interaction.response.send_message(OWNER_ONLY, ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        with tempfile.TemporaryFile() as fp:
+            await export_table_csv(table.value, fp)
+            size = fp.tell()
+            limit = interaction.guild.filesize_limit if interaction.guild else discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+            if size > limit:
+                await interaction.followup.send(
+                    f"Выгрузка занимает {size // 1024} КБ и превышает лимит вложений сервера.",
+                    ephemeral=True,
+                )
+                return
+            fp.seek(0)
+            await interaction.followup.send(
+                f"Выгрузка таблицы `{table.value}`",
+                file=discord.File(fp, filename=f"{table.value}.csv"),
+                ephemeral=True,
+            )
+
+    @admin.command(name="import", description="Массово изменить балансы из CSV (user_id,amount)")
+    @app_commands.describe(
+        file="CSV-файл со столбцами user_id,amount",
+        mode="add — прибавить сумму к балансу, set — установить баланс",
+    )
+    @app_commands.choices(
+        mode=[
+            app_commands.Choice(name="add", value=IMPORT_MODE_ADD),
+            app_commands.Choice(name="set", value=IMPORT_MODE_SET),
+        ]
+    )
+    async def import_(
+        self,
+        interaction: discord.Interaction,
+        file: discord.Attachment,
+        mode: app_commands.Choice[str],
+    ) -> None:
+        if not await is_owner(self.bot, interaction.user):
+            await interaction.response.send_message(OWNER_ONLY, ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        with tempfile.TemporaryFile() as fp:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(file.url) as resp:
+                    if resp.status != 200:
+                        await interaction.followup.send("Не удалось скачать файл.", ephemeral=True)
+                        return
+                    async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        fp.write(chunk)
+            fp.seek(0)
+
+            try:
+                affected = await import_balances(
+                    _read_balance_rows(fp),
+                    mode=mode.value,
+                    ref=f"import:{interaction.id}",
+                )
+            except ValueError as e:
+                await interaction.followup.send(f"Импорт отменен: {e}", ephemeral=True)
+                return
+
+        await interaction.followup.send(f"✅ Балансы обновлены у {affected} пользователей.", ephemeral=True)
+
+    @admin.command(name="config", description="Настройки этого сервера")
+    @app_commands.describe(
+        key="Настройка; без нее показываются все",
+        value="Число, упоминание или id; пусто — вернуть значение по умолчанию",
+    )
+    @app_commands.choices(
+        key=[app_commands.Choice(name=label, value=name) for name, label in GUILD_CONFIG_LABELS.items()]
+    )
+    async def config(
+        self,
+        interaction: discord.Interaction,
+        key: Optional[app_commands.Choice[str]] = None,
+        value: Optional[str] = None,
+    ) -> None:
+        if not is_admin(interaction.user) or interaction.guild_id is None:
+            await interaction.response.send_message("Недостаточно прав.", ephemeral=True)
+            return
+
+        config = guild_configs.get(interaction.guild_id)
+        if key is not None:
+            parsed: Optional[int] = None
+            if value:
+                # Из упоминаний <#id> и <@&id> берется только число
+                digits = re.sub(r"\D", "", value)
+                if not digits:
+                    await interaction.response.send_message("Значение должно быть числом.", ephemeral=True)
+                    return
+                parsed = int(digits)
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            config = await guild_configs.update(interaction.guild_id, key.value, parsed)
+
+        embed = discord.Embed(title="Настройки сервера", color=discord.Color.blurple())
+        for field in dataclasses.fields(config):
+            current = getattr(config, field.name)
+            if current is None:
+                shown = "—"
+            elif field.name.endswith("_role_id"):
+                shown = f"<@&{current}>"
+            elif field.name.endswith("_channel_id"):
+                shown = f"<#{current}>"
+            else:
+                shown = str(current)
+            embed.add_field(name=GUILD_CONFIG_LABELS[field.name], value=shown)
+        if interaction.response.is_done():
+            await interaction.followup.send(embed=embed, ephemeral=True)
+        else:
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @admin.command(name="interactions", description="Статистика обработчиков кнопок и форм")
+    async def interactions(self, interaction: discord.Interaction) -> None:
+        if not await is_owner(self.bot, interaction.user):
+            await interaction.response.send_message(OWNER_ONLY, ephemeral=True)
+            return
+        if not handler_stats:
+            await interaction.response.send_message("Обработчики еще не вызывались.", ephemeral=True)
+            return
+
+        embed = discord.Embed(title="Обработчики взаимодействий", color=discord.Color.blurple())
+        for name, stats in sorted(handler_stats.items(), key=lambda item: item[1].max_time, reverse=True)[:25]:
+            embed.add_field(
+                name=name,
+                value=(
+                    f"Вызовов: {stats.calls}, отложено: {stats.deferred} "
+                    f"({stats.deferred / stats.calls:.0%}), ошибок: {stats.failures}\n"
+                    f"Среднее: {stats.average_time * 1000:.0f} мс, максимум: {stats.max_time * 1000:.0f} мс"
+                ),
+                inline=False,
+            )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @admin.command(name="database", description="Состояние подключения к базе: автомат защиты и повторы")
+    async def database(self, interaction: discord.Interaction) -> None:
+        if not await is_owner(self.bot, interaction.user):
+            await interaction.response.send_message(OWNER_ONLY, ephemeral=True)
+            return
+
+        health = database_health()
+        color = discord.Color.green() if health["breaker"] == "closed" else discord.Color.red()
+        embed = discord.Embed(title="База данных", color=color)
+        embed.add_field(name="Автомат", value=health["breaker"])
+        embed.add_field(name="Сбоев подряд", value=str(health["consecutive_failures"]))
+        embed.add_field(name="Размыканий", value=str(health["times_opened"]))
+        if health["retry_after"]:
+            embed.add_field(name="Пробный вызов через", value=f"{health['retry_after']:.0f} с")
+        embed.add_field(name="Отложенных наград", value=str(health["deferred_rewards"]))
+        if health["replicas"]:
+            replica_lines = [
+                f"{replica['name']}: "
+                + (f"отставание {replica['lag']} с" if replica["healthy"] else "исключена")
+                + f", чтений {replica['reads']}, сбоев {replica['failures']}"
+                for replica in health["replicas"]
+            ]
+            replica_lines.append(
+                f"В основной базе: {health['primary_reads']}, после записи: {health['pinned_reads']}, "
+                f"после сбоя реплики: {health['fallbacks']}"
+            )
+            embed.add_field(name="Реплики", value="\n".join(replica_lines), inline=False)
+        calls = sorted(health["calls"].items(), key=lambda item: item[1]["failures"] + item[1]["retries"], reverse=True)
+        lines = [
+            f"{name:<22} {stats['calls']:>7} {stats['retries']:>5} {stats['timeouts']:>5} "
+            f"{stats['failures']:>5} {stats['rejected']:>6} {stats['fallbacks']:>5}"
+            for name, stats in calls[:15]
+        ]
+        if lines:
+            header = f"{'функция':<22} {'вызовы':>7} {'повт':>5} {'срок':>5} {'сбой':>5} {'отказ':>6} {'запас':>5}"
+            embed.description = "```\n" + "\n".join([header, *lines]) + "\n```"
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @admin.command(name="profile", description="Снять профиль CPU цикла событий")
+    @app_commands.describe(seconds="Длительность профилирования в секундах")
+    async def profile(
+        self,
+        interaction: discord.Interaction,
+        seconds: app_commands.Range[int, 1, MAX_PROFILE_SECONDS] = 10,
+    ) -> None:
+        if not await is_owner(self.bot, interaction.user):
+            await interaction.response.send_message(OWNER_ONLY, ephemeral=True)
+            return
+        if is_running():
+            await interaction.response.send_message("Профилирование уже выполняется.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            result = await profile_event_loop(seconds)
+        except ProfilerBusy:
+            await interaction.followup.send("Профилирование уже выполняется.", ephemeral=True)
+            return
+
+        lines = [f"{share:6.1%} {count:>6}  {frame}"[:180] for frame, count, share in result.top()]
+        report = "\n".join(lines) or "Выборок нет."
+        content = f"Выборок ({result.mode}): {result.samples} за {result.seconds:.1f} с\n```\n{report[:1800]}\n```"
+        await interaction.followup.send(
+            content,
+            file=discord.File(result.path, filename=result.path.name) if result.path else discord.utils.MISSING,
+            ephemeral=True,
+        )
+
+    @admin.command(name="memory", description="Память бота: размеры структур, задачи и снимки tracemalloc")
+    @app_commands.describe(action="report — отчет, snapshot — базовый снимок, diff — рост с момента снимка")
+    @app_commands.choices(
+        action=[
+            app_commands.Choice(name="report", value="report"),
+            app_commands.Choice(name="snapshot", value="snapshot"),
+            app_commands.Choice(name="diff", value="diff"),
+            app_commands.Choice(name="stop", value="stop"),
+        ]
+    )
+    async def memory(self, interaction: discord.Interaction, action: str = "report") -> None:
+        if not await is_owner(self.bot, interaction.user):
+            await interaction.response.send_message(OWNER_ONLY, ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        report = memory_report(self.bot) if action == "report" else MEMORY_ACTIONS[action]()
+        if len(report) <= 1900:
+            await interaction.followup.send(f"```\n{report}\n```", ephemeral=True)
+            return
+        await interaction.followup.send(
+            file=discord.File(io.BytesIO(report.encode("utf-8")), filename=f"memory-{action}.txt"),
+            ephemeral=True,
+        )
+
+
+async def setup(bot: commands.Bot) -> None:
+    await bot.add_cog(Admin(bot))
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from ..db import DatabaseUnavailable
+from ..interactions import notify_database_unavailable
+from ..permissions import is_moderator
+from views.complaints import ComplaintsPageView, build_complaints_embed, fetch_complaints_page
+
+
+class Complaints(commands.Cog):
+    complaints = app_commands.Group(
+        name="complaints",
+        description="Жалобы пользователей",
+        guild_only=True,
+        default_permissions=discord.Permissions(manage_messages=True),
+    )
+
+    def __init__(self, bot: commands.Bot) -> None:
+        self.bot = bot
+
+    @complaints.command(name="search", description="Найти жалобы по тексту")
+    @app_commands.describe(query="Слова для поиска, можно в кавычках и с минусом", author="Автор жалобы")
+    async def search(
+        self,
+        interaction: discord.Interaction,
+        query: app_commands.Range[str, 1, 200],
+        author: Optional[discord.User] = None,
+    ) -> None:
+        if interaction.guild_id is None or not is_moderator(interaction.user):
+            await interaction.response.send_message("Недостаточно прав.", ephemeral=True)
+            return
+
+        author_id = author.id if author else None
+        try:
+            rows, has_more = await fetch_complaints_page(interaction.guild_id, query, author_id)
+        except DatabaseUnavailable:
+            await notify_database_unavailable(interaction)
+            return
+
+        embed = build_complaints_embed(query, rows, 1)
+        if has_more:
+            view = ComplaintsPageView(interaction.guild_id, query, author_id, rows[-1]["id"], interaction.user.id)
+            await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+        else:
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot: commands.Bot) -> None:
+    await bot.add_cog(Complaints(bot))
@@ -1,25 +1,34 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 import random
 from dataclasses import dataclass, field
-from typing import Dict, Optional, Sequence, Set
+from typing import Any, Dict, Optional, Sequence, Set
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 
-from ..config import settings
 from ..db import (
-    add_currency_for_message,
-    clear_bets_for_game,
+    LEDGER_PARTICIPATION,
+    add_currency,
     get_bets_for_game,
-    get_user_balance,
-    set_user_balance,
+    get_player_ratings,
+    record_game_result,
+    record_game_start,
+    refund_bets,
 )
-from ..utils import get_team_names
+from ..entities import entities
+from ..permissions import is_game_manager
+from ..supervisor import supervisor
+from ..teams import DEFAULT_RATING, balance_teams, rating_delta
+from ..tracing import UNSAMPLED, span, start_span, traced, use_span
+from ..utils import game_key, get_team_names
 from views.betting import BetView, WinnerView
 
+logger = logging.getLogger("HatoriBotPy.custom_game")
+
 VALORANT_MAPS = [
     {
         "name": "Ascent",
@@ -82,7 +91,11 @@ class GameSession:
     manager_id: int
     team_names: tuple[str, str]
     voice_channel_id: Optional[int]
+    guild_id: Optional[int] = None
     participants: Set[int] = field(default_factory=set)
+    team_one: list[int] = field(default_factory=list)
+    team_two: list[int] = field(default_factory=list)
+    ratings: Dict[int, float] = field(default_factory=dict)
     recruitment_task: Optional[asyncio.Task] = None
     recruitment_view: Optional["RecruitmentView"] = None
     bets_open: bool = False
@@ -95,6 +108,8 @@ class GameSession:
     game_close_task: Optional[asyncio.Task] = None
     winner_view_message_id: Optional[int] = None
     winner_view: Optional[WinnerView] = None
+    # Корневой спан жизненного цикла игры: от набора до расчета ставок
+    trace: Any = UNSAMPLED
 
 
 class RecruitmentView(discord.ui.View):
@@ -117,7 +132,7 @@ class RecruitmentView(discord.ui.View):
             return False
         if interaction.user.id == self.initiator_id:
             return True
-        return self.cog._is_manager(interaction.user)
+        return is_game_manager(interaction.user)
 
     @discord.ui.button(label="Завершить набор", style=discord.ButtonStyle.danger)
     async def stop(self, interaction: discord.Interaction, _: discord.ui.Button) -> None:
@@ -141,17 +156,10 @@ class CustomGame(commands.Cog):
         self.sessions: Dict[int, GameSession] = {}
         self.channel_index: Dict[int, int] = {}
 
-    def _is_manager(self, member: discord.Member) -> bool:
-        manager_role = settings.CUSTOM_GAME_MANAGER_ROLE_ID
-        if manager_role and any(role.id == manager_role for role in member.roles):
-            return True
-        admin_role = settings.ADMIN_ROLE_ID
-        return bool(admin_role and any(role.id == admin_role for role in member.roles))
-
     @app_commands.command(name="customgame", description="Запустить набор на кастомную игру")
     @app_commands.describe(game="Название игры (Valorant, Dota 2, LoL, CS)")
     async def customgame(self, interaction: discord.Interaction, game: str) -> None:
-        if not isinstance(interaction.user, discord.Member) or not self._is_manager(interaction.user):
+        if not is_game_manager(interaction.user):
             await interaction.response.send_message("Недостаточно прав.", ephemeral=True)
             return
 
@@ -181,8 +189,10 @@ class CustomGame(commands.Cog):
             manager_id=interaction.user.id,
             team_names=team_names,
             voice_channel_id=voice_channel_id,
+            guild_id=interaction.guild_id,
         )
         session.game_id = f"{channel.id}:{message.id}"
+        session.trace = start_span("game.session", root=True, game=game, game_id=session.game_id)
         session.recruitment_view = view
 
         view.attach(message.id)
@@ -190,7 +200,11 @@ class CustomGame(commands.Cog):
         self.sessions[message.id] = session
         self.channel_index[channel.id] = message.id
 
-        session.recruitment_task = self.bot.loop.create_task(self._auto_close(session))
+        session.recruitment_task = supervisor.spawn(
+            self._auto_close(session),
+            name=f"game-recruitment-{session.game_id}",
+            category="game.timer",
+        )
 
         await interaction.followup.send("Набор запущен. Реагируйте на 🎮, чтобы участвовать.", ephemeral=True)
 
@@ -204,6 +218,10 @@ class CustomGame(commands.Cog):
     async def finish_recruitment(self, session: GameSession, interaction: Optional[discord.Interaction]) -> None:
         if session.finished:
             return
+        with span("game.finish_recruitment", parent=session.trace, participants=len(session.participants)):
+            await self._finish_recruitment(session)
+
+    async def _finish_recruitment(self, session: GameSession) -> None:
         session.finished = True
 
         if session.recruitment_task:
@@ -240,16 +258,64 @@ class CustomGame(commands.Cog):
             return
 
         random.shuffle(participants)
-        limited_participants = participants[:MAX_PARTICIPANTS]
+        await self._launch_game(session, channel, participants[:MAX_PARTICIPANTS])
+
+    async def start_lobby(
+        self,
+        game: str,
+        channel: discord.TextChannel,
+        participants: Sequence[int],
+        manager_id: int,
+        voice_channel_id: Optional[int] = None,
+        ratings: Optional[Dict[int, float]] = None,
+    ) -> GameSession:
+        """Запускает распределение и ставки для готового лобби из очереди подбора."""
+        team_names = tuple(get_team_names(game))
+        message = await channel.send(
+            embed=discord.Embed(
+                title=f"Лобби {game} собрано",
+                description=self._format_mentions(participants),
+                color=discord.Color.blue(),
+            )
+        )
+        session = GameSession(
+            game=game,
+            channel_id=channel.id,
+            message_id=message.id,
+            manager_id=manager_id,
+            team_names=team_names,
+            voice_channel_id=voice_channel_id,
+            guild_id=channel.guild.id,
+            participants=set(participants),
+            finished=True,
+        )
+        session.game_id = f"{channel.id}:{message.id}"
+        session.trace = start_span("game.session", root=True, game=game, game_id=session.game_id, source="queue")
+        if ratings:
+            session.ratings = dict(ratings)
+        self.sessions[message.id] = session
+        with use_span(session.trace):
+            await self._launch_game(session, channel, list(participants))
+        return session
 
+    @traced("game.launch")
+    async def _launch_game(
+        self,
+        session: GameSession,
+        channel: discord.TextChannel,
+        limited_participants: list[int],
+    ) -> None:
         for user_id in limited_participants:
             try:
-                await add_currency_for_message(user_id, PARTICIPATION_REWARD)
+                await add_currency(user_id, PARTICIPATION_REWARD, LEDGER_PARTICIPATION, session.game_id)
             except Exception:
                 continue
 
-        team_one = limited_participants[::2]
-        team_two = limited_participants[1::2]
+        team_one, team_two = await self._split_teams(session, limited_participants)
+        try:
+            await record_game_start(session.game_id, game_key(session.game), team_one, team_two)
+        except Exception:
+            logger.exception("Не удалось сохранить состав игры %s", session.game_id)
 
         map_info = random.choice(VALORANT_MAPS) if session.game.lower() == "valorant" else None
         distribution_embed = self._build_distribution_embed(session, team_one, team_two, map_info)
@@ -259,6 +325,45 @@ class CustomGame(commands.Cog):
 
         await self._start_betting(session, channel)
 
+    async def _split_teams(self, session: GameSession, participants: Sequence[int]) -> tuple[list[int], list[int]]:
+        if not all(uid in session.ratings for uid in participants):
+            try:
+                stored = await get_player_ratings(game_key(session.game), participants)
+            except Exception:
+                logger.exception("Не удалось загрузить рейтинги игроков")
+                stored = {}
+            session.ratings = {uid: stored.get(str(uid), DEFAULT_RATING) for uid in participants}
+
+        first, second = balance_teams([session.ratings[uid] for uid in participants])
+        session.team_one = [participants[i] for i in first]
+        session.team_two = [participants[i] for i in second]
+        return session.team_one, session.team_two
+
+    async def _record_result(self, session: GameSession, winning_team: Optional[int]) -> bool:
+        """Возвращает ``True``, только если исход записан этим вызовом."""
+        if not session.team_one:
+            return False
+        changes = self._rating_changes(session, winning_team) if winning_team is not None else {}
+        try:
+            # Рейтинги пишутся в одной транзакции с исходом, поэтому повтор
+            # после потерянного ответа или сбоя не применяет их второй раз
+            return await record_game_result(session.game_id, winning_team, game_key(session.game), changes)
+        except Exception:
+            logger.exception("Не удалось сохранить результат игры %s", session.game_id)
+            return False
+
+    def _rating_changes(self, session: GameSession, winning_team: int) -> Dict[str, float]:
+        if not session.team_one or not session.team_two:
+            return {}
+        delta = rating_delta(
+            [session.ratings.get(uid, DEFAULT_RATING) for uid in session.team_one],
+            [session.ratings.get(uid, DEFAULT_RATING) for uid in session.team_two],
+            winning_team,
+        )
+        changes = {str(uid): delta for uid in session.team_one}
+        changes.update({str(uid): -delta for uid in session.team_two})
+        return changes
+
     async def _start_betting(self, session: GameSession, channel: discord.TextChannel) -> None:
         async def _bet_callback(_: discord.Interaction, __: int, ___: int) -> None:
             await self._update_bets_summary(session)
@@ -290,27 +395,38 @@ class CustomGame(commands.Cog):
 
         await self._update_bets_summary(session)
 
-        session.bet_close_task = self.bot.loop.create_task(self._auto_close_bets(session, channel))
+        session.bet_close_task = supervisor.spawn(
+            self._auto_close_bets(session, channel),
+            name=f"game-close-bets-{session.game_id}",
+            category="game.timer",
+        )
         if session.game_close_task:
             session.game_close_task.cancel()
-        session.game_close_task = self.bot.loop.create_task(self._auto_close_game(session))
+        session.game_close_task = supervisor.spawn(
+            self._auto_close_game(session),
+            name=f"game-close-{session.game_id}",
+            category="game.timer",
+        )
 
     async def _auto_close_bets(self, session: GameSession, channel: discord.TextChannel) -> None:
         try:
             await asyncio.sleep(BET_COLLECTION_TIMEOUT)
         except asyncio.CancelledError:
             return
-        await self._close_bets(session, channel)
+        with span("game.close_bets", parent=session.trace):
+            await self._close_bets(session, channel)
 
     async def _close_bets(self, session: GameSession, channel: discord.TextChannel) -> None:
         if not session.bets_open:
             return
         await self._cancel_open_bets(session, channel, status=None)
 
-        async def _finalize_callback(interaction: discord.Interaction, team_name: str) -> None:
+        async def _finalize_callback(interaction: discord.Interaction, winning_team: int, team_name: str) -> None:
+            await self._record_result(session, winning_team)
             await self._finalize_session(session, interaction, f"Победила {team_name}")
 
         async def _refund_callback(interaction: discord.Interaction) -> None:
+            await self._record_result(session, None)
             await self._finalize_session(session, interaction, "Ставки возвращены")
 
         winner_view = WinnerView(
@@ -319,6 +435,7 @@ class CustomGame(commands.Cog):
             session.game_id,
             on_finalize=_finalize_callback,
             on_refund=_refund_callback,
+            trace=session.trace,
         )
 
         session.winner_view = winner_view
@@ -366,20 +483,11 @@ class CustomGame(commands.Cog):
 
         await self._update_bets_summary(session, closed=True, status=status_message if refunded else "Ставок не было.")
 
+        await self._record_result(session, None)
         self._cleanup_session(session)
 
     async def _refund_all_bets(self, session: GameSession) -> bool:
-        bets = await get_bets_for_game(session.game_id)
-        if not bets:
-            await clear_bets_for_game(session.game_id)
-            return False
-
-        for bet in bets:
-            current_balance = await get_user_balance(bet["user_id"])
-            await set_user_balance(bet["user_id"], current_balance + int(bet["amount"]))
-
-        await clear_bets_for_game(session.game_id)
-        return True
+        return await refund_bets(session.game_id) > 0
 
     async def _auto_close_game(self, session: GameSession) -> None:
         try:
@@ -419,6 +527,7 @@ class CustomGame(commands.Cog):
         else:
             await channel.send("Игра автоматически закрыта.")
 
+        await self._record_result(session, None)
         self._cleanup_session(session)
 
     async def _finalize_session(self, session: GameSession, interaction: discord.Interaction, status: str) -> None:
@@ -431,7 +540,8 @@ class CustomGame(commands.Cog):
 
     def _cleanup_session(self, session: GameSession) -> None:
         self.sessions.pop(session.message_id, None)
-        self.channel_index.pop(session.channel_id, None)
+        if self.channel_index.get(session.channel_id) == session.message_id:
+            self.channel_index.pop(session.channel_id, None)
         if session.recruitment_task and not session.recruitment_task.done():
             session.recruitment_task.cancel()
         if session.bet_close_task and not session.bet_close_task.done():
@@ -440,6 +550,7 @@ class CustomGame(commands.Cog):
             session.game_close_task.cancel()
         session.winner_view = None
         session.winner_view_message_id = None
+        session.trace.end()
 
     async def _update_bets_summary(
         self,
@@ -447,19 +558,16 @@ class CustomGame(commands.Cog):
         closed: bool = False,
         status: Optional[str] = None,
     ) -> None:
-        channel_id = settings.BETS_CHANNEL_ID
-        if not channel_id:
-            return
-        channel = self.bot.get_channel(channel_id)
-        if not isinstance(channel, discord.TextChannel):
+        channel = entities.get(session.guild_id).bets_channel
+        if channel is None:
             return
 
         embed = await self._build_bets_embed(session, closed=closed, status=status)
 
         try:
             if session.bet_summary_message_id:
-                message = await channel.fetch_message(session.bet_summary_message_id)
-                await message.edit(embed=embed)
+                # Частичное сообщение редактируется без предварительного запроса к REST
+                await channel.get_partial_message(session.bet_summary_message_id).edit(embed=embed)
             else:
                 message = await channel.send(embed=embed)
                 session.bet_summary_message_id = message.id
@@ -554,16 +662,15 @@ class CustomGame(commands.Cog):
             description=f"Игра: {session.game}",
             color=discord.Color.green(),
         )
-        embed.add_field(
-            name=session.team_names[0],
-            value=self._format_mentions(team_one),
-            inline=True,
-        )
-        embed.add_field(
-            name=session.team_names[1],
-            value=self._format_mentions(team_two),
-            inline=True,
-        )
+        for team_name, team in zip(session.team_names, (team_one, team_two)):
+            if team and session.ratings:
+                average = sum(session.ratings.get(uid, DEFAULT_RATING) for uid in team) / len(team)
+                team_name = f"{team_name} (рейтинг {average:.0f})"
+            embed.add_field(
+                name=team_name,
+                value=self._format_mentions(team),
+                inline=True,
+            )
         if map_info:
             embed.set_image(url=map_info["image"])
             embed.set_footer(text=f"Карта: {map_info['name']}")
@@ -615,13 +722,7 @@ class CustomGame(commands.Cog):
                     continue
 
     async def _get_member(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
-        member = guild.get_member(user_id)
-        if member is not None:
-            return member
-        try:
-            return await guild.fetch_member(user_id)
-        except discord.HTTPException:
-            return None
+        return await self.bot.member_resolver.get_member(guild, user_id)
 
     async def _remove_reaction(self, payload: discord.RawReactionActionEvent) -> None:
         channel = self.bot.get_channel(payload.channel_id)
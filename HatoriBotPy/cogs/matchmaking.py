@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from ..db import get_player_ratings
+from ..matchmaker import Lobby, MatchQueue, QueueKey
+from ..permissions import is_game_manager
+from ..supervisor import supervisor
+from ..teams import DEFAULT_RATING
+from ..utils import game_key
+from .custom_game import MAX_PARTICIPANTS
+from views.queue import QueueButton, build_queue_view
+
+logger = logging.getLogger("HatoriBotPy.matchmaking")
+
+MATCH_INTERVAL = 5
+MAX_GAME_KEY_LENGTH = 80
+LOBBY_START_CONCURRENCY = 4
+
+
+@dataclass
+class QueueBoard:
+    game: str
+    channel_id: int
+    manager_id: int
+    voice_channel_id: Optional[int]
+
+
+class Matchmaking(commands.Cog):
+    # Команды только на сервере: очереди и лобби принадлежат гильдии
+    queue = app_commands.Group(name="queue", description="Очередь подбора игроков", guild_only=True)
+
+    def __init__(self, bot: commands.Bot) -> None:
+        self.bot = bot
+        self.matcher = MatchQueue(MAX_PARTICIPANTS)
+        self.boards: Dict[QueueKey, QueueBoard] = {}
+        self._matcher_task: Optional[asyncio.Task[None]] = None
+
+    async def cog_load(self) -> None:
+        self.bot.add_dynamic_items(QueueButton)
+        self._matcher_task = supervisor.spawn(self._matcher_loop(), name="matcher", category="matchmaking")
+
+    async def cog_unload(self) -> None:
+        self.bot.remove_dynamic_items(QueueButton)
+        if self._matcher_task:
+            self._matcher_task.cancel()
+
+    @staticmethod
+    def _queue_key(guild_id: int, game: str) -> QueueKey:
+        return guild_id, game_key(game)[:MAX_GAME_KEY_LENGTH]
+
+    async def join_queue(self, user_id: int, guild_id: int, game: str) -> str:
+        key = self._queue_key(guild_id, game)
+        board = self.boards.get(key)
+        if board is None:
+            return "Очередь на эту игру не открыта."
+        if user_id in self.matcher:
+            return "Вы уже в очереди."
+        try:
+            # Рейтинг общий для игры во всех гильдиях
+            ratings = await get_player_ratings(key[1], [user_id])
+        except Exception:
+            logger.exception("Не удалось загрузить рейтинг игрока")
+            ratings = {}
+        self.matcher.join(user_id, key, ratings.get(str(user_id), DEFAULT_RATING))
+        return f"Вы в очереди на {board.game}. Игроков в очереди: {self.matcher.size(key)}."
+
+    def leave_queue(self, user_id: int) -> str:
+        if self.matcher.leave(user_id) is None:
+            return "Вы не стоите в очереди."
+        return "Вы покинули очередь."
+
+    @queue.command(name="open", description="Открыть очередь подбора на игру в этом канале")
+    @app_commands.describe(game="Название игры (Valorant, Dota 2, LoL, CS)")
+    async def open_queue(self, interaction: discord.Interaction, game: str) -> None:
+        if not is_game_manager(interaction.user):
+            await interaction.response.send_message("Недостаточно прав.", ephemeral=True)
+            return
+        channel = interaction.channel
+        if not isinstance(channel, discord.TextChannel):
+            await interaction.response.send_message("Команда доступна только в текстовом канале.", ephemeral=True)
+            return
+        key = self._queue_key(channel.guild.id, game)
+        if not key[1]:
+            await interaction.response.send_message("Укажите название игры.", ephemeral=True)
+            return
+        if key in self.boards:
+            await interaction.response.send_message("Очередь на эту игру уже открыта.", ephemeral=True)
+            return
+
+        self.boards[key] = QueueBoard(
+            game=game,
+            channel_id=channel.id,
+            manager_id=interaction.user.id,
+            voice_channel_id=getattr(getattr(interaction.user.voice, "channel", None), "id", None),
+        )
+        embed = discord.Embed(
+            title=f"Очередь на {game}",
+            description=(
+                f"Нажмите кнопку или используйте `/queue join`, чтобы встать в очередь.\n"
+                f"Лобби на {MAX_PARTICIPANTS} игроков собираются автоматически."
+            ),
+            color=discord.Color.blue(),
+        )
+        await interaction.response.send_message(embed=embed, view=build_queue_view(key[1]))
+
+    @queue.command(name="close", description="Закрыть очередь подбора на игру")
+    @app_commands.describe(game="Название игры")
+    async def close_queue(self, interaction: discord.Interaction, game: str) -> None:
+        if not is_game_manager(interaction.user):
+            await interaction.response.send_message("Недостаточно прав.", ephemeral=True)
+            return
+        key = self._queue_key(interaction.guild_id, game)
+        if self.boards.pop(key, None) is None:
+            await interaction.response.send_message("Очередь на эту игру не открыта.", ephemeral=True)
+            return
+        removed = self.matcher.clear(key)
+        await interaction.response.send_message(
+            f"Очередь закрыта. Удалено игроков из очереди: {len(removed)}.",
+            ephemeral=True,
+        )
+
+    @queue.command(name="join", description="Встать в очередь подбора")
+    @app_commands.describe(game="Название игры")
+    async def join(self, interaction: discord.Interaction, game: str) -> None:
+        message = await self.join_queue(interaction.user.id, interaction.guild_id, game)
+        await interaction.response.send_message(message, ephemeral=True)
+
+    @queue.command(name="leave", description="Покинуть очередь подбора")
+    async def leave(self, interaction: discord.Interaction) -> None:
+        await interaction.response.send_message(self.leave_queue(interaction.user.id), ephemeral=True)
+
+    @queue.command(name="status", description="Состояние очередей подбора")
+    async def status(self, interaction: discord.Interaction) -> None:
+        boards = {key: board for key, board in self.boards.items() if key[0] == interaction.guild_id}
+        if not boards:
+            await interaction.response.send_message("Открытых очередей нет.", ephemeral=True)
+            return
+        lines = [f"**{board.game}**: {self.matcher.size(key)} в очереди" for key, board in boards.items()]
+        entry = self.matcher.get(interaction.user.id)
+        if entry is not None and entry.game in boards:
+            lines.append(f"\nВы в очереди на {boards[entry.game].game}.")
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+    @join.autocomplete("game")
+    @close_queue.autocomplete("game")
+    async def _game_autocomplete(
+        self,
+        interaction: discord.Interaction,
+        current: str,
+    ) -> list[app_commands.Choice[str]]:
+        needle = current.lower()
+        return [
+            app_commands.Choice(name=board.game[:100], value=game)
+            for (guild_id, game), board in self.boards.items()
+            if guild_id == interaction.guild_id and needle in game
+        ][:25]
+
+    async def _matcher_loop(self) -> None:
+        await self.bot.wait_until_ready()
+        while True:
+            await asyncio.sleep(MATCH_INTERVAL)
+            try:
+                self._dispatch_lobbies(self.matcher.form_lobbies())
+            except Exception:
+                logger.exception("Ошибка при подборе лобби")
+
+    def _dispatch_lobbies(self, lobbies: list[Lobby]) -> None:
+        for lobby in lobbies:
+            supervisor.spawn(self._start_lobby(lobby), name=f"lobby-{lobby.game[0]}-{lobby.game[1]}", category="matchmaking.lobby")
+
+    async def _start_lobby(self, lobby: Lobby) -> None:
+        board = self.boards.get(lobby.game)
+        if board is None:
+            # Очередь закрыли, пока лобби собиралось
+            return
+        game_cog = self.bot.get_cog("CustomGame")
+        channel = self.bot.get_channel(board.channel_id)
+        if game_cog is None or not isinstance(channel, discord.TextChannel):
+            # Канал или модуль игр пропал: вернуть игроков в очередь значило бы
+            # собирать то же лобби бесконечно, поэтому очередь закрывается
+            self.boards.pop(lobby.game, None)
+            removed = self.matcher.clear(lobby.game)
+            logger.warning(
+                "Очередь на %s закрыта: канал или модуль игр недоступен, удалено игроков %d",
+                board.game,
+                len(removed) + len(lobby.players),
+            )
+            await self._notify_closed(board, lobby)
+            return
+        try:
+            await game_cog.start_lobby(
+                board.game,
+                channel,
+                [entry.user_id for entry in lobby.players],
+                board.manager_id,
+                voice_channel_id=board.voice_channel_id,
+                ratings={entry.user_id: entry.rating for entry in lobby.players},
+            )
+        except Exception:
+            logger.exception("Не удалось запустить лобби %s", board.game)
+
+    async def _notify_closed(self, board: QueueBoard, lobby: Lobby) -> None:
+        for entry in lobby.players:
+            user = self.bot.get_user(entry.user_id)
+            if user is None:
+                continue
+            try:
+                await user.send(f"Очередь на {board.game} закрыта: лобби не удалось запустить.")
+            except discord.HTTPException:
+                pass
+
+
+async def setup(bot: commands.Bot) -> None:
+    supervisor.set_limit("matchmaking.lobby", LOBBY_START_CONCURRENCY)
+    await bot.add_cog(Matchmaking(bot))
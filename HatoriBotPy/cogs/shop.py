@@ -1,88 +1,202 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 
-from ..config import settings
 from ..constants import SHOP_ITEMS
-from ..db import get_user_balance, record_purchase, set_user_balance
+from ..db import (
+    PURCHASE_DUPLICATE,
+    PURCHASE_INSUFFICIENT,
+    PURCHASE_REFUND_AFTER,
+    DatabaseUnavailable,
+    get_shop_items,
+    mark_purchase_fulfilled,
+    purchase_item,
+    set_shop_item_price,
+)
+from ..digest import purchase_log
+from ..interactions import fast_ack, respond
+from ..permissions import OWNER_ONLY, is_owner
+from ..supervisor import supervisor
+from views.shop import ShopView
+
+logger = logging.getLogger("HatoriBotPy.shop")
+
+MAX_SELECT_OPTIONS = 25
+FULFILLMENT_CONCURRENCY = 8
 
 
 class Shop(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
+        self._items: dict[str, dict] = {}
+        self._embed: discord.Embed | None = None
+        self._view: ShopView | None = None
+        self._message_view: ShopView | None = None
+        # Покупки (пользователь, товар) от списания до окончания выдачи
+        self._in_flight: set[tuple[int, str]] = set()
+
+    async def cog_load(self) -> None:
+        await self.reload_catalog()
+
+    async def reload_catalog(self) -> None:
+        try:
+            items = [dict(row) for row in await get_shop_items()]
+        except Exception:
+            logger.exception("Не удалось загрузить каталог магазина, используется встроенный")
+            items = [dict(item) for item in SHOP_ITEMS]
+
+        if len(items) > MAX_SELECT_OPTIONS:
+            logger.warning("В каталоге %d товаров, в меню попадут первые %d", len(items), MAX_SELECT_OPTIONS)
+            items = items[:MAX_SELECT_OPTIONS]
 
-    @app_commands.command(name="shop", description="Магазин виртуальных товаров")
-    async def shop(self, interaction: discord.Interaction) -> None:
         options = [
             discord.SelectOption(
                 label=item["name"],
                 value=item["key"],
                 description=f"{item['price']} монет",
             )
-            for item in SHOP_ITEMS
+            for item in items
         ]
 
-        select = discord.ui.Select(
-            placeholder="Выберите товар",
-            min_values=1,
-            max_values=1,
-            options=options,
-        )
-
-        async def on_select(inter: discord.Interaction) -> None:
-            key = select.values[0]
-            item = next((i for i in SHOP_ITEMS if i["key"] == key), None)
-            if item is None:
-                await inter.response.send_message("Товар не найден.", ephemeral=True)
-                return
-
-            balance = await get_user_balance(inter.user.id)
-            price = int(item["price"])
-
-            if balance < price:
-                await inter.response.send_message("Недостаточно средств.", ephemeral=True)
-                return
-
-            await set_user_balance(inter.user.id, balance - price)
-
-            if settings.PURCHASE_LOG_CHANNEL:
-                log_channel = self.bot.get_channel(settings.PURCHASE_LOG_CHANNEL)
-                if log_channel:
-                    await log_channel.send(
-                        f"🛒 {inter.user.mention} купил(а) **{item['name']}** за {price} монет"
-                    )
-
-            await record_purchase(inter.user.id, item["key"], item["name"], price)
-
-            result_msg = await self._process_purchase(inter, item)
-
-            await inter.response.send_message(
-                f"✅ Покупка успешна: **{item['name']}**\n{result_msg}",
-                ephemeral=True,
-            )
-
-        select.callback = on_select
-        view = discord.ui.View(timeout=60)
-        view.add_item(select)
-
         embed = discord.Embed(
             title="🏪 Магазин",
             description="Выберите товар для покупки:",
             color=discord.Color.gold(),
         )
-
-        for item in SHOP_ITEMS:
+        for item in items:
             embed.add_field(
                 name=f"{item['name']} - {item['price']}💰",
                 value=f"Тип: {self._get_item_type_name(item['type'])}",
                 inline=False,
             )
 
-        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+        view = ShopView(options, self._on_select)
+        # Остановленная копия только рендерит компоненты в сообщении и не
+        # попадает в хранилище представлений: все выборы обрабатывает view
+        message_view = ShopView(options, self._on_select)
+        message_view.stop()
+
+        self._items = {item["key"]: item for item in items}
+        self._embed = embed
+        self._view = view
+        self._message_view = message_view
+        self.bot.add_view(view)
+        logger.info("Каталог магазина загружен: %d товаров", len(items))
+
+    @app_commands.command(name="shop", description="Магазин виртуальных товаров")
+    async def shop(self, interaction: discord.Interaction) -> None:
+        if self._embed is None or self._message_view is None:
+            await interaction.response.send_message("Магазин временно недоступен.", ephemeral=True)
+            return
+        await interaction.response.send_message(embed=self._embed, view=self._message_view, ephemeral=True)
+
+    @app_commands.command(name="shop_reload", description="Перезагрузить каталог магазина из базы данных")
+    @app_commands.default_permissions(administrator=True)
+    async def shop_reload(self, interaction: discord.Interaction) -> None:
+        if not await is_owner(self.bot, interaction.user):
+            await interaction.response.send_message(OWNER_ONLY, ephemeral=True)
+            return
+        await self.reload_catalog()
+        await interaction.response.send_message(f"✅ Каталог обновлен: {len(self._items)} товаров.", ephemeral=True)
+
+    @app_commands.command(name="shop_price", description="Изменить цену товара")
+    @app_commands.describe(item="Ключ товара", price="Новая цена")
+    @app_commands.default_permissions(administrator=True)
+    async def shop_price(
+        self,
+        interaction: discord.Interaction,
+        item: str,
+        price: app_commands.Range[int, 0],
+    ) -> None:
+        if not await is_owner(self.bot, interaction.user):
+            await interaction.response.send_message(OWNER_ONLY, ephemeral=True)
+            return
+        if not await set_shop_item_price(item, price):
+            await interaction.response.send_message("Товар не найден.", ephemeral=True)
+            return
+        await self.reload_catalog()
+        await interaction.response.send_message(f"✅ Новая цена товара `{item}`: {price} монет.", ephemeral=True)
+
+    @shop_price.autocomplete("item")
+    async def _shop_price_item_autocomplete(
+        self,
+        _: discord.Interaction,
+        current: str,
+    ) -> list[app_commands.Choice[str]]:
+        needle = current.lower()
+        return [
+            app_commands.Choice(name=item["name"][:100], value=key)
+            for key, item in self._items.items()
+            if needle in key.lower() or needle in item["name"].lower()
+        ][:MAX_SELECT_OPTIONS]
+
+    @fast_ack("Shop.select")
+    async def _on_select(self, inter: discord.Interaction, key: str) -> None:
+        item = self._items.get(key)
+        if item is None:
+            await respond(inter, "Товар не найден.", ephemeral=True)
+            return
+
+        # Двойной клик приходит двумя взаимодействиями с разными id, поэтому
+        # ключ идемпотентности их не склеивает; повтор отклоняется до конца выдачи
+        guard = (inter.user.id, item["key"])
+        if guard in self._in_flight:
+            await respond(inter, "Покупка этого товара уже обрабатывается.", ephemeral=True)
+            return
+        self._in_flight.add(guard)
+        handed_off = False
+        try:
+            handed_off = await self._purchase(inter, item)
+        finally:
+            if not handed_off:
+                self._in_flight.discard(guard)
+
+    async def _purchase(self, inter: discord.Interaction, item: dict) -> bool:
+        """Списывает деньги; ``True``, если выдача товара запущена."""
+        price = int(item["price"])
+        try:
+            result = await purchase_item(inter.user.id, item["key"], item["name"], price, inter.id)
+        except DatabaseUnavailable as e:
+            if not e.attempted:
+                raise
+            # Списание могло пройти до обрыва; невыданную покупку вернет планировщик
+            await respond(
+                inter,
+                "⚠️ Статус покупки неизвестен. Если монеты списаны, а товар не выдан, "
+                f"они вернутся автоматически в течение {PURCHASE_REFUND_AFTER // 60} минут. "
+                "Не повторяйте покупку.",
+                ephemeral=True,
+            )
+            return False
+
+        if result.status == PURCHASE_INSUFFICIENT:
+            await respond(inter, "Недостаточно средств.", ephemeral=True)
+            return False
+        if result.status == PURCHASE_DUPLICATE and result.fulfilled:
+            await respond(inter, "Эта покупка уже обработана.", ephemeral=True)
+            return False
+        # Невыданный дубликат — повтор после потерянного ответа на успешное
+        # списание: деньги уже сняты, поэтому товар выдается как обычно
+
+        await respond(
+            inter,
+            f"✅ Покупка успешна: **{item['name']}**\nТовар выдается...",
+            ephemeral=True,
+        )
+
+        # Деньги уже списаны, поэтому при остановке бота выдача дорабатывает
+        supervisor.spawn(
+            self._fulfill_purchase(inter, item, price, result.purchase_id),
+            name=f"shop-fulfill-{inter.id}",
+            category="shop.fulfillment",
+            graceful=True,
+        )
+        return True
 
     def _get_item_type_name(self, item_type: str) -> str:
         type_names = {
@@ -93,6 +207,53 @@ class Shop(commands.Cog):
         }
         return type_names.get(item_type, "Неизвестно")
 
+    async def _fulfill_purchase(
+        self,
+        interaction: discord.Interaction,
+        item: dict,
+        price: int,
+        purchase_id: int | None,
+    ) -> None:
+        try:
+            await self._deliver(interaction, item, price, purchase_id)
+        finally:
+            self._in_flight.discard((interaction.user.id, item["key"]))
+
+    async def _deliver(
+        self,
+        interaction: discord.Interaction,
+        item: dict,
+        price: int,
+        purchase_id: int | None,
+    ) -> None:
+        # Лог покупок уходит сводкой и не делит лимит канала с выдачей товара
+        if interaction.guild_id is not None:
+            purchase_log.add_line(
+                interaction.guild_id,
+                f"{interaction.user.mention} купил(а) **{item['name']}** за {price} монет",
+            )
+
+        try:
+            result_msg = await self._process_purchase(interaction, item)
+        except Exception:
+            logger.exception("Не удалось выдать товар %s пользователю %s", item["key"], interaction.user.id)
+            result_msg = (
+                "Не удалось выдать товар. Монеты вернутся автоматически "
+                f"в течение {PURCHASE_REFUND_AFTER // 60} минут."
+            )
+        else:
+            if purchase_id is not None:
+                try:
+                    if not await mark_purchase_fulfilled(purchase_id):
+                        logger.warning("Покупка %s выдана после возврата денег", purchase_id)
+                except DatabaseUnavailable:
+                    logger.warning("Покупка %s выдана, но не отмечена в базе", purchase_id)
+
+        try:
+            await interaction.followup.send(result_msg, ephemeral=True)
+        except discord.HTTPException:
+            pass
+
     async def _process_purchase(self, interaction: discord.Interaction, item: dict) -> str:
         item_type = item.get("type", "virtual")
         duration_days = item.get("duration_days")
@@ -109,7 +270,11 @@ class Shop(commands.Cog):
             await member.add_roles(role, reason="Покупка в магазине")
 
             if duration_seconds:
-                asyncio.create_task(self._schedule_role_expiration(member, role, duration_seconds))
+                supervisor.spawn(
+                    self._schedule_role_expiration(member, role, duration_seconds),
+                    name=f"shop-role-expire-{role.id}",
+                    category="shop.expiration",
+                )
 
             return f"Вам выдана роль {role.mention}."
 
@@ -139,7 +304,11 @@ class Shop(commands.Cog):
                 channel = await guild.create_voice_channel(channel_name, overwrites=overwrites, reason=reason)
 
             if duration_seconds:
-                asyncio.create_task(self._schedule_channel_expiration(channel, duration_seconds))
+                supervisor.spawn(
+                    self._schedule_channel_expiration(channel, duration_seconds),
+                    name=f"shop-channel-expire-{channel.id}",
+                    category="shop.expiration",
+                )
 
             channel_type_name = "текстовый" if item_type == "channel_text" else "голосовой"
             return f"Создан приватный {channel_type_name} канал {channel.mention}."
@@ -152,20 +321,22 @@ class Shop(commands.Cog):
         return "Товар выдан."
 
     async def _schedule_role_expiration(self, member: discord.Member, role: discord.Role, delay: int) -> None:
+        await asyncio.sleep(delay)
         try:
-            await asyncio.sleep(delay)
             await member.remove_roles(role, reason="Срок действия роли истек")
-            await role.delete(reason="Срок действия роли истек")
-        except Exception:
+        except discord.NotFound:
+            # Участник уже покинул сервер, роль все равно удаляется
             pass
+        await role.delete(reason="Срок действия роли истек")
 
     async def _schedule_channel_expiration(self, channel: discord.abc.GuildChannel, delay: int) -> None:
         await asyncio.sleep(delay)
         try:
             await channel.delete(reason="Срок действия приватного канала истек")
-        except Exception:
+        except discord.NotFound:
             pass
 
 
 async def setup(bot: commands.Bot) -> None:
+    supervisor.set_limit("shop.fulfillment", FULFILLMENT_CONCURRENCY)
     await bot.add_cog(Shop(bot))
\ No newline at end of file
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from ..db import get_player_stats
+from ..utils import format_currency
+
+
+def _format_streak(streak: int) -> str:
+    if streak > 0:
+        return f"{streak} побед подряд"
+    if streak < 0:
+        return f"{-streak} поражений подряд"
+    return "-"
+
+
+class Stats(commands.Cog):
+    def __init__(self, bot: commands.Bot) -> None:
+        self.bot = bot
+
+    @app_commands.command(name="stats", description="Статистика игр и ставок пользователя")
+    @app_commands.describe(user="Пользователь")
+    async def stats(self, interaction: discord.Interaction, user: discord.User | None = None) -> None:
+        target = user or interaction.user
+        row = await get_player_stats(target.id)
+        if row is None:
+            await interaction.response.send_message(
+                f"У пользователя {target.mention} пока нет сыгранных игр и ставок.",
+                ephemeral=True,
+            )
+            return
+
+        games_played = int(row["games_played"])
+        wins = int(row["wins"])
+        win_rate = f" ({wins / games_played:.0%})" if games_played else ""
+
+        embed = discord.Embed(title=f"Статистика {target.display_name}", color=discord.Color.blurple())
+        embed.set_thumbnail(url=target.display_avatar.url)
+        embed.add_field(name="Игр сыграно", value=str(games_played), inline=True)
+        embed.add_field(name="Побед", value=f"{wins}{win_rate}", inline=True)
+        embed.add_field(name="Текущая серия", value=_format_streak(int(row["current_streak"])), inline=True)
+        embed.add_field(name="Лучшая серия", value=str(row["best_streak"]), inline=True)
+        embed.add_field(
+            name="Ставки",
+            value=f"Сделано: {row['bets_placed']}\nВыиграно: {row['bets_won']}",
+            inline=True,
+        )
+        embed.add_field(name="Прибыль от ставок", value=format_currency(int(row["bet_profit"])), inline=True)
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot: commands.Bot) -> None:
+    await bot.add_cog(Stats(bot))
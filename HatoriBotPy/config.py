@@ -38,7 +38,54 @@ class Settings:
     DATABASE_URL: str
     KEEPALIVE_PORT: int
     ADMIN_NOTICE_COOLDOWN: int
+    LEDGER_RETENTION_MONTHS: int
+    LEDGER_RECONCILE_INTERVAL: int
+    MEMBER_CACHE_MODE: str
+    LOG_LEVEL: str
+    LOG_FORMAT: str
+    LOG_FILE: Optional[str]
+    LOG_DEBUG_RATE: int
+    TRACE_EXPORTER: str
+    TRACE_SAMPLE_RATE: float
+    TRACE_FILE: str
+    TRACE_OTLP_URL: str
+    RUNTIME_PROFILE: str
+    DEBUG_TOKEN: Optional[str]
+    RECORD_EVENTS_FILE: Optional[str]
+    DB_TIMEOUT: float
+    DB_RETRIES: int
+    DB_BREAKER_THRESHOLD: int
+    DB_BREAKER_RESET: int
+    LOG_DIGEST_INTERVAL: float
+    DATABASE_REPLICA_URLS: tuple[str, ...]
+    DB_REPLICA_MAX_LAG: float
+    DB_REPLICA_CHECK_INTERVAL: float
+    OWNER_IDS: tuple[int, ...]
     
+def _to_float(name: str, value: Optional[str], default: float) -> float:
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError as e:
+        raise RuntimeError(f"Переменная окружения {name} должна быть числом, получено: {value} ") from e
+
+
+def _to_list(value: Optional[str]) -> tuple[str, ...]:
+    if value is None:
+        return ()
+    return tuple(item.strip() for item in value.split(',') if item.strip())
+
+
+def _to_choice(name: str, value: Optional[str], choices: tuple[str, ...], default: str) -> str:
+    if value is None or value.strip() == '':
+        return default
+    normalized = value.strip().lower()
+    if normalized not in choices:
+        raise RuntimeError(f"Переменная окружения {name} должна быть одним из {', '.join(choices)}, получено: {value} ")
+    return normalized
+
+
 def load_settings() -> Settings:
     token = _get_env("DISCORD_TOKEN", required=True)
     db_url = _get_env("DATABASE_URL", required=True)
@@ -64,6 +111,31 @@ def load_settings() -> Settings:
         MESSAGE_COOLDOWN_MS = _to_int("MESSAGE_COOLDOWN_MS", message_cooldown_raw, 15000) or 15000,
         KEEPALIVE_PORT = _to_int("PORT", keepalive_port_raw, 3000) or 3000,
         ADMIN_NOTICE_COOLDOWN = _to_int("ADMIN_NOTICE_COOLDOWN", admin_notice_cooldown_raw, 600) or 600,
+        LEDGER_RETENTION_MONTHS = _to_int("LEDGER_RETENTION_MONTHS", _get_env("LEDGER_RETENTION_MONTHS"), 0) or 0,
+        LEDGER_RECONCILE_INTERVAL = _to_int("LEDGER_RECONCILE_INTERVAL", _get_env("LEDGER_RECONCILE_INTERVAL"), 21600) or 21600,
+        MEMBER_CACHE_MODE = _to_choice("MEMBER_CACHE_MODE", _get_env("MEMBER_CACHE_MODE"), ("full", "lean"), "full"),
+        LOG_LEVEL = _to_choice("LOG_LEVEL", _get_env("LOG_LEVEL"), ("debug", "info", "warning", "error"), "info").upper(),
+        LOG_FORMAT = _to_choice("LOG_FORMAT", _get_env("LOG_FORMAT"), ("json", "text"), "json"),
+        LOG_FILE = _get_env("LOG_FILE") or None,
+        LOG_DEBUG_RATE = _to_int("LOG_DEBUG_RATE", _get_env("LOG_DEBUG_RATE"), 5) or 0,
+        TRACE_EXPORTER = _to_choice("TRACE_EXPORTER", _get_env("TRACE_EXPORTER"), ("off", "file", "otlp"), "off"),
+        TRACE_SAMPLE_RATE = _to_float("TRACE_SAMPLE_RATE", _get_env("TRACE_SAMPLE_RATE"), 0.05),
+        TRACE_FILE = _get_env("TRACE_FILE") or "data/traces.jsonl",
+        TRACE_OTLP_URL = _get_env("TRACE_OTLP_URL") or "http://localhost:4318/v1/traces",
+        RUNTIME_PROFILE = _to_choice("RUNTIME_PROFILE", _get_env("RUNTIME_PROFILE"), ("default", "fast"), "default"),
+        DEBUG_TOKEN = _get_env("DEBUG_TOKEN") or None,
+        RECORD_EVENTS_FILE = _get_env("RECORD_EVENTS_FILE") or None,
+        DB_TIMEOUT = _to_float("DB_TIMEOUT", _get_env("DB_TIMEOUT"), 5.0),
+        DB_RETRIES = _to_int("DB_RETRIES", _get_env("DB_RETRIES"), 2) or 0,
+        DB_BREAKER_THRESHOLD = _to_int("DB_BREAKER_THRESHOLD", _get_env("DB_BREAKER_THRESHOLD"), 5) or 5,
+        DB_BREAKER_RESET = _to_int("DB_BREAKER_RESET", _get_env("DB_BREAKER_RESET"), 30) or 30,
+        LOG_DIGEST_INTERVAL = _to_float("LOG_DIGEST_INTERVAL", _get_env("LOG_DIGEST_INTERVAL"), 5.0),
+        DATABASE_REPLICA_URLS = _to_list(_get_env("DATABASE_REPLICA_URLS")),
+        DB_REPLICA_MAX_LAG = _to_float("DB_REPLICA_MAX_LAG", _get_env("DB_REPLICA_MAX_LAG"), 5.0),
+        DB_REPLICA_CHECK_INTERVAL = _to_float("DB_REPLICA_CHECK_INTERVAL", _get_env("DB_REPLICA_CHECK_INTERVAL"), 2.0),
+        # Владельцы бота: глобальные команды (балансы, магазин, профилирование).
+        # Пусто — владелец или команда приложения в Discord
+        OWNER_IDS = tuple(_to_int("OWNER_IDS", item) for item in _to_list(_get_env("OWNER_IDS"))),
     )
     
 settings = load_settings()
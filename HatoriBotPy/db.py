@@ -1,150 +1,719 @@
 from __future__ import annotations
 
-from typing import Any, Optional
+import asyncio
+import functools
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import asdict, dataclass
+from typing import IO, Any, AsyncIterator, Awaitable, Callable, Iterable, Optional, Sequence, TypeVar
+from urllib.parse import urlsplit
 
 import asyncpg
 
 from HatoriBotPy.config import settings
+from HatoriBotPy.resilience import CallStats, CircuitBreaker, backoff_delay
+from HatoriBotPy.storage import Storage, StorageBusy, open_storage
+from HatoriBotPy.storage.base import (
+    COMPLAINTS_PAGE_SIZE,
+    EXPORT_COLUMNS,
+    GUILD_SETTINGS_CHANNEL,
+    GUILD_SETTINGS_COLUMNS,
+    IMPORT_MODE_ADD,
+    IMPORT_MODE_SET,
+    LEDGER_ADJUST,
+    LEDGER_BET,
+    LEDGER_MESSAGE,
+    LEDGER_OPENING,
+    LEDGER_PARTICIPATION,
+    LEDGER_PARTITIONS_AHEAD,
+    LEDGER_PAYOUT,
+    LEDGER_PURCHASE,
+    LEDGER_PURCHASE_REFUND,
+    LEDGER_REFUND,
+    LEDGER_VOICE,
+    PURCHASE_DUPLICATE,
+    PURCHASE_INSUFFICIENT,
+    PURCHASE_OK,
+    PURCHASE_REFUND_AFTER,
+    LedgerEntry,
+    PurchaseResult,
+    Row,
+)
+from HatoriBotPy.teams import DEFAULT_RATING
 import logging
 
 
 logger = logging.getLogger("HatoriBotPy.db")
 
 
-_pool: Optional[asyncpg.Pool] = None
+_storage: Optional[Storage] = None
+
+
+class DatabaseUnavailable(RuntimeError):
+    """База не ответила: автомат разомкнут, истек срок вызова или исчерпаны повторы.
+
+    ``attempted`` ложно, если запрос заведомо не был применен сервером.
+    """
+
+    def __init__(self, message: str, attempted: bool = False) -> None:
+        super().__init__(message)
+        self.attempted = attempted
+
+
+breaker = CircuitBreaker("database", settings.DB_BREAKER_THRESHOLD, settings.DB_BREAKER_RESET)
+db_call_stats: dict[str, CallStats] = {}
+
+# Сервер гарантированно не применил запрос: повтор безопасен для любой операции
+_RETRY_SAFE = (
+    StorageBusy,
+    asyncpg.SerializationError,
+    asyncpg.DeadlockDetectedError,
+    asyncpg.TooManyConnectionsError,
+    asyncpg.CannotConnectNowError,
+    ConnectionRefusedError,
+)
+# Исход неизвестен: запрос мог примениться до обрыва, повторяются только идемпотентные
+_RETRY_IDEMPOTENT = (
+    asyncpg.PostgresConnectionError,
+    asyncpg.ConnectionDoesNotExistError,
+    asyncpg.AdminShutdownError,
+    OSError,
+)
+_TRANSIENT = _RETRY_SAFE + _RETRY_IDEMPOTENT
+
+BALANCE_CACHE_SIZE = 10_000
+_balance_cache: OrderedDict[str, int] = OrderedDict()
+_deferred_rewards: dict[tuple[str, str], int] = defaultdict(int)
+
+T = TypeVar("T")
+
+
+def _guarded(
+    *,
+    idempotent: bool,
+    fallback: Optional[Callable[..., Any]] = None,
+    timeout: Optional[float] = None,
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Срок вызова, повторы с джиттером и автомат защиты для функций модуля.
+
+    Неидемпотентные операции повторяются только после ошибок, при которых
+    сервер точно не применил запрос. Пока автомат разомкнут или после
+    исчерпания повторов вызывается ``fallback(error, *args)``; без него
+    поднимается :class:`DatabaseUnavailable`. Прикладные ошибки хранилища
+    (нарушение ограничений и т. п.) пробрасываются как есть.
+    """
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        stats = db_call_stats.setdefault(func.__name__, CallStats())
+        retryable = _TRANSIENT if idempotent else _RETRY_SAFE
+
+        def degrade(error: DatabaseUnavailable, args: tuple, kwargs: dict) -> T:
+            if fallback is None:
+                raise error
+            value = fallback(error, *args, **kwargs)
+            stats.fallbacks += 1
+            return value
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            stats.calls += 1
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + (timeout or settings.DB_TIMEOUT)
+            attempt = 0
+            while True:
+                if not breaker.allow():
+                    stats.rejected += 1
+                    return degrade(DatabaseUnavailable("База данных временно недоступна"), args, kwargs)
+                try:
+                    result = await asyncio.wait_for(func(*args, **kwargs), max(0.0, deadline - loop.time()))
+                except asyncio.CancelledError:
+                    breaker.release()
+                    raise
+                except _TRANSIENT as e:
+                    if isinstance(e, TimeoutError):
+                        stats.timeouts += 1
+                    delay = backoff_delay(attempt)
+                    if isinstance(e, retryable) and attempt < settings.DB_RETRIES and loop.time() + delay < deadline:
+                        breaker.release()
+                        attempt += 1
+                        stats.retries += 1
+                        logger.warning("Повтор %s (%d) после ошибки: %r", func.__name__, attempt, e)
+                        await asyncio.sleep(delay)
+                        continue
+                    stats.failures += 1
+                    breaker.record_failure()
+                    error = DatabaseUnavailable(
+                        f"{func.__name__}: {type(e).__name__}",
+                        attempted=not isinstance(e, _RETRY_SAFE),
+                    )
+                    error.__cause__ = e
+                    return degrade(error, args, kwargs)
+                except Exception:
+                    # Сервер ответил, пусть и ошибкой: с доступностью все в порядке
+                    breaker.record_success()
+                    raise
+                breaker.record_success()
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def _remember_balance(uid: str, balance: int) -> None:
+    _balance_cache[uid] = balance
+    _balance_cache.move_to_end(uid)
+    if len(_balance_cache) > BALANCE_CACHE_SIZE:
+        _balance_cache.popitem(last=False)
+
+
+def _pending_rewards(uid: str) -> int:
+    return _deferred_rewards.get((uid, LEDGER_MESSAGE), 0) + _deferred_rewards.get((uid, LEDGER_VOICE), 0)
+
+
+def _cached_balance(error: DatabaseUnavailable, user_id: int | str) -> int:
+    uid = str(user_id)
+    if uid not in _balance_cache:
+        raise error
+    return _balance_cache[uid] + _pending_rewards(uid)
+
+
+def _default_ratings(error: DatabaseUnavailable, game: str, user_ids: Sequence[int | str]) -> dict[str, float]:
+    return {str(uid): DEFAULT_RATING for uid in user_ids}
+
+
+ReadKey = tuple[str, str]
+
+
+@dataclass
+class _Replica:
+    name: str
+    storage: Storage
+    healthy: bool = False
+    lag: Optional[float] = None
+    reads: int = 0
+    failures: int = 0
+
+
+class ReplicaRouter:
+    """Распределяет чтения между репликами; записи всегда идут в основную базу.
+
+    Реплика получает запросы, пока ее отставание не больше
+    ``DB_REPLICA_MAX_LAG``; состояние обновляет :meth:`monitor`, а сбой
+    чтения сразу исключает реплику до следующей проверки. После записи
+    затронутые ключи (пользователь, игра) закрепляются за основной базой на
+    время, за которое запись гарантированно доходит до допущенных реплик:
+    пользователь сразу видит свой новый баланс.
+    """
+
+    def __init__(self) -> None:
+        self._replicas: list[_Replica] = []
+        self._pins: dict[ReadKey, float] = {}
+        self._pin_all_until = 0.0
+        self._turn = 0
+        self.primary_reads = 0
+        self.pinned_reads = 0
+        self.fallbacks = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._replicas)
+
+    def configure(self, urls: Sequence[str], primary: Storage) -> None:
+        if self._replicas or not urls:
+            return
+        if not primary.supports_replicas:
+            logger.warning("Хранилище %s не поддерживает реплики, DATABASE_REPLICA_URLS не используется", primary.name)
+            return
+        for url in urls:
+            parts = urlsplit(url)
+            self._replicas.append(_Replica(f"{parts.hostname}:{parts.port or 5432}", open_storage(url)))
+        logger.info("Реплики для чтения: %s", ", ".join(replica.name for replica in self._replicas))
+
+    @staticmethod
+    def _pin_seconds() -> float:
+        # Допущенная реплика отстает не больше чем на MAX_LAG плюс период проверки
+        return settings.DB_REPLICA_MAX_LAG + settings.DB_REPLICA_CHECK_INTERVAL
+
+    def pin(self, *keys: ReadKey) -> None:
+        if not self._replicas:
+            return
+        until = time.monotonic() + self._pin_seconds()
+        for key in keys:
+            self._pins[key] = until
+
+    def pin_all(self) -> None:
+        """Для записей, затронутые ключи которых заранее неизвестны."""
+        if self._replicas:
+            self._pin_all_until = time.monotonic() + self._pin_seconds()
+
+    def pick(self, keys: Sequence[ReadKey]) -> Optional[_Replica]:
+        if not self._replicas:
+            return None
+        now = time.monotonic()
+        if now < self._pin_all_until or any(self._pins.get(key, 0.0) > now for key in keys):
+            self.pinned_reads += 1
+            return None
+        healthy = [replica for replica in self._replicas if replica.healthy]
+        if not healthy:
+            self.primary_reads += 1
+            return None
+        self._turn += 1
+        replica = healthy[self._turn % len(healthy)]
+        replica.reads += 1
+        return replica
+
+    def failed(self, replica: _Replica, error: BaseException) -> None:
+        replica.failures += 1
+        self.fallbacks += 1
+        if replica.healthy:
+            replica.healthy = False
+            logger.warning("Реплика %s не ответила (%r), чтения идут в основную базу", replica.name, error)
+
+    async def check(self) -> None:
+        now = time.monotonic()
+        self._pins = {key: until for key, until in self._pins.items() if until > now}
+        for replica in self._replicas:
+            reason = None
+            try:
+                lag = await asyncio.wait_for(replica.storage.replication_lag(), timeout=settings.DB_TIMEOUT)
+            except Exception as e:
+                lag, reason = None, repr(e)
+            else:
+                if lag is None:
+                    reason = "экземпляр не в режиме реплики"
+                elif lag > settings.DB_REPLICA_MAX_LAG:
+                    reason = f"отставание {lag:.1f} с"
+            replica.lag = lag
+            if reason is None and not replica.healthy:
+                logger.info("Реплика %s принимает чтения, отставание %.1f с", replica.name, lag)
+            elif reason is not None and replica.healthy:
+                logger.warning("Реплика %s исключена: %s", replica.name, reason)
+            replica.healthy = reason is None
+
+    async def monitor(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(settings.DB_REPLICA_CHECK_INTERVAL)
+
+    async def close(self) -> None:
+        closing, self._replicas = self._replicas, []
+        self._pins.clear()
+        for replica in closing:
+            await replica.storage.close()
+
+    def health(self) -> dict[str, Any]:
+        return {
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": replica.healthy,
+                    "lag": round(replica.lag, 2) if replica.lag not in (None, float("inf")) else None,
+                    "reads": replica.reads,
+                    "failures": replica.failures,
+                }
+                for replica in self._replicas
+            ],
+            "primary_reads": self.primary_reads,
+            "pinned_reads": self.pinned_reads,
+            "fallbacks": self.fallbacks,
+        }
+
+
+replicas = ReplicaRouter()
+
+
+async def _read(op: Callable[[Storage], Awaitable[T]], *keys: ReadKey) -> T:
+    """Выполняет чтение на реплике, если она допущена и ключи не закреплены.
+
+    Реплике отводится половина срока вызова: после ее сбоя чтение
+    повторяется в основной базе в пределах того же срока.
+    """
+    replica = replicas.pick(keys)
+    if replica is not None:
+        try:
+            return await asyncio.wait_for(op(replica.storage), timeout=settings.DB_TIMEOUT / 2)
+        except _TRANSIENT as e:
+            replicas.failed(replica, e)
+    return await op(get_storage())
 
 
-async def get_pool() -> asyncpg.Pool:
-    global _pool
-    if _pool is None:
-        logger.info("Подключение к базе данных %s", settings.DATABASE_URL)
-        try:
-            _pool = await asyncpg.create_pool(dsn=settings.DATABASE_URL, min_size=1, max_size=10)
-        except Exception:
-            logger.exception("Не удалось создать пул подключений к базе данных")
-            raise
-        else:
-            logger.info("Пул подключений к базе данных создан")
-    return _pool
+def database_health() -> dict[str, Any]:
+    """Состояние автомата и счетчики вызовов для мониторинга."""
+    return {
+        "storage": _storage.name if _storage is not None else None,
+        "breaker": breaker.state,
+        "consecutive_failures": breaker.consecutive_failures,
+        "times_opened": breaker.times_opened,
+        "retry_after": round(breaker.retry_after(), 1),
+        "deferred_rewards": len(_deferred_rewards),
+        "calls": {name: asdict(stats) for name, stats in db_call_stats.items() if stats.calls},
+        **replicas.health(),
+    }
+
+
+def get_storage() -> Storage:
+    """Хранилище, выбранное по ``DATABASE_URL``; создается при первом обращении."""
+    global _storage
+    if _storage is None:
+        _storage = open_storage(settings.DATABASE_URL)
+        logger.info("Хранилище данных: %s", _storage.name)
+    return _storage
+
+
+def use_storage(storage: Optional[Storage]) -> None:
+    """Подменяет хранилище (замеры, воспроизведение записей)."""
+    global _storage
+    _storage = storage
 
 
 async def init_db() -> None:
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        await conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                balance INTEGER DEFAULT 0
-            );
-
-            CREATE TABLE IF NOT EXISTS bets (
-                id SERIAL PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                game_id TEXT NOT NULL,
-                team INTEGER NOT NULL,
-                amount INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT NOW()
-            );
-
-            CREATE TABLE IF NOT EXISTS purchases (
-                id SERIAL PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                item_key TEXT NOT NULL,
-                item_name TEXT NOT NULL,
-                price INTEGER NOT NULL,
-                purchased_at TIMESTAMP DEFAULT NOW()
-            );
-            """
-        )
-
-
-async def query(sql: str, *params: Any) -> list[asyncpg.Record]:
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        return await conn.fetch(sql, *params)
-
-
-async def execute(sql: str, *params: Any) -> str:
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        return await conn.execute(sql, *params)
+    storage = get_storage()
+    await storage.init()
+    replicas.configure(settings.DATABASE_REPLICA_URLS, storage)
 
 
-async def get_user_balance(user_id: int | str) -> int:
-    uid = str(user_id)
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        async with conn.transaction():
-            row = await conn.fetchrow("SELECT balance FROM users WHERE id=$1", uid)
+async def close_db() -> None:
+    global _storage
+    await replicas.close()
+    if _storage is not None:
+        storage, _storage = _storage, None
+        await storage.close()
+
+
+def supports_notify() -> bool:
+    return get_storage().supports_notify
+
+
+async def open_listener(channel: str, callback: Callable[..., Any]) -> Any:
+    """Отдельное соединение для LISTEN; есть только у хранилищ с ``supports_notify``."""
+    return await asyncio.wait_for(get_storage().open_listener(channel, callback), timeout=settings.DB_TIMEOUT)
 
-            if row is None:
-                await conn.execute("INSERT INTO users (id, balance) VALUES ($1, 0)", uid)
-                return 0
 
-            return int(row["balance"])
+async def ensure_ledger_partitions(months_ahead: int = LEDGER_PARTITIONS_AHEAD) -> None:
+    await get_storage().ensure_ledger_partitions(months_ahead)
 
 
-async def set_user_balance(user_id: int | str, balance: int) -> bool:
+async def detach_ledger_partitions(keep_months: int) -> list[str]:
+    """Отсоединяет помесячные разделы журнала старше ``keep_months`` месяцев.
+
+    Суммы по отсоединяемому разделу переносятся в ``ledger_archive``, поэтому
+    сверка балансов остается корректной. Сама таблица раздела сохраняется и
+    может быть выгружена или удалена отдельно; в хранилищах без разделов
+    старые записи удаляются.
+    """
+    return await get_storage().detach_ledger_partitions(keep_months)
+
+
+def reconcile_ledger(batch_size: int = 500) -> AsyncIterator[Row]:
+    """Потоково возвращает пользователей, чей баланс не сходится с журналом.
+
+    Расхождения читаются порциями по ``batch_size`` строк.
+    """
+    return get_storage().reconcile_ledger(batch_size)
+
+
+@_guarded(idempotent=True, fallback=_cached_balance)
+async def get_user_balance(user_id: int | str) -> int:
     uid = str(user_id)
-    result = await execute("UPDATE users SET balance = $1 WHERE id = $2", balance, uid)
-    return result.upper().startswith("UPDATE")
+    balance = await _read(lambda storage: storage.fetch_user_balance(uid), ("user", uid))
+    if balance is None:
+        # Новый пользователь создается в основной базе
+        balance = await get_storage().get_user_balance(uid)
+    _remember_balance(uid, balance)
+    return balance
+
+
+@_guarded(idempotent=True)
+async def set_user_balance(
+    user_id: int | str,
+    balance: int,
+    reason: str = LEDGER_ADJUST,
+    ref: Optional[str] = None,
+) -> bool:
+    uid = str(user_id)
+    replicas.pin(("user", uid))
+    return await get_storage().set_user_balance(uid, balance, reason, ref)
 
 
-async def add_currency(user_id: int | str, amount: int) -> int:
+@_guarded(idempotent=False)
+async def add_currency(
+    user_id: int | str,
+    amount: int,
+    reason: str = LEDGER_ADJUST,
+    ref: Optional[str] = None,
+) -> int:
     uid = str(user_id)
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            """
-            INSERT INTO users (id, balance) VALUES ($1, $2)
-            ON CONFLICT (id) DO UPDATE SET balance = users.balance + EXCLUDED.balance
-            RETURNING balance
-            """,
-            uid,
-            amount,
-        )
-        return int(row["balance"]) if row else 0
+    replicas.pin(("user", uid))
+    balance = await get_storage().add_currency(uid, amount, reason, ref)
+    _remember_balance(uid, balance)
+    return balance
+
+
+async def _add_reward(user_id: int | str, amount: int, reason: str) -> int:
+    uid = str(user_id)
+    try:
+        return await add_currency(uid, amount, reason)
+    except DatabaseUnavailable as e:
+        if e.attempted:
+            # Начисление могло пройти: отложенный повтор рискует выдать награду дважды
+            logger.warning("Награда %s пользователю %s потеряна: %s", reason, uid, e)
+        else:
+            _deferred_rewards[(uid, reason)] += amount
+        return _balance_cache.get(uid, 0) + _pending_rewards(uid)
 
 
 async def add_currency_for_message(user_id: int | str, amount: int) -> int:
-    return await add_currency(user_id, amount)
+    """Начисляет награду за сообщение; при недоступной базе откладывает ее."""
+    return await _add_reward(user_id, amount, LEDGER_MESSAGE)
 
 
 async def add_currency_for_voice(user_id: int | str, amount: int) -> int:
-    return await add_currency(user_id, amount)
+    """Начисляет награду за голос; при недоступной базе откладывает ее."""
+    return await _add_reward(user_id, amount, LEDGER_VOICE)
+
 
+@_guarded(idempotent=False)
+async def _credit_deferred(entries: Sequence[LedgerEntry]) -> None:
+    replicas.pin(*{("user", uid) for uid, _, _, _ in entries})
+    await get_storage().credit_many(entries)
 
+
+async def flush_deferred_rewards() -> int:
+    """Начисляет одним пакетом награды, отложенные пока база была недоступна.
+
+    Возвращает число начисленных записей.
+    """
+    if not _deferred_rewards:
+        return 0
+    entries: list[LedgerEntry] = [(uid, amount, reason, None) for (uid, reason), amount in _deferred_rewards.items()]
+    _deferred_rewards.clear()
+    try:
+        await _credit_deferred(entries)
+    except DatabaseUnavailable as e:
+        if e.attempted:
+            logger.error("Отложенные награды (%d) могли не начислиться: %s", len(entries), e)
+            return 0
+        for uid, amount, reason, _ in entries:
+            _deferred_rewards[(uid, reason)] += amount
+        return 0
+    return len(entries)
+
+
+@_guarded(idempotent=False)
 async def create_bet(user_id: int | str, game_id: str, team: int, amount: int) -> bool:
-    uid = str(user_id)
+    replicas.pin(("game", game_id))
     try:
-        await execute(
-            "INSERT INTO bets (user_id, game_id, team, amount) VALUES ($1, $2, $3, $4)",
-            uid,
-            game_id,
-            team,
-            amount,
-        )
+        await get_storage().create_bet(str(user_id), game_id, team, amount)
         return True
     except Exception:
         return False
 
 
-async def get_bets_for_game(game_id: str) -> list[asyncpg.Record]:
-    return await query("SELECT user_id, team, amount FROM bets WHERE game_id = $1", game_id)
+@_guarded(idempotent=False)
+async def place_bet(user_id: int | str, game_id: str, team: int, amount: int) -> Optional[int]:
+    """Списывает ставку и записывает ее одной транзакцией.
+
+    Возвращает новый баланс или ``None``, если средств недостаточно.
+    """
+    uid = str(user_id)
+    replicas.pin(("user", uid), ("game", game_id))
+    return await get_storage().place_bet(uid, game_id, team, amount)
+
+
+@_guarded(idempotent=False)
+async def payout_bets(game_id: str, winning_team: int) -> Optional[dict[str, int]]:
+    """Выплачивает банк игры победителям и удаляет ставки.
+
+    Возвращает ``None``, если ставок нет, и пустой словарь, если на
+    победившую команду никто не ставил (ставки при этом остаются).
+    """
+    # Победители заранее неизвестны: все чтения на время идут в основную базу
+    replicas.pin_all()
+    return await get_storage().payout_bets(game_id, winning_team)
+
+
+@_guarded(idempotent=True)
+async def refund_bets(game_id: str) -> int:
+    """Возвращает все ставки игры игрокам. Возвращает число возвращенных ставок."""
+    replicas.pin_all()
+    return await get_storage().refund_bets(game_id)
+
+
+@_guarded(idempotent=True)
+async def record_game_start(game_id: str, game: str, team_one: Sequence[int], team_two: Sequence[int]) -> None:
+    roster = [(str(uid), 1) for uid in team_one] + [(str(uid), 2) for uid in team_two]
+    await get_storage().record_game_start(game_id, game, roster)
+
+
+@_guarded(idempotent=True)
+async def record_game_result(
+    game_id: str,
+    winning_team: Optional[int],
+    game: str = "",
+    rating_changes: Optional[dict[str, float]] = None,
+) -> bool:
+    """Фиксирует исход игры и инкрементально обновляет статистику участников.
+
+    ``winning_team=None`` закрывает игру без результата. Изменения рейтинга
+    пишутся в той же транзакции, поэтому повторный вызов для уже завершенной
+    игры ничего не меняет и возвращает ``False``.
+    """
+    replicas.pin_all()
+    return await get_storage().record_game_result(
+        game_id, winning_team, game, rating_changes or {}, DEFAULT_RATING
+    )
+
+
+@_guarded(idempotent=True)
+async def get_player_stats(user_id: int | str) -> Optional[Row]:
+    uid = str(user_id)
+    return await _read(lambda storage: storage.get_player_stats(uid), ("user", uid))
+
 
+@_guarded(idempotent=True)
+async def get_bets_for_game(game_id: str) -> list[Row]:
+    return await _read(lambda storage: storage.get_bets_for_game(game_id), ("game", game_id))
 
+
+@_guarded(idempotent=False)
 async def record_purchase(user_id: int | str, item_key: str, item_name: str, price: int) -> None:
+    await get_storage().record_purchase(str(user_id), item_key, item_name, price)
+
+
+@_guarded(idempotent=True)
+async def get_shop_items() -> list[Row]:
+    return await _read(lambda storage: storage.get_shop_items(), ("shop", ""))
+
+
+@_guarded(idempotent=True)
+async def set_shop_item_price(item_key: str, price: int) -> bool:
+    replicas.pin(("shop", ""))
+    return await get_storage().set_shop_item_price(item_key, price)
+
+
+@_guarded(idempotent=True)
+async def purchase_item(
+    user_id: int | str,
+    item_key: str,
+    item_name: str,
+    price: int,
+    interaction_id: int | str,
+) -> PurchaseResult:
+    """Проводит покупку одной транзакцией: запись покупки и условное списание.
+
+    Покупка идемпотентна по ``interaction_id``: повторный вызов с тем же
+    идентификатором ничего не списывает и возвращает ``PURCHASE_DUPLICATE``
+    с уже записанной покупкой. Повтор бывает и после потерянного ответа на
+    успешную транзакцию, поэтому невыданный товар (``fulfilled=False``)
+    вызывающий выдает как при первой покупке.
+    """
     uid = str(user_id)
-    await execute(
-        "INSERT INTO purchases (user_id, item_key, item_name, price) VALUES ($1, $2, $3, $4)",
-        uid,
-        item_key,
-        item_name,
-        price,
+    replicas.pin(("user", uid))
+    return await get_storage().purchase_item(uid, item_key, item_name, price, str(interaction_id))
+
+
+@_guarded(idempotent=True)
+async def mark_purchase_fulfilled(purchase_id: int) -> bool:
+    return await get_storage().mark_purchase_fulfilled(purchase_id)
+
+
+@_guarded(idempotent=True)
+async def refund_unfulfilled_purchases(older_than: float = PURCHASE_REFUND_AFTER) -> list[Row]:
+    """Возвращает деньги за покупки, товар по которым так и не выдан.
+
+    Так закрываются покупки с неизвестным исходом: списание прошло, но
+    ответ базы не дошел или бот остановился до выдачи.
+    """
+    replicas.pin_all()
+    return await get_storage().refund_unfulfilled_purchases(older_than)
+
+
+@_guarded(idempotent=True, fallback=_default_ratings)
+async def get_player_ratings(game: str, user_ids: Sequence[int | str]) -> dict[str, float]:
+    uids = [str(uid) for uid in user_ids]
+    ratings = {uid: DEFAULT_RATING for uid in uids}
+    ratings.update(
+        await _read(lambda storage: storage.get_player_ratings(game, uids), *(("user", uid) for uid in uids))
     )
+    return ratings
 
 
+@_guarded(idempotent=True)
 async def clear_bets_for_game(game_id: str) -> None:
-    await execute("DELETE FROM bets WHERE game_id = $1", game_id)
+    replicas.pin(("game", game_id))
+    await get_storage().clear_bets_for_game(game_id)
+
+
+@_guarded(idempotent=True)
+async def get_guild_settings(guild_id: Optional[int | str] = None) -> list[Row]:
+    return await get_storage().get_guild_settings(str(guild_id) if guild_id is not None else None)
+
+
+@_guarded(idempotent=True)
+async def set_guild_setting(guild_id: int | str, column: str, value: Optional[int | str]) -> None:
+    if column not in GUILD_SETTINGS_COLUMNS:
+        raise ValueError(f"Неизвестная настройка гильдии: {column}")
+    # Имя столбца подставляется в SQL хранилища только из белого списка выше
+    await get_storage().set_guild_setting(str(guild_id), column, value)
+
+
+@_guarded(idempotent=False)
+async def create_complaint(
+    guild_id: Optional[int],
+    author_id: int | str,
+    voice_channel_id: Optional[int],
+    body: str,
+) -> int:
+    return await get_storage().create_complaint(
+        str(guild_id) if guild_id else None,
+        str(author_id),
+        str(voice_channel_id) if voice_channel_id else None,
+        body,
+    )
+
 
+@_guarded(idempotent=True)
+async def search_complaints(
+    guild_id: int | str,
+    text: Optional[str],
+    author_id: Optional[int | str] = None,
+    before_id: Optional[int] = None,
+    limit: int = COMPLAINTS_PAGE_SIZE,
+) -> list[Row]:
+    """Ищет жалобы гильдии от новых к старым с постраничной выборкой по ключу.
+
+    Следующая страница запрашивается с ``before_id`` — идентификатором
+    последней жалобы предыдущей; смещение не используется, поэтому глубина
+    листания не влияет на время запроса. ``text`` разбирается как
+    ``websearch_to_tsquery`` (кавычки, ``or``, минус), совпадения в
+    ``snippet`` выделены жирным.
+    """
+    guild = str(guild_id)
+    author = str(author_id) if author_id else None
+    return await _read(lambda storage: storage.search_complaints(guild, text, author, before_id, limit))
+
+
+async def export_table_csv(table: str, output: IO[bytes]) -> None:
+    """Потоково выгружает таблицу в CSV."""
+    if table not in EXPORT_COLUMNS:
+        raise ValueError(f"Неизвестная таблица для выгрузки: {table}")
+    await get_storage().export_table_csv(table, output)
+
+
+async def import_balances(
+    records: Iterable[tuple[int, str, int]],
+    mode: str = IMPORT_MODE_ADD,
+    ref: Optional[str] = None,
+) -> int:
+    """Применяет массовую корректировку балансов одним слиянием.
+
+    ``records`` — итерируемый поток ``(номер строки, user_id, сумма)``. В
+    режиме ``add`` сумма прибавляется к балансу, в режиме ``set`` заменяет
+    его (при повторах побеждает последняя строка). Возвращает число
+    затронутых пользователей.
+    """
+    if mode not in (IMPORT_MODE_ADD, IMPORT_MODE_SET):
+        raise ValueError(f"Неизвестный режим импорта: {mode}")
+    replicas.pin_all()
+    return await get_storage().import_balances(records, mode, ref)
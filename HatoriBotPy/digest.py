@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Iterator, Optional
+
+import discord
+
+from .config import settings
+from .entities import entities
+from .supervisor import supervisor
+
+logger = logging.getLogger("HatoriBotPy.digest")
+
+# Ограничения Discord на одно сообщение
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+MAX_DESCRIPTION = 4096
+MAX_CONTENT = 2000
+
+MAX_PENDING = 500
+
+
+@dataclass(slots=True)
+class _Entry:
+    line: Optional[str] = None
+    embed: Optional[discord.Embed] = None
+    content: Optional[str] = None
+
+
+class DigestSink:
+    """Буфер служебных сообщений для одного вида канала во всех гильдиях.
+
+    События копятся в памяти по гильдиям и раз в ``interval`` секунд уходят
+    сводкой в канал своей гильдии:
+    строки склеиваются в общие embed, до десяти embed в одном сообщении.
+    Срочное событие отправляет накопленное сразу, не дожидаясь интервала.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        channel: Callable[[int], Optional[discord.abc.Messageable]],
+        *,
+        title: str,
+        color: discord.Color,
+        interval: float,
+        max_pending: int = MAX_PENDING,
+    ) -> None:
+        self.name = name
+        self._channel = channel
+        self.title = title
+        self.color = color
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: Dict[int, Deque[_Entry]] = {}
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self.posted = 0
+        self.sent_messages = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    def add_line(self, guild_id: int, line: str) -> None:
+        # Время события: сводка уходит с задержкой
+        self._append(guild_id, _Entry(line=f"{discord.utils.format_dt(discord.utils.utcnow(), 'T')} {line}"))
+
+    def add_embed(
+        self,
+        guild_id: int,
+        embed: discord.Embed,
+        *,
+        content: Optional[str] = None,
+        urgent: bool = False,
+    ) -> None:
+        # Копия: отправитель может дальше менять свой embed
+        embed = embed.copy()
+        if embed.timestamp is None:
+            embed.timestamp = discord.utils.utcnow()
+        self._append(guild_id, _Entry(embed=embed, content=content))
+        if urgent:
+            self._wake.set()
+
+    def _append(self, guild_id: int, entry: _Entry) -> None:
+        pending = self._pending.get(guild_id)
+        if pending is None:
+            pending = self._pending[guild_id] = deque(maxlen=self.max_pending)
+        if len(pending) == pending.maxlen:
+            self.dropped += 1
+        pending.append(entry)
+        self.posted += 1
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            pending, self._pending = self._pending, {}
+            for guild_id, entries in pending.items():
+                channel = self._channel(guild_id)
+                if channel is None:
+                    continue
+                for content, embeds in self._messages(list(entries)):
+                    try:
+                        await channel.send(content=content, embeds=embeds)
+                        self.sent_messages += 1
+                    except discord.HTTPException:
+                        logger.exception(
+                            "Не удалось отправить сводку %s на сервер %s (%d embed)",
+                            self.name,
+                            guild_id,
+                            len(embeds),
+                        )
+
+    def _embeds(self, entries: list[_Entry]) -> Iterator[tuple[Optional[str], discord.Embed]]:
+        lines: list[str] = []
+        size = 0
+
+        def digest() -> discord.Embed:
+            embed = discord.Embed(title=self.title, description="\n".join(lines), color=self.color)
+            embed.set_footer(text=f"Событий: {len(lines)}")
+            return embed
+
+        for entry in entries:
+            if entry.line is not None:
+                line = entry.line[:MAX_DESCRIPTION]
+                if lines and size + len(line) + 1 > MAX_DESCRIPTION - len(self.title) - 20:
+                    yield None, digest()
+                    lines, size = [], 0
+                lines.append(line)
+                size += len(line) + 1
+                continue
+            # Отдельный embed сохраняет порядок относительно строк
+            if lines:
+                yield None, digest()
+                lines, size = [], 0
+            yield entry.content, entry.embed
+        if lines:
+            yield None, digest()
+
+    def _messages(self, entries: list[_Entry]) -> Iterator[tuple[Optional[str], list[discord.Embed]]]:
+        contents: list[str] = []
+        embeds: list[discord.Embed] = []
+        chars = 0
+        for content, embed in self._embeds(entries):
+            length = len(embed)
+            merged = contents + [content] if content and content not in contents else contents
+            if embeds and (
+                len(embeds) == MAX_EMBEDS
+                or chars + length > MAX_EMBED_CHARS
+                or len(" ".join(merged)) > MAX_CONTENT
+            ):
+                yield " ".join(contents) or None, embeds
+                embeds, chars = [], 0
+                merged = [content] if content else []
+            contents = merged
+            embeds.append(embed)
+            chars += length
+        if embeds:
+            yield " ".join(contents) or None, embeds
+
+    def report(self) -> str:
+        return (
+            f"{self.name:<24} в буфере {len(self)} ({len(self._pending)} гильдий), событий {self.posted}, "
+            f"сообщений {self.sent_messages}, потеряно {self.dropped}"
+        )
+
+
+purchase_log = DigestSink(
+    "purchase_log",
+    lambda guild_id: entities.get(guild_id).purchase_log_channel,
+    title="🛒 Покупки",
+    color=discord.Color.green(),
+    interval=settings.LOG_DIGEST_INTERVAL,
+)
+admin_alerts = DigestSink(
+    "admin_alert",
+    lambda guild_id: entities.get(guild_id).admin_alert_channel,
+    title="Уведомления",
+    color=discord.Color.orange(),
+    interval=settings.LOG_DIGEST_INTERVAL,
+)
+DIGESTS = (purchase_log, admin_alerts)
+
+
+def start_digests() -> None:
+    for sink in DIGESTS:
+        supervisor.spawn(sink.run(), name=f"digest-{sink.name}", category="digest")
+
+
+async def flush_digests() -> None:
+    for sink in DIGESTS:
+        await sink.flush()
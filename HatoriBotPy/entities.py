@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import logging
+from typing import Dict, Optional
+
+import discord
+
+from .guild_config import GuildConfig, GuildConfigs, guild_configs
+
+logger = logging.getLogger("HatoriBotPy.entities")
+
+COMPLAINTS_CHANNEL = "complaints"
+BETS_CHANNEL = "bets"
+PURCHASE_LOG_CHANNEL = "purchase_log"
+ADMIN_ALERT_CHANNEL = "admin_alert"
+ADMIN_ROLE = "admin"
+MANAGER_ROLE = "manager"
+
+
+class GuildEntities:
+    """Каналы и роли из настроек одной гильдии."""
+
+    def __init__(self, guild_id: int, config: GuildConfig) -> None:
+        self.guild_id = guild_id
+        self._channel_ids = {
+            name: cid
+            for name, cid in (
+                (COMPLAINTS_CHANNEL, config.complaints_channel_id),
+                (BETS_CHANNEL, config.bets_channel_id),
+                (PURCHASE_LOG_CHANNEL, config.purchase_log_channel_id),
+                (ADMIN_ALERT_CHANNEL, config.admin_alert_channel_id),
+            )
+            if cid
+        }
+        self._role_ids = {
+            name: rid
+            for name, rid in ((ADMIN_ROLE, config.admin_role_id), (MANAGER_ROLE, config.manager_role_id))
+            if rid
+        }
+        self._channels: Dict[str, discord.TextChannel] = {}
+        self._roles: Dict[str, discord.Role] = {}
+
+    @property
+    def complaints_channel(self) -> Optional[discord.TextChannel]:
+        return self._channels.get(COMPLAINTS_CHANNEL)
+
+    @property
+    def bets_channel(self) -> Optional[discord.TextChannel]:
+        return self._channels.get(BETS_CHANNEL)
+
+    @property
+    def purchase_log_channel(self) -> Optional[discord.TextChannel]:
+        return self._channels.get(PURCHASE_LOG_CHANNEL)
+
+    @property
+    def admin_alert_channel(self) -> Optional[discord.TextChannel]:
+        return self._channels.get(ADMIN_ALERT_CHANNEL)
+
+    @property
+    def admin_role(self) -> Optional[discord.Role]:
+        return self._roles.get(ADMIN_ROLE)
+
+    @property
+    def manager_role(self) -> Optional[discord.Role]:
+        return self._roles.get(MANAGER_ROLE)
+
+    def resolve(self, guild: discord.Guild) -> None:
+        # После недоступности гильдии discord.py создает новые объекты каналов и ролей
+        for name, cid in self._channel_ids.items():
+            channel = guild.get_channel(cid)
+            if channel is None:
+                logger.warning("Канал %s (%s) не найден на сервере %s", name, cid, guild.id)
+                continue
+            self._set_channel(name, channel)
+        for name, rid in self._role_ids.items():
+            role = guild.get_role(rid)
+            if role is None:
+                logger.warning("Роль %s (%s) не найдена на сервере %s", name, rid, guild.id)
+                continue
+            self._roles[name] = role
+
+    def _set_channel(self, name: str, channel: object) -> None:
+        if isinstance(channel, discord.TextChannel):
+            self._channels[name] = channel
+        else:
+            logger.warning("Канал %s (%s) не текстовый", name, getattr(channel, "id", "-"))
+            self._channels.pop(name, None)
+
+    def channel_changed(self, channel: discord.abc.GuildChannel) -> None:
+        for name, cid in self._channel_ids.items():
+            if cid == channel.id:
+                self._set_channel(name, channel)
+
+    def channel_deleted(self, channel: discord.abc.GuildChannel) -> None:
+        for name, cid in self._channel_ids.items():
+            if cid == channel.id:
+                logger.warning("Канал %s (%s) удален", name, cid)
+                self._channels.pop(name, None)
+
+    def role_changed(self, role: discord.Role) -> None:
+        for name, rid in self._role_ids.items():
+            if rid == role.id:
+                self._roles[name] = role
+
+    def role_deleted(self, role: discord.Role) -> None:
+        for name, rid in self._role_ids.items():
+            if rid == role.id:
+                logger.warning("Роль %s (%s) удалена", name, rid)
+                self._roles.pop(name, None)
+
+
+class ConfiguredEntities:
+    """Каналы и роли из настроек всех гильдий, разрешенные один раз при ``on_ready``.
+
+    Дальше объекты обновляются по событиям создания, изменения и удаления
+    каналов и ролей, а при смене настроек гильдии разрешаются заново, поэтому
+    горячие пути не ищут их в кэше и не ходят в REST.
+    """
+
+    def __init__(self, configs: GuildConfigs) -> None:
+        self._configs = configs
+        self._guilds: Dict[int, GuildEntities] = {}
+        self._client: Optional[discord.Client] = None
+        configs.on_change(self.config_changed)
+
+    def get(self, guild_id: Optional[int]) -> GuildEntities:
+        if guild_id is None:
+            return GuildEntities(0, GuildConfig())
+        entities = self._guilds.get(guild_id)
+        if entities is None:
+            # Гильдия еще не разрешена: пустой набор, чтобы вызывающий код не проверял None
+            entities = GuildEntities(guild_id, GuildConfig())
+        return entities
+
+    def _build(self, guild: discord.Guild) -> None:
+        entities = GuildEntities(guild.id, self._configs.get(guild.id))
+        entities.resolve(guild)
+        self._guilds[guild.id] = entities
+
+    async def resolve(self, client: discord.Client) -> None:
+        self._client = client
+        for guild in client.guilds:
+            if not guild.unavailable:
+                self._build(guild)
+        logger.info("Разрешены каналы и роли для гильдий: %d", len(self._guilds))
+
+    def guild_available(self, guild: discord.Guild) -> None:
+        self._build(guild)
+
+    def guild_removed(self, guild: discord.Guild) -> None:
+        self._guilds.pop(guild.id, None)
+
+    def config_changed(self, guild_id: int, config: GuildConfig) -> None:
+        guild = self._client.get_guild(guild_id) if self._client is not None else None
+        if guild is not None and not guild.unavailable:
+            self._build(guild)
+
+    def channel_changed(self, channel: discord.abc.GuildChannel) -> None:
+        entities = self._guilds.get(channel.guild.id)
+        if entities is not None:
+            entities.channel_changed(channel)
+
+    def channel_deleted(self, channel: discord.abc.GuildChannel) -> None:
+        entities = self._guilds.get(channel.guild.id)
+        if entities is not None:
+            entities.channel_deleted(channel)
+
+    def role_changed(self, role: discord.Role) -> None:
+        entities = self._guilds.get(role.guild.id)
+        if entities is not None:
+            entities.role_changed(role)
+
+    def role_deleted(self, role: discord.Role) -> None:
+        entities = self._guilds.get(role.guild.id)
+        if entities is not None:
+            entities.role_deleted(role)
+
+
+entities = ConfiguredEntities(guild_configs)
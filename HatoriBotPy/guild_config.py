@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional
+
+import asyncpg
+
+from . import db
+from .config import settings
+from .resilience import backoff_delay
+from .supervisor import supervisor
+
+logger = logging.getLogger("HatoriBotPy.guild_config")
+
+# Полная перезагрузка на случай, если оповещение потерялось вместе с соединением
+RELOAD_INTERVAL = 300.0
+LISTENER_RETRY_CAP = 60.0
+
+
+@dataclass(frozen=True, slots=True)
+class GuildConfig:
+    admin_role_id: Optional[int] = None
+    manager_role_id: Optional[int] = None
+    complaints_channel_id: Optional[int] = None
+    bets_channel_id: Optional[int] = None
+    purchase_log_channel_id: Optional[int] = None
+    admin_alert_channel_id: Optional[int] = None
+    voice_reward_interval: int = 60
+    voice_reward_amount: int = 5
+    message_reward_amount: int = 1
+    message_cooldown_ms: int = 15000
+    admin_notice_cooldown: int = 600
+
+
+GUILD_CONFIG_LABELS = {
+    "admin_role_id": "Роль администраторов",
+    "manager_role_id": "Роль менеджеров игр",
+    "complaints_channel_id": "Канал жалоб",
+    "bets_channel_id": "Канал ставок",
+    "purchase_log_channel_id": "Лог покупок",
+    "admin_alert_channel_id": "Уведомления администрации",
+    "voice_reward_interval": "Интервал награды за голос, с",
+    "voice_reward_amount": "Награда за голос",
+    "message_reward_amount": "Награда за сообщение",
+    "message_cooldown_ms": "Пауза между наградами за сообщения, мс",
+    "admin_notice_cooldown": "Пауза между вызовами администрации, с",
+}
+
+
+def _from_environment() -> GuildConfig:
+    return GuildConfig(
+        admin_role_id=settings.ADMIN_ROLE_ID,
+        manager_role_id=settings.CUSTOM_GAME_MANAGER_ROLE_ID,
+        complaints_channel_id=settings.COMPLAINTS_CHANNEL_ID,
+        bets_channel_id=settings.BETS_CHANNEL_ID,
+        purchase_log_channel_id=settings.PURCHASE_LOG_CHANNEL,
+        admin_alert_channel_id=settings.ADMIN_ALERT_CHANNEL_ID,
+        voice_reward_interval=settings.VOICE_REWARD_INTERVAL,
+        voice_reward_amount=settings.VOICE_REWARD_AMOUNT,
+        message_reward_amount=settings.MESSAGE_REWARD_AMOUNT,
+        message_cooldown_ms=settings.MESSAGE_COOLDOWN_MS,
+        admin_notice_cooldown=settings.ADMIN_NOTICE_COOLDOWN,
+    )
+
+
+class GuildConfigs:
+    """Настройки гильдий из таблицы ``guild_settings`` в памяти процесса.
+
+    Чтение — поиск в словаре по id гильдии, без обращения к базе. Пустые
+    столбцы берутся из окружения, поэтому бот на одном сервере работает
+    без единой строки в таблице. Изменения приходят через LISTEN/NOTIFY.
+    """
+
+    def __init__(self, defaults: GuildConfig) -> None:
+        self.defaults = defaults
+        self._configs: Dict[int, GuildConfig] = {}
+        self._listeners: list[Callable[[int, GuildConfig], None]] = []
+        self.reloads = 0
+        self.notifications = 0
+
+    def __len__(self) -> int:
+        return len(self._configs)
+
+    def __iter__(self) -> Iterator[tuple[int, GuildConfig]]:
+        return iter(list(self._configs.items()))
+
+    def get(self, guild_id: Optional[int]) -> GuildConfig:
+        if guild_id is None:
+            return self.defaults
+        return self._configs.get(guild_id, self.defaults)
+
+    def on_change(self, listener: Callable[[int, GuildConfig], None]) -> None:
+        self._listeners.append(listener)
+
+    def _from_row(self, row: Mapping[str, Any]) -> GuildConfig:
+        values = {}
+        for field in dataclasses.fields(GuildConfig):
+            value = row.get(field.name)
+            if value is not None:
+                values[field.name] = int(value)
+        return dataclasses.replace(self.defaults, **values)
+
+    def _apply(self, guild_id: int, config: Optional[GuildConfig]) -> None:
+        previous = self.get(guild_id)
+        if config is None or config == self.defaults:
+            self._configs.pop(guild_id, None)
+            config = self.defaults
+        else:
+            self._configs[guild_id] = config
+        if config != previous:
+            for listener in self._listeners:
+                listener(guild_id, config)
+
+    async def load_all(self) -> None:
+        rows = await db.get_guild_settings()
+        loaded = {int(row["guild_id"]): self._from_row(row) for row in rows}
+        for guild_id in set(self._configs) - set(loaded):
+            self._apply(guild_id, None)
+        for guild_id, config in loaded.items():
+            self._apply(guild_id, config)
+        log = logger.info if not self.reloads else logger.debug
+        self.reloads += 1
+        log("Загружены настройки гильдий: %d", len(loaded))
+
+    async def refresh(self, guild_id: int) -> GuildConfig:
+        rows = await db.get_guild_settings(guild_id)
+        self._apply(guild_id, self._from_row(rows[0]) if rows else None)
+        return self.get(guild_id)
+
+    async def update(self, guild_id: int, field: str, value: Optional[int]) -> GuildConfig:
+        kind = db.GUILD_SETTINGS_COLUMNS[field]
+        stored = str(value) if value is not None and kind == "TEXT" else value
+        await db.set_guild_setting(guild_id, field, stored)
+        # Свой процесс обновляется сразу, остальные — по оповещению
+        return await self.refresh(guild_id)
+
+    def _notified(self, conn: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        self.notifications += 1
+        if supervisor.closing:
+            return
+        try:
+            guild_id = int(payload)
+        except ValueError:
+            return
+        supervisor.spawn(self._refresh_quietly(guild_id), name=f"guild-config-{guild_id}", category="guild_config")
+
+    async def _refresh_quietly(self, guild_id: int) -> None:
+        try:
+            await self.refresh(guild_id)
+        except db.DatabaseUnavailable:
+            logger.warning("Настройки гильдии %s не обновлены: база недоступна", guild_id)
+
+    async def watch(self) -> None:
+        if not db.supports_notify():
+            # Без оповещений (SQLite, память) изменения других процессов видны после перезагрузки
+            await self._poll()
+            return
+        attempt = 0
+        while True:
+            try:
+                conn = await db.open_listener(db.GUILD_SETTINGS_CHANNEL, self._notified)
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError):
+                delay = backoff_delay(attempt, cap=LISTENER_RETRY_CAP)
+                attempt += 1
+                logger.warning("Нет подписки на изменения настроек гильдий, повтор через %.1f с", delay)
+                await asyncio.sleep(delay)
+                continue
+            attempt = 0
+            lost = asyncio.Event()
+            conn.add_termination_listener(lambda _: lost.set())
+            try:
+                while not lost.is_set():
+                    # Изменения, сделанные пока подписки не было, подтягиваются перезагрузкой
+                    try:
+                        await self.load_all()
+                    except db.DatabaseUnavailable:
+                        logger.warning("Настройки гильдий не перезагружены: база недоступна")
+                    try:
+                        await asyncio.wait_for(lost.wait(), timeout=RELOAD_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                logger.warning("Подписка на изменения настроек гильдий потеряна")
+            finally:
+                if not conn.is_closed():
+                    await conn.close(timeout=settings.DB_TIMEOUT)
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(RELOAD_INTERVAL)
+            try:
+                await self.load_all()
+            except db.DatabaseUnavailable:
+                logger.warning("Настройки гильдий не перезагружены: база недоступна")
+
+    def report(self) -> list[str]:
+        return [
+            f"Гильдий с настройками: {len(self._configs)}",
+            f"Перезагрузок: {self.reloads}, оповещений: {self.notifications}",
+        ]
+
+
+guild_configs = GuildConfigs(_from_environment())
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import discord
+
+from .db import DatabaseUnavailable
+from .logs import bind_interaction
+from .supervisor import supervisor
+from .tracing import span
+
+logger = logging.getLogger("HatoriBotPy.interactions")
+
+# Discord ждет первого ответа 3 секунды; после ACK_BUDGET секунд от создания
+# взаимодействия обработчик автоматически откладывает ответ
+ACK_BUDGET = 2.0
+_GUARD_KEY = "ack_guard"
+
+DATABASE_UNAVAILABLE_TEXT = "База данных временно недоступна, попробуйте через минуту."
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+@dataclass
+class HandlerStats:
+    calls: int = 0
+    deferred: int = 0
+    failures: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    @property
+    def average_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+handler_stats: Dict[str, HandlerStats] = {}
+
+
+class AckGuard:
+    """Следит за бюджетом ответа на одно взаимодействие.
+
+    Все ответы обработчика идут через :func:`respond`, поэтому автоматический
+    ``defer`` и отправка сообщения не могут произойти одновременно.
+    """
+
+    def __init__(self, interaction: discord.Interaction, ephemeral: bool) -> None:
+        self.interaction = interaction
+        self.ephemeral = ephemeral
+        self.deferred = False
+        self._lock = asyncio.Lock()
+
+    async def defer_if_pending(self) -> None:
+        async with self._lock:
+            if self.interaction.response.is_done():
+                return
+            try:
+                await self.interaction.response.defer(ephemeral=self.ephemeral)
+            except discord.HTTPException:
+                logger.warning("Не удалось отложить ответ на взаимодействие %s", self.interaction.id)
+                return
+            self.deferred = True
+
+    async def send(self, content: Optional[str] = None, **kwargs: Any) -> None:
+        async with self._lock:
+            await _send(self.interaction, content, **kwargs)
+
+
+async def _send(interaction: discord.Interaction, content: Optional[str], **kwargs: Any) -> None:
+    if interaction.response.is_done():
+        await interaction.followup.send(content, **kwargs)
+    else:
+        await interaction.response.send_message(content, **kwargs)
+
+
+async def respond(interaction: discord.Interaction, content: Optional[str] = None, **kwargs: Any) -> None:
+    """Отвечает на взаимодействие или, если ответ уже отложен, шлет followup."""
+    guard = interaction.extras.get(_GUARD_KEY)
+    if isinstance(guard, AckGuard):
+        await guard.send(content, **kwargs)
+    else:
+        await _send(interaction, content, **kwargs)
+
+
+async def notify_database_unavailable(interaction: discord.Interaction) -> None:
+    try:
+        await respond(interaction, DATABASE_UNAVAILABLE_TEXT, ephemeral=True)
+    except discord.HTTPException:
+        logger.warning("Не удалось сообщить о недоступности базы на взаимодействие %s", interaction.id)
+
+
+def fast_ack(name: Optional[str] = None, *, budget: float = ACK_BUDGET, ephemeral: bool = True) -> Callable[[F], F]:
+    """Декоратор обработчиков view и modal с автоматическим ``defer``.
+
+    Если обработчик не ответил за ``budget`` секунд с момента создания
+    взаимодействия, ответ откладывается, а последующие :func:`respond`
+    прозрачно уходят followup-сообщениями. Обработчики не должны открывать
+    modal после ``defer``, поэтому вызовы ``send_modal`` так не оборачиваются.
+    """
+
+    def decorator(func: F) -> F:
+        handler_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            interaction = next((arg for arg in args if isinstance(arg, discord.Interaction)), None)
+            if interaction is None:
+                return await func(*args, **kwargs)
+
+            bind_interaction(interaction, handler_name)
+            guard = AckGuard(interaction, ephemeral)
+            interaction.extras[_GUARD_KEY] = guard
+            age = max(0.0, time.time() - interaction.created_at.timestamp())
+            loop = asyncio.get_running_loop()
+            timer = loop.call_later(
+                max(0.0, budget - age),
+                lambda: supervisor.spawn(
+                    guard.defer_if_pending(),
+                    name=f"ack-{interaction.id}",
+                    category="interaction.defer",
+                ),
+            )
+
+            stats = handler_stats.setdefault(handler_name, HandlerStats())
+            stats.calls += 1
+            started = time.perf_counter()
+            try:
+                with span(handler_name):
+                    return await func(*args, **kwargs)
+            except DatabaseUnavailable as e:
+                stats.failures += 1
+                logger.warning("Обработчик %s: база данных недоступна (%s)", handler_name, e)
+                await notify_database_unavailable(interaction)
+                return None
+            except Exception:
+                stats.failures += 1
+                raise
+            finally:
+                timer.cancel()
+                elapsed = time.perf_counter() - started
+                stats.total_time += elapsed
+                stats.max_time = max(stats.max_time, elapsed)
+                if guard.deferred:
+                    stats.deferred += 1
+                    logger.info("Обработчик %s ответил с задержкой: %.2f с", handler_name, elapsed)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
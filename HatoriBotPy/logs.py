@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import atexit
+import contextvars
+import copy
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+import discord
+
+from .runtime import json_dumps
+
+# Контекст текущего события: гильдия, пользователь и обработчик. Значение
+# копируется в запись в момент логирования, пока запись еще в потоке цикла
+_context: contextvars.ContextVar[Tuple[Optional[int], Optional[int], Optional[str]]] = contextvars.ContextVar(
+    "hatori_log_context", default=(None, None, None)
+)
+
+_PLAIN_ARGS = (str, int, float, bool, type(None))
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def bind_log_context(
+    guild: Optional[int] = None,
+    user: Optional[int] = None,
+    handler: Optional[str] = None,
+) -> None:
+    """Помечает все записи текущей задачи гильдией, пользователем и обработчиком."""
+    _context.set((guild, user, handler))
+
+
+def bind_interaction(interaction: discord.Interaction, handler: Optional[str] = None) -> None:
+    bind_log_context(interaction.guild_id, interaction.user.id, handler)
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """Кладет запись в очередь, не форматируя ее в потоке цикла событий."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.guild, record.user, record.handler = _context.get()
+        # Аргументы-примитивы форматируются позже в потоке слушателя; прочие
+        # объекты (участники, каналы) могут измениться, поэтому их фиксируем сразу
+        args = record.args
+        if args and not all(isinstance(arg, _PLAIN_ARGS) for arg in (args.values() if isinstance(args, dict) else args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Ограничивает частоту записей с одного места вызова.
+
+    Действует только на уровни ниже ``max_level``: на каждое место вызова
+    (логгер, шаблон сообщения) пропускается не больше ``rate`` записей в
+    секунду, число отброшенных попадает в следующую пропущенную запись.
+    """
+
+    def __init__(self, rate: float, burst: int = 10, max_level: int = logging.INFO) -> None:
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_level = max_level
+        self._buckets: Dict[Tuple[str, Any], list[float]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.max_level or self.rate <= 0:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            # [токены, время последнего пополнения, отброшено]
+            bucket = self._buckets[key] = [float(self.burst), now, 0.0]
+        tokens = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1.0:
+            bucket[0] = tokens
+            bucket[2] += 1
+            return False
+        bucket[0] = tokens - 1.0
+        if bucket[2]:
+            record.suppressed = int(bucket[2])
+            bucket[2] = 0.0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in ("guild", "user", "handler", "suppressed"):
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json_dumps(payload)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        tags = [f"{field}={getattr(record, field)}" for field in ("guild", "user", "handler") if getattr(record, field, None)]
+        return f"{line} [{' '.join(tags)}]" if tags else line
+
+
+def setup_logging(
+    level: str = "INFO",
+    fmt: str = "json",
+    path: Optional[str] = None,
+    debug_rate: float = 5.0,
+) -> logging.handlers.QueueListener:
+    """Направляет логи через очередь в фоновый поток.
+
+    Обработчики в цикле событий только кладут запись в очередь; запись
+    в stderr и файл выполняет ``QueueListener`` в своем потоке.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter: logging.Formatter
+    if fmt == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = _TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    sinks: list[logging.Handler] = [logging.StreamHandler(sys.stderr)]
+    if path:
+        sinks.append(logging.handlers.WatchedFileHandler(path, encoding="utf-8"))
+    for sink in sinks:
+        sink.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    enqueue = _EnqueueHandler(log_queue)
+    enqueue.addFilter(RateLimitFilter(debug_rate))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(enqueue)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *sinks, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging() -> None:
+    """Дописывает оставшиеся в очереди записи и останавливает поток."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import itertools
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional, Tuple
+
+RATING_BAND_WIDTH = 100.0
+# Каждые WIDEN_INTERVAL секунд ожидания игроку разрешается брать соседей
+# из еще одной полосы рейтинга в каждую сторону
+WIDEN_INTERVAL = 30.0
+MAX_BAND_SPREAD = 5
+
+# Очереди независимы в каждой гильдии: (id гильдии, ключ игры)
+QueueKey = Tuple[int, str]
+
+
+@dataclass
+class QueueEntry:
+    user_id: int
+    game: QueueKey
+    rating: float
+    joined_at: float
+    band: int
+
+
+@dataclass
+class Lobby:
+    game: QueueKey
+    players: list[QueueEntry]
+
+
+class MatchQueue:
+    """Очередь подбора игроков с индексом по играм и полосам рейтинга.
+
+    Игроки хранятся в упорядоченных по времени входа корзинах
+    ``(гильдия, игра) -> полоса -> {user_id: запись}``, поэтому вход и выход выполняются
+    за O(1), а подбор лобби смотрит только на головы непустых корзин.
+    """
+
+    def __init__(
+        self,
+        lobby_size: int,
+        *,
+        band_width: float = RATING_BAND_WIDTH,
+        widen_interval: float = WIDEN_INTERVAL,
+        max_spread: int = MAX_BAND_SPREAD,
+    ) -> None:
+        if lobby_size < 2:
+            raise ValueError("Размер лобби должен быть не меньше 2")
+        self.lobby_size = lobby_size
+        self.band_width = band_width
+        self.widen_interval = widen_interval
+        self.max_spread = max_spread
+        self._buckets: Dict[QueueKey, Dict[int, OrderedDict[int, QueueEntry]]] = {}
+        self._entries: Dict[int, QueueEntry] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self._entries
+
+    def get(self, user_id: int) -> Optional[QueueEntry]:
+        return self._entries.get(user_id)
+
+    def size(self, game: QueueKey) -> int:
+        return sum(len(bucket) for bucket in self._buckets.get(game, {}).values())
+
+    def join(self, user_id: int, game: QueueKey, rating: float, now: Optional[float] = None) -> bool:
+        if user_id in self._entries:
+            return False
+        entry = QueueEntry(
+            user_id=user_id,
+            game=game,
+            rating=rating,
+            joined_at=time.monotonic() if now is None else now,
+            band=int(rating // self.band_width),
+        )
+        self._entries[user_id] = entry
+        self._buckets.setdefault(game, {}).setdefault(entry.band, OrderedDict())[user_id] = entry
+        return True
+
+    def leave(self, user_id: int) -> Optional[QueueEntry]:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return None
+        bands = self._buckets[entry.game]
+        bucket = bands[entry.band]
+        del bucket[user_id]
+        if not bucket:
+            del bands[entry.band]
+            if not bands:
+                del self._buckets[entry.game]
+        return entry
+
+    def clear(self, game: QueueKey) -> list[QueueEntry]:
+        removed = [entry for bucket in self._buckets.pop(game, {}).values() for entry in bucket.values()]
+        for entry in removed:
+            del self._entries[entry.user_id]
+        return removed
+
+    def form_lobbies(self, now: Optional[float] = None) -> list[Lobby]:
+        now = time.monotonic() if now is None else now
+        lobbies: list[Lobby] = []
+        for game in list(self._buckets):
+            lobbies.extend(self._form_exact(game))
+            lobbies.extend(self._form_widened(game, now))
+        return lobbies
+
+    def _take(self, players: list[QueueEntry]) -> Lobby:
+        for entry in players:
+            self.leave(entry.user_id)
+        return Lobby(game=players[0].game, players=players)
+
+    def _form_exact(self, game: QueueKey) -> Iterator[Lobby]:
+        # Полные лобби внутри одной полосы собираются из самых давних игроков
+        bands = self._buckets.get(game, {})
+        for band in list(bands):
+            while len(bands.get(band, ())) >= self.lobby_size:
+                bucket = bands[band]
+                yield self._take(list(itertools.islice(bucket.values(), self.lobby_size)))
+            if game not in self._buckets:
+                return
+
+    def _form_widened(self, game: QueueKey, now: float) -> Iterator[Lobby]:
+        while True:
+            bands = self._buckets.get(game)
+            if not bands:
+                return
+            # Якорями по очереди служат самые давние игроки полос: чем дольше
+            # ожидание, тем больше соседних полос разрешено захватить
+            heads = sorted((next(iter(bucket.values())) for bucket in bands.values()), key=lambda e: e.joined_at)
+            lobby: Optional[Lobby] = None
+            for anchor in heads:
+                spread = min(self.max_spread, int((now - anchor.joined_at) // self.widen_interval))
+                if spread <= 0:
+                    break
+                candidates: list[QueueEntry] = []
+                for band in range(anchor.band - spread, anchor.band + spread + 1):
+                    bucket = bands.get(band)
+                    if bucket:
+                        candidates.extend(itertools.islice(bucket.values(), self.lobby_size))
+                if len(candidates) >= self.lobby_size:
+                    candidates.sort(key=lambda entry: (abs(entry.band - anchor.band), entry.joined_at))
+                    lobby = self._take(candidates[: self.lobby_size])
+                    break
+            if lobby is None:
+                return
+            yield lobby
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import discord
+
+logger = logging.getLogger("HatoriBotPy.members")
+
+MEMBER_CACHE_FULL = "full"
+MEMBER_CACHE_LEAN = "lean"
+
+MEMBER_LRU_SIZE = 1024
+ROLE_INDEX_TTL = 6 * 60 * 60
+
+
+def member_cache_options(mode: str, intents: discord.Intents) -> dict:
+    """Параметры ``commands.Bot`` для выбранной политики кэша участников.
+
+    В режиме ``lean`` библиотека держит только участников голосовых каналов
+    и не скачивает список участников при запуске.
+    """
+    if mode != MEMBER_CACHE_LEAN:
+        return {}
+    flags = discord.MemberCacheFlags.none()
+    flags.voice = intents.voice_states
+    return {"member_cache_flags": flags, "chunk_guilds_at_startup": False}
+
+
+class MemberResolver:
+    """Поиск участников по требованию с небольшим LRU поверх кэша discord.py.
+
+    Для отслеживаемых ролей (администраторы, менеджеры) хранится только
+    индекс идентификаторов участников, а не сами объекты ``Member``.
+    """
+
+    def __init__(self, mode: str, tracked_roles: Iterable[Optional[int]], maxsize: int = MEMBER_LRU_SIZE) -> None:
+        self.lean = mode == MEMBER_CACHE_LEAN
+        self.maxsize = maxsize
+        self.tracked_roles: Set[int] = {rid for rid in tracked_roles if rid}
+        self._lru: OrderedDict[Tuple[int, int], discord.Member] = OrderedDict()
+        self._role_index: Dict[int, Dict[int, Set[int]]] = {}
+        self._indexed_at: Dict[int, float] = {}
+        self._index_locks: Dict[int, asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def remember(self, member: discord.Member) -> None:
+        key = (member.guild.id, member.id)
+        self._lru[key] = member
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+        self._index_roles(member)
+
+    def forget(self, guild_id: int, user_id: int) -> None:
+        self._lru.pop((guild_id, user_id), None)
+        for holders in self._role_index.get(guild_id, {}).values():
+            holders.discard(user_id)
+
+    def _index_roles(self, member: discord.Member) -> None:
+        index = self._role_index.get(member.guild.id)
+        if index is None:
+            return
+        for role_id in self.tracked_roles:
+            holders = index.setdefault(role_id, set())
+            if member.get_role(role_id) is not None:
+                holders.add(member.id)
+            else:
+                holders.discard(member.id)
+
+    async def get_member(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member
+        key = (guild.id, user_id)
+        member = self._lru.get(key)
+        if member is not None:
+            self.hits += 1
+            self._lru.move_to_end(key)
+            return member
+        self.misses += 1
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.HTTPException:
+            return None
+        self.remember(member)
+        return member
+
+    def track_roles(self, guild_id: int, role_ids: Iterable[Optional[int]]) -> None:
+        added = {rid for rid in role_ids if rid} - self.tracked_roles
+        if added:
+            self.tracked_roles |= added
+            # Индекс гильдии перестроится при следующем обращении
+            self._indexed_at.pop(guild_id, None)
+
+    async def role_members(self, guild: discord.Guild, role_id: int) -> list[discord.Member]:
+        if not self.lean:
+            role = guild.get_role(role_id)
+            return list(role.members) if role else []
+
+        self.track_roles(guild.id, (role_id,))
+        await self.ensure_role_index(guild)
+
+        members: list[discord.Member] = []
+        for user_id in list(self._role_index.get(guild.id, {}).get(role_id, ())):
+            member = await self.get_member(guild, user_id)
+            if member is not None and member.get_role(role_id) is not None:
+                members.append(member)
+        return members
+
+    async def ensure_role_index(self, guild: discord.Guild) -> None:
+        indexed_at = self._indexed_at.get(guild.id)
+        if indexed_at is not None and time.monotonic() - indexed_at < ROLE_INDEX_TTL:
+            return
+        lock = self._index_locks.setdefault(guild.id, asyncio.Lock())
+        async with lock:
+            indexed_at = self._indexed_at.get(guild.id)
+            if indexed_at is not None and time.monotonic() - indexed_at < ROLE_INDEX_TTL:
+                return
+            await self._build_role_index(guild)
+
+    async def _build_role_index(self, guild: discord.Guild) -> None:
+        # Постраничный обход участников через REST: объекты не сохраняются,
+        # в индексе остаются только идентификаторы держателей нужных ролей
+        started = time.monotonic()
+        index: Dict[int, Set[int]] = {role_id: set() for role_id in self.tracked_roles}
+        scanned = 0
+        try:
+            async for member in guild.fetch_members(limit=None):
+                scanned += 1
+                for role_id in self.tracked_roles:
+                    if member.get_role(role_id) is not None:
+                        index[role_id].add(member.id)
+        except discord.HTTPException:
+            logger.exception("Не удалось построить индекс ролей гильдии %s", guild.id)
+            return
+        self._role_index[guild.id] = index
+        self._indexed_at[guild.id] = time.monotonic()
+        logger.info(
+            "Индекс ролей гильдии %s построен: %d участников просмотрено за %.1f с",
+            guild.id,
+            scanned,
+            time.monotonic() - started,
+        )
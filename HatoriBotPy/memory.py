@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import asyncio
+import gc
+import resource
+import sys
+import tracemalloc
+from collections import Counter
+from typing import Any, Iterable, Optional
+
+import discord
+from discord.ext import commands
+
+from .digest import DIGESTS
+from .guild_config import guild_configs
+from .supervisor import supervisor
+
+SNAPSHOT_FRAMES = 10
+SIZE_SAMPLE = 200
+
+_baseline: Optional[tracemalloc.Snapshot] = None
+
+
+def _approx_size(container: Any) -> int:
+    """Оценка памяти контейнера по выборке элементов, без обхода целиком."""
+    size = sys.getsizeof(container)
+    if isinstance(container, dict):
+        items: Iterable[Any] = container.items()
+    elif isinstance(container, (set, list, tuple)):
+        items = container
+    else:
+        return size
+    count = len(container)
+    if not count:
+        return size
+    sampled = 0
+    sampled_bytes = 0
+    for item in items:
+        parts = item if isinstance(container, dict) else (item,)
+        sampled_bytes += sum(sys.getsizeof(part) for part in parts)
+        sampled += 1
+        if sampled >= SIZE_SAMPLE:
+            break
+    return size + sampled_bytes * count // sampled
+
+
+def structure_sizes(bot: commands.Bot) -> list[tuple[str, int, int]]:
+    """Размеры долгоживущих структур бота: (имя, элементов, байт примерно)."""
+    from views.voice import _action_cooldowns
+
+    from .interactions import handler_stats
+
+    named: list[tuple[str, Any]] = [
+        ("bot._message_ts", bot._message_ts),
+        ("bot._voice_reward_tasks", bot._voice_reward_tasks),
+        ("bot._voice_message_channels", bot._voice_message_channels),
+        ("views.voice._action_cooldowns", _action_cooldowns),
+        ("interactions.handler_stats", handler_stats),
+    ]
+    resolver = getattr(bot, "member_resolver", None)
+    if resolver is not None:
+        named.append(("member_resolver._lru", resolver._lru))
+    game_cog = bot.get_cog("CustomGame")
+    if game_cog is not None:
+        named.append(("CustomGame.sessions", game_cog.sessions))
+        named.append(("CustomGame.channel_index", game_cog.channel_index))
+    matchmaking = bot.get_cog("Matchmaking")
+    if matchmaking is not None:
+        named.append(("Matchmaking.matcher", matchmaking.matcher._entries))
+        named.append(("Matchmaking.boards", matchmaking.boards))
+
+    rows = [(name, len(value), _approx_size(value)) for name, value in named]
+
+    # Кэши discord.py: только количество, оценка размера объектов библиотеки неточна
+    state = bot._connection
+    store = state._view_store
+    rows.extend(
+        [
+            ("discord.guilds", len(bot.guilds), 0),
+            ("discord.users", len(state._users), 0),
+            ("discord.members", sum(len(guild._members) for guild in bot.guilds), 0),
+            ("discord.messages", len(state._messages) if state._messages is not None else 0, 0),
+            ("discord.view_store.items", sum(len(items) for items in store._views.values()), 0),
+            ("discord.view_store.message_views", len(store._synced_message_views), 0),
+            ("discord.view_store.modals", len(store._modals), 0),
+        ]
+    )
+    return rows
+
+
+def live_views() -> Counter:
+    """Живые объекты View и Modal по классам, включая уже не отслеживаемые библиотекой.
+
+    Обходит все объекты сборщика мусора, поэтому вызывается только по запросу.
+    """
+    counts: Counter = Counter()
+    for obj in gc.get_objects():
+        if isinstance(obj, (discord.ui.View, discord.ui.Modal)):
+            counts[type(obj).__qualname__] += 1
+    return counts
+
+
+def task_counts() -> Counter:
+    """Живые задачи asyncio, сгруппированные по имени корутины."""
+    counts: Counter = Counter()
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        counts[getattr(coro, "__qualname__", type(coro).__name__)] += 1
+    return counts
+
+
+def snapshot() -> str:
+    """Делает базовый снимок ``tracemalloc``; при первом вызове включает трассировку."""
+    global _baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(SNAPSHOT_FRAMES)
+    _baseline = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    return f"Снимок сохранен. Отслеживается {current / 2**20:.1f} МБ, пик {peak / 2**20:.1f} МБ."
+
+
+def snapshot_diff(limit: int = 15) -> str:
+    """Разница между базовым снимком и текущим состоянием по строкам кода."""
+    if _baseline is None or not tracemalloc.is_tracing():
+        return "Базового снимка нет: сначала сделайте snapshot."
+    current = tracemalloc.take_snapshot()
+    ignore = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    )
+    stats = current.filter_traces(ignore).compare_to(_baseline.filter_traces(ignore), "lineno")
+    lines = [
+        f"{stat.size_diff / 1024:+9.1f} КБ {stat.count_diff:+7d}  {stat.traceback[0]}"
+        for stat in stats[:limit]
+        if stat.size_diff
+    ]
+    return "\n".join(lines) or "Изменений нет."
+
+
+def stop_tracing() -> str:
+    global _baseline
+    _baseline = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        return "tracemalloc выключен."
+    return "tracemalloc не был включен."
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status", encoding="utf-8") as fp:
+            for line in fp:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Вне Linux доступен только пиковый RSS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+MEMORY_ACTIONS = {"snapshot": snapshot, "diff": snapshot_diff, "stop": stop_tracing}
+
+
+def memory_report(bot: commands.Bot, *, include_views: bool = True) -> str:
+    lines = [f"RSS: {rss_mb():.1f} МБ", "Структуры:"]
+    for name, count, size in structure_sizes(bot):
+        size_text = f"{size / 1024:9.1f} КБ" if size else " " * 12
+        lines.append(f"  {name:<36} {count:>8} {size_text}")
+
+    tasks = task_counts()
+    lines.append(f"Задачи asyncio: {sum(tasks.values())}")
+    for name, count in tasks.most_common(15):
+        lines.append(f"  {name:<48} {count:>6}")
+
+    lines.append(f"Фоновые задачи супервизора: {len(supervisor)}")
+    lines.extend(f"  {line}" for line in supervisor.report())
+    lines.extend(guild_configs.report())
+    lines.append("Буферы сводок:")
+    lines.extend(f"  {sink.report()}" for sink in DIGESTS)
+
+    if include_views:
+        views = live_views()
+        lines.append(f"Живые View/Modal: {sum(views.values())}")
+        for name, count in views.most_common(10):
+            lines.append(f"  {name:<48} {count:>6}")
+
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        lines.append(f"tracemalloc: {current / 2**20:.1f} МБ, пик {peak / 2**20:.1f} МБ")
+    return "\n".join(lines)
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import discord
+from discord.ext import commands
+
+from .guild_config import guild_configs
+
+OWNER_ONLY = "Команда доступна только владельцам бота."
+
+
+def _has_role(member: discord.Member, role_id: Optional[int]) -> bool:
+    return bool(role_id and any(role.id == role_id for role in member.roles))
+
+
+def is_admin(user: discord.abc.User) -> bool:
+    """Администратор сервера или роль администраторов из настроек гильдии."""
+    if not isinstance(user, discord.Member):
+        return False
+    if user.guild_permissions.administrator:
+        return True
+    return _has_role(user, guild_configs.get(user.guild.id).admin_role_id)
+
+
+def is_moderator(user: discord.abc.User) -> bool:
+    if not isinstance(user, discord.Member):
+        return False
+    if user.guild_permissions.manage_messages:
+        return True
+    return _has_role(user, guild_configs.get(user.guild.id).admin_role_id)
+
+
+def is_game_manager(user: discord.abc.User) -> bool:
+    """Роль организаторов игр или администраторов из настроек гильдии."""
+    if not isinstance(user, discord.Member):
+        return False
+    config = guild_configs.get(user.guild.id)
+    return _has_role(user, config.manager_role_id) or _has_role(user, config.admin_role_id)
+
+
+async def is_owner(bot: commands.Bot, user: discord.abc.User) -> bool:
+    # Балансы, каталог, выгрузки и состояние процесса общие для всех серверов
+    # бота: администратор одного сервера не должен видеть и менять чужие данные
+    return await bot.is_owner(user)
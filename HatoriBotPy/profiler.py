@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Optional
+
+logger = logging.getLogger("HatoriBotPy.profiler")
+
+PROFILE_DIR = Path("data") / "profiles"
+MAX_PROFILE_SECONDS = 60
+SAMPLE_INTERVAL = 0.005
+MAX_STACK_DEPTH = 128
+
+_running = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+@dataclass
+class ProfileResult:
+    seconds: float
+    samples: int
+    mode: str
+    stacks: Counter = field(default_factory=Counter)
+    leaves: Counter = field(default_factory=Counter)
+    path: Optional[Path] = None
+
+    def top(self, limit: int = 15) -> list[tuple[str, int, float]]:
+        """Самые частые верхние кадры: (функция, выборок, доля)."""
+        total = self.samples or 1
+        return [(frame, count, count / total) for frame, count in self.leaves.most_common(limit)]
+
+    def collapsed(self) -> str:
+        # Формат collapsed stacks: "корень;...;лист количество" — его читают
+        # flamegraph.pl, speedscope и inferno
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _frame_name(code: CodeType, cache: dict[CodeType, str]) -> str:
+    name = cache.get(code)
+    if name is None:
+        filename = code.co_filename
+        for prefix in sys.path:
+            if prefix and filename.startswith(prefix):
+                filename = os.path.relpath(filename, prefix)
+                break
+        name = cache[code] = f"{getattr(code, 'co_qualname', code.co_name)} ({filename}:{code.co_firstlineno})"
+    return name
+
+
+def _stack(frame: Optional[FrameType]) -> tuple[CodeType, ...]:
+    codes = []
+    while frame is not None and len(codes) < MAX_STACK_DEPTH:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    return tuple(codes)
+
+
+async def _sample_with_timer(seconds: float, interval: float) -> Counter:
+    # ITIMER_PROF срабатывает по процессорному времени, а обработчик сигнала
+    # выполняется в главном потоке между инструкциями байткода: выборка видит
+    # ровно тот кадр, что занимает CPU, и не смещается к точкам отпускания GIL
+    raw: Counter = Counter()
+
+    def _on_sample(_: int, frame: Optional[FrameType]) -> None:
+        raw[_stack(frame)] += 1
+
+    previous = signal.signal(signal.SIGPROF, _on_sample)
+    signal.setitimer(signal.ITIMER_PROF, interval, interval)
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, previous)
+    return raw
+
+
+def _sample_with_thread(thread_id: int, seconds: float, interval: float) -> Counter:
+    # Запасной путь для цикла не в главном потоке: стеки снимаются из
+    # соседнего потока и смещены к моментам, когда цикл отпускает GIL
+    raw: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            raw[_stack(frame)] += 1
+        del frame
+        time.sleep(interval)
+    return raw
+
+
+def is_running() -> bool:
+    return _running.locked()
+
+
+def register_loop() -> None:
+    """Запоминает цикл событий бота для профилирования из других потоков."""
+    global _loop
+    _loop = asyncio.get_running_loop()
+
+
+async def profile_event_loop(seconds: float, interval: float = SAMPLE_INTERVAL) -> ProfileResult:
+    """Снимает профиль потока цикла событий за ``seconds`` секунд.
+
+    Одновременно может работать только один профиль; результат сохраняется
+    в collapsed-формате в ``data/profiles``.
+    """
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy("Профилирование уже выполняется")
+    try:
+        seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+        started = time.monotonic()
+        if threading.current_thread() is threading.main_thread() and hasattr(signal, "setitimer"):
+            mode = "cpu"
+            raw = await _sample_with_timer(seconds, interval)
+        else:
+            mode = "wall"
+            raw = await asyncio.to_thread(_sample_with_thread, threading.get_ident(), seconds, interval)
+    finally:
+        _running.release()
+
+    # Имена кадров строятся один раз в конце, а не на каждой выборке
+    names: dict[CodeType, str] = {}
+    result = ProfileResult(seconds=time.monotonic() - started, samples=sum(raw.values()), mode=mode)
+    for codes, count in raw.items():
+        if not codes:
+            continue
+        result.stacks[";".join(_frame_name(code, names) for code in reversed(codes))] += count
+        result.leaves[_frame_name(codes[0], names)] += count
+
+    await asyncio.to_thread(save_collapsed, result)
+    logger.info(
+        "Профиль снят (%s): %d выборок за %.1f с, сохранен в %s",
+        mode,
+        result.samples,
+        result.seconds,
+        result.path,
+    )
+    return result
+
+
+def profile_from_thread(seconds: float) -> ProfileResult:
+    """Запускает профилирование цикла бота из постороннего потока и ждет результат."""
+    if _loop is None or _loop.is_closed():
+        raise RuntimeError("Цикл событий бота не запущен")
+    future = asyncio.run_coroutine_threadsafe(profile_event_loop(seconds), _loop)
+    return future.result(timeout=MAX_PROFILE_SECONDS + 30)
+
+
+def save_collapsed(result: ProfileResult, directory: Path = PROFILE_DIR) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"profile-{datetime.now():%Y%m%d-%H%M%S}.folded"
+    path.write_text(result.collapsed(), encoding="utf-8")
+    result.path = path
+    return path
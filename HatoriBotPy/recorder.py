@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from discord.state import ConnectionState
+
+from .runtime import json_dumps
+
+logger = logging.getLogger("HatoriBotPy.recorder")
+
+RECORDING_VERSION = 1
+RECORDED_EVENTS = (
+    "GUILD_CREATE",
+    "MESSAGE_CREATE",
+    "VOICE_STATE_UPDATE",
+    "MESSAGE_REACTION_ADD",
+    "MESSAGE_REACTION_REMOVE",
+    "INTERACTION_CREATE",
+)
+FLUSH_INTERVAL = 1.0
+
+# Типы взаимодействий: команда, нажатие компонента, автодополнение, отправка формы
+_APPLICATION_COMMAND = 2
+_MESSAGE_COMPONENT = 3
+_AUTOCOMPLETE = 4
+_MODAL_SUBMIT = 5
+# Контекстная команда на пользователе: target_id — его идентификатор
+_USER_COMMAND = 2
+# Типы опций команд: строка и значения-идентификаторы пользователей
+_STRING_OPTION = 3
+_USER_OPTION_TYPES = {6, 9}
+# Типы компонентов: текстовое поле и списки выбора пользователей. Числовые
+# типы опций и компонентов пересекаются (4 — целое число и текстовое поле),
+# поэтому они разбираются по типу взаимодействия, а не по полю type
+_TEXT_INPUT = 4
+_USER_SELECT_TYPES = {5, 7}
+
+Parser = Callable[[Dict[str, Any]], None]
+
+
+class EventRecorder:
+    """Пишет обезличенные события шлюза в файл для последующего воспроизведения.
+
+    Перехватываются разборщики ``ConnectionState.parsers``, поэтому запись
+    видит ровно те полезные нагрузки, что получает discord.py. Идентификаторы
+    пользователей заменяются псевдонимами по случайной соли записи, тексты
+    сообщений и полей форм — заглушками той же длины. Файл дописывается
+    строками ``[смещение_мс, событие, данные]`` из фонового потока.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self._salt = os.urandom(16)
+        self._started = time.monotonic()
+        self._queue: queue.SimpleQueue[Optional[str]] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="EventRecorder", daemon=True)
+        self._sanitizers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+            "GUILD_CREATE": self._guild,
+            "MESSAGE_CREATE": self._message,
+            "VOICE_STATE_UPDATE": self._voice_state,
+            "MESSAGE_REACTION_ADD": self._reaction,
+            "MESSAGE_REACTION_REMOVE": self._reaction,
+            "INTERACTION_CREATE": self._interaction,
+        }
+        self.recorded = 0
+
+    def install(self, state: ConnectionState) -> None:
+        # Шлюз держит ссылку на тот же словарь разборщиков, поэтому замена
+        # элементов действует и после подключения
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._queue.put(json_dumps({"v": RECORDING_VERSION, "started": time.time()}))
+        self._thread.start()
+        for event in RECORDED_EVENTS:
+            parser = state.parsers.get(event)
+            if parser is not None:
+                state.parsers[event] = self._wrap(event, parser)
+        logger.info("Запись событий шлюза в %s", self.path)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _wrap(self, event: str, parser: Parser) -> Parser:
+        sanitize = self._sanitizers[event]
+
+        def recording_parser(data: Dict[str, Any]) -> None:
+            try:
+                offset = int((time.monotonic() - self._started) * 1000)
+                self._queue.put(json_dumps([offset, event, sanitize(data)]))
+                self.recorded += 1
+            except Exception:
+                logger.exception("Не удалось записать событие %s", event)
+            parser(data)
+
+        return recording_parser
+
+    def _run(self) -> None:
+        with self.path.open("a", encoding="utf-8") as fp:
+            while True:
+                line = self._queue.get()
+                if line is None:
+                    return
+                lines = [line]
+                # Все, что накопилось к этому моменту, пишется одной пачкой
+                while True:
+                    try:
+                        line = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if line is None:
+                        fp.write("\n".join(lines) + "\n")
+                        return
+                    lines.append(line)
+                fp.write("\n".join(lines) + "\n")
+                fp.flush()
+                time.sleep(FLUSH_INTERVAL)
+
+    def pseudonym(self, user_id: Any) -> str:
+        digest = hmac.new(self._salt, str(user_id).encode(), hashlib.sha256).digest()
+        # Положительный 62-битный снежинкоподобный идентификатор
+        return str(int.from_bytes(digest[:8], "big") >> 2)
+
+    def _user(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        return {"id": self.pseudonym(user["id"]), "bot": user.get("bot", False)}
+
+    def _member(self, member: Dict[str, Any]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"roles": member.get("roles", [])}
+        if "user" in member:
+            result["user"] = self._user(member["user"])
+        if "permissions" in member:
+            result["permissions"] = member["permissions"]
+        return result
+
+    def _guild(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": data["id"],
+            "owner_id": self.pseudonym(data.get("owner_id", 0)),
+            "channels": [
+                {"id": channel["id"], "type": channel["type"], "parent_id": channel.get("parent_id")}
+                for channel in data.get("channels", [])
+            ],
+            "roles": [{"id": role["id"], "permissions": role.get("permissions", "0")} for role in data.get("roles", [])],
+        }
+
+    def _message(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        result = {
+            "id": data["id"],
+            "channel_id": data["channel_id"],
+            "guild_id": data.get("guild_id"),
+            "author": self._user(data["author"]),
+            "content": "x" * len(data.get("content", "")),
+            "type": data.get("type", 0),
+        }
+        if "member" in data:
+            result["member"] = self._member(data["member"])
+        return result
+
+    def _voice_state(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        result = {
+            key: data.get(key)
+            for key in ("guild_id", "channel_id", "deaf", "mute", "self_deaf", "self_mute", "self_video", "suppress")
+        }
+        result["user_id"] = self.pseudonym(data["user_id"])
+        if "member" in data:
+            result["member"] = self._member(data["member"])
+        return result
+
+    def _reaction(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        result = {
+            "user_id": self.pseudonym(data["user_id"]),
+            "channel_id": data["channel_id"],
+            "message_id": data["message_id"],
+            "guild_id": data.get("guild_id"),
+            "emoji": {"id": data["emoji"].get("id"), "name": data["emoji"].get("name")},
+            "type": data.get("type", 0),
+        }
+        if "member" in data:
+            result["member"] = self._member(data["member"])
+        return result
+
+    def _interaction(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "id": data["id"],
+            "application_id": data["application_id"],
+            "type": data["type"],
+            "guild_id": data.get("guild_id"),
+            "channel_id": data.get("channel_id"),
+            "data": self._interaction_data(data["type"], data.get("data", {})),
+        }
+        if "member" in data:
+            result["member"] = self._member(data["member"])
+        elif "user" in data:
+            result["user"] = self._user(data["user"])
+        if "message" in data:
+            result["message"] = {"id": data["message"]["id"], "channel_id": data["message"]["channel_id"]}
+        return result
+
+    def _interaction_data(self, kind: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        # Введенный текст заменяется заглушкой, идентификаторы пользователей —
+        # псевдонимами; разобранные сущности (resolved) не сохраняются
+        result = {key: item for key, item in data.items() if key not in ("resolved", "options", "components", "values")}
+        if kind in (_APPLICATION_COMMAND, _AUTOCOMPLETE):
+            if "options" in data:
+                result["options"] = self._options(data["options"])
+            if data.get("type") == _USER_COMMAND and "target_id" in data:
+                result["target_id"] = self.pseudonym(data["target_id"])
+        elif kind == _MESSAGE_COMPONENT:
+            if "values" in data:
+                result["values"] = self._values(data.get("component_type"), data["values"])
+        elif kind == _MODAL_SUBMIT:
+            if "components" in data:
+                result["components"] = self._components(data["components"])
+        return result
+
+    def _options(self, options: list[Dict[str, Any]]) -> list[Dict[str, Any]]:
+        result = []
+        for option in options:
+            option = dict(option)
+            if "options" in option:
+                option["options"] = self._options(option["options"])
+            if "value" in option:
+                if option.get("type") in _USER_OPTION_TYPES:
+                    option["value"] = self.pseudonym(option["value"])
+                elif option.get("type") == _STRING_OPTION:
+                    option["value"] = _mask(option["value"])
+            result.append(option)
+        return result
+
+    def _components(self, components: list[Dict[str, Any]]) -> list[Dict[str, Any]]:
+        result = []
+        for component in components:
+            component = dict(component)
+            # Строки формы содержат components, подписи — один component
+            if "components" in component:
+                component["components"] = self._components(component["components"])
+            if "component" in component:
+                component["component"] = self._components([component["component"]])[0]
+            if component.get("type") == _TEXT_INPUT and "value" in component:
+                component["value"] = _mask(component["value"])
+            if "values" in component:
+                component["values"] = self._values(component.get("type"), component["values"])
+            result.append(component)
+        return result
+
+    def _values(self, component_type: Optional[int], values: list[Any]) -> list[Any]:
+        if component_type in _USER_SELECT_TYPES:
+            return [self.pseudonym(value) for value in values]
+        return values
+
+
+def _mask(value: Any) -> Any:
+    # Числа сохраняются: по ним обработчики разбирают суммы и количества
+    if not isinstance(value, str) or value.isdigit():
+        return value
+    return "x" * len(value)
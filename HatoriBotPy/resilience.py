@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import logging
+import random
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger("HatoriBotPy.resilience")
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+BACKOFF_BASE = 0.1
+BACKOFF_CAP = 2.0
+
+
+@dataclass(slots=True)
+class CallStats:
+    calls: int = 0
+    retries: int = 0
+    timeouts: int = 0
+    failures: int = 0
+    rejected: int = 0
+    fallbacks: int = 0
+
+
+class CircuitBreaker:
+    """Автомат защиты: после серии сбоев подряд отклоняет вызовы без обращения к ресурсу.
+
+    Через ``reset_timeout`` секунд пропускается один пробный вызов; успех
+    замыкает автомат, сбой снова размыкает его на тот же срок.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = BREAKER_CLOSED
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == BREAKER_CLOSED:
+            return True
+        if self.state == BREAKER_OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = BREAKER_HALF_OPEN
+            logger.info("Автомат %s: пробный вызов", self.name)
+        if self.state == BREAKER_HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._probing = False
+        self.consecutive_failures = 0
+        if self.state != BREAKER_CLOSED:
+            self.state = BREAKER_CLOSED
+            logger.warning("Автомат %s замкнут, ресурс снова доступен", self.name)
+
+    def record_failure(self) -> None:
+        self._probing = False
+        self.consecutive_failures += 1
+        if self.state == BREAKER_HALF_OPEN or (
+            self.state == BREAKER_CLOSED and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.state = BREAKER_OPEN
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            logger.error(
+                "Автомат %s разомкнут после %d сбоев подряд на %.0f с",
+                self.name,
+                self.consecutive_failures,
+                self.reset_timeout,
+            )
+
+    def release(self) -> None:
+        """Снимает пробный вызов без вердикта, например при отмене задачи."""
+        self._probing = False
+
+    def retry_after(self) -> float:
+        if self.state != BREAKER_OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+    """Экспоненциальная задержка с полным джиттером: повторы разных задач не совпадают по времени."""
+    return random.uniform(0, min(cap, base * 2**attempt))
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+import gc
+import json
+import logging
+from typing import Any
+
+import discord
+
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - необязательная зависимость
+    orjson = None  # type: ignore[assignment]
+
+logger = logging.getLogger("HatoriBotPy.runtime")
+
+RUNTIME_DEFAULT = "default"
+RUNTIME_FAST = "fast"
+
+# Бот держит большой долгоживущий кэш и создает много короткоживущих
+# объектов на событие: реже запускаем сборку молодого поколения
+GC_THRESHOLDS = (50_000, 20, 100)
+
+_fast_json = False
+_heap_frozen = False
+
+
+def json_dumps(obj: Any) -> str:
+    if _fast_json:
+        return orjson.dumps(obj, default=str).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def json_loads(data: str | bytes) -> Any:
+    if _fast_json:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def apply_runtime_profile(profile: str) -> list[str]:
+    """Включает быстрый профиль выполнения; вызывается до запуска цикла событий.
+
+    Возвращает список включенных оптимизаций. Недоступные библиотеки
+    (uvloop, orjson) пропускаются с предупреждением.
+    """
+    global _fast_json
+    if profile != RUNTIME_FAST:
+        return []
+
+    enabled: list[str] = []
+    try:
+        import uvloop
+    except ModuleNotFoundError:
+        logger.warning("uvloop не установлен, используется стандартный цикл событий")
+    else:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        enabled.append("uvloop")
+
+    if orjson is None:
+        logger.warning("orjson не установлен, используется стандартный json")
+    else:
+        # discord.py сам выбирает orjson при импорте, но явная подстановка
+        # не зависит от порядка импорта и переменных окружения библиотеки
+        discord.utils._from_json = orjson.loads  # type: ignore[attr-defined]
+        discord.utils._to_json = lambda obj: orjson.dumps(obj).decode("utf-8")  # type: ignore[attr-defined]
+        _fast_json = True
+        enabled.append("orjson")
+
+    gc.set_threshold(*GC_THRESHOLDS)
+    enabled.append("gc-thresholds")
+    logger.info("Профиль выполнения %s: %s", profile, ", ".join(enabled))
+    return enabled
+
+
+def freeze_heap() -> None:
+    """Переносит объекты, созданные при запуске, в постоянное поколение.
+
+    Кэш гильдий, команды и представления больше не просматриваются
+    сборщиком мусора при каждой полной сборке.
+    """
+    global _heap_frozen
+    if _heap_frozen:
+        return
+    gc.collect()
+    gc.freeze()
+    _heap_frozen = True
+    logger.info("Заморожено %d объектов после запуска", gc.get_freeze_count())
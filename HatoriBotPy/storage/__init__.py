@@ -0,0 +1,41 @@
+"""
+Storage backends for HatoriBotPy.
+
+``DATABASE_URL`` chooses the engine: ``postgres://`` / ``postgresql://``
+(asyncpg), ``sqlite:///relative.db`` or ``sqlite:////absolute.db`` and
+``memory://``.
+"""
+
+from __future__ import annotations
+
+from urllib.parse import urlsplit
+
+from .base import Storage, StorageBusy
+
+SCHEMES_POSTGRES = ("postgres", "postgresql")
+SCHEME_SQLITE = "sqlite"
+SCHEME_MEMORY = "memory"
+
+
+def open_storage(url: str) -> Storage:
+    """Создает хранилище по адресу; соединения открываются в ``init()``."""
+    scheme = urlsplit(url).scheme.lower()
+    if scheme in SCHEMES_POSTGRES:
+        from .postgres import PostgresStorage
+
+        return PostgresStorage(url)
+    if scheme == SCHEME_SQLITE:
+        from .sqlite import SQLiteStorage
+
+        path = url[len("sqlite:///"):] if url.startswith("sqlite:///") else ""
+        if not path:
+            raise RuntimeError(f"Не указан файл базы SQLite: {url}")
+        return SQLiteStorage(path)
+    if scheme == SCHEME_MEMORY:
+        from .memory import MemoryStorage
+
+        return MemoryStorage()
+    raise RuntimeError(f"Неизвестная схема DATABASE_URL: {scheme or url}")
+
+
+__all__ = ["Storage", "StorageBusy", "open_storage"]
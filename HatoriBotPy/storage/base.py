@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import IO, Any, AsyncIterator, Callable, Iterable, Mapping, Optional, Sequence
+
+LEDGER_OPENING = "opening"
+LEDGER_MESSAGE = "message"
+LEDGER_VOICE = "voice"
+LEDGER_PARTICIPATION = "participation"
+LEDGER_BET = "bet"
+LEDGER_PAYOUT = "payout"
+LEDGER_REFUND = "refund"
+LEDGER_PURCHASE = "purchase"
+LEDGER_PURCHASE_REFUND = "purchase_refund"
+LEDGER_ADJUST = "adjust"
+
+LEDGER_PARTITIONS_AHEAD = 2
+
+LedgerEntry = tuple[str, int, str, Optional[str]]
+Row = Mapping[str, Any]
+
+# Столбцы выгрузки по таблицам, в порядке вывода
+EXPORT_COLUMNS = {
+    "users": ("id", "balance"),
+    "purchases": ("id", "user_id", "item_key", "item_name", "price", "purchased_at"),
+    "bets": ("id", "user_id", "game_id", "team", "amount", "created_at"),
+}
+
+IMPORT_MODE_ADD = "add"
+IMPORT_MODE_SET = "set"
+
+COMPLAINTS_PAGE_SIZE = 5
+COMPLAINT_SNIPPET_CHARS = 200
+
+GUILD_SETTINGS_CHANNEL = "guild_settings"
+# Столбец настроек гильдии и его тип; NULL означает значение из окружения
+GUILD_SETTINGS_COLUMNS = {
+    "admin_role_id": "TEXT",
+    "manager_role_id": "TEXT",
+    "complaints_channel_id": "TEXT",
+    "bets_channel_id": "TEXT",
+    "purchase_log_channel_id": "TEXT",
+    "admin_alert_channel_id": "TEXT",
+    "voice_reward_interval": "INTEGER",
+    "voice_reward_amount": "INTEGER",
+    "message_reward_amount": "INTEGER",
+    "message_cooldown_ms": "INTEGER",
+    "admin_notice_cooldown": "INTEGER",
+}
+
+PURCHASE_OK = "ok"
+PURCHASE_DUPLICATE = "duplicate"
+PURCHASE_INSUFFICIENT = "insufficient"
+# Покупка, не выданная за это время (ответ базы потерян, бот остановлен), возвращается
+PURCHASE_REFUND_AFTER = 15 * 60
+
+
+@dataclass(frozen=True)
+class PurchaseResult:
+    status: str
+    balance: Optional[int] = None
+    purchase_id: Optional[int] = None
+    # Для PURCHASE_DUPLICATE: товар по этой покупке уже выдан
+    fulfilled: bool = False
+
+
+class StorageBusy(Exception):
+    """Хранилище отклонило операцию, не применив ее: повтор безопасен."""
+
+
+def month_start(day: date, offset: int = 0) -> date:
+    index = day.year * 12 + day.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def split_pot(bets: Sequence[Row], game_id: str, winning_team: int) -> tuple[list[LedgerEntry], dict[str, int], list[int]]:
+    """Делит банк игры между победителями пропорционально ставкам.
+
+    Возвращает записи журнала выплат, суммы по пользователям и выплату по
+    каждой ставке в порядке ``bets``. Если на победителей никто не ставил,
+    записей нет.
+    """
+    total_pot = sum(int(bet["amount"]) for bet in bets)
+    total_winning_bets = sum(int(bet["amount"]) for bet in bets if bet["team"] == winning_team)
+    entries: list[LedgerEntry] = []
+    payouts: dict[str, int] = defaultdict(int)
+    bet_payouts: list[int] = []
+    if total_winning_bets == 0:
+        return entries, {}, bet_payouts
+    for bet in bets:
+        win_amount = 0
+        if bet["team"] == winning_team:
+            win_amount = int((bet["amount"] / total_winning_bets) * total_pot)
+            entries.append((bet["user_id"], win_amount, LEDGER_PAYOUT, game_id))
+            payouts[bet["user_id"]] += win_amount
+        bet_payouts.append(win_amount)
+    return entries, dict(payouts), bet_payouts
+
+
+def bet_totals(
+    bets: Sequence[Row],
+    bet_payouts: Sequence[int],
+) -> dict[str, tuple[int, int, int]]:
+    """Число ставок, выигрышей и прибыль по пользователям для ``player_stats``."""
+    totals: dict[str, list[int]] = defaultdict(lambda: [0, 0, 0])
+    for bet, payout in zip(bets, bet_payouts):
+        total = totals[bet["user_id"]]
+        total[0] += 1
+        total[1] += 1 if payout > 0 else 0
+        total[2] += payout - int(bet["amount"])
+    return {user_id: (placed, won, profit) for user_id, (placed, won, profit) in totals.items()}
+
+
+def next_streak(current: int, won: bool) -> int:
+    return max(current, 0) + 1 if won else min(current, 0) - 1
+
+
+class Storage(ABC):
+    """Хранилище бота: операции, которые ``db.py`` предлагает остальному коду.
+
+    Идентификаторы пользователей, гильдий и каналов передаются строками.
+    Сроки, повторы и автомат защиты остаются в ``db.py``; реализации лишь
+    выполняют операцию атомарно и поднимают ``StorageBusy``, когда повтор
+    заведомо безопасен.
+    """
+
+    name: str = "storage"
+    # Оповещения об изменениях между процессами (LISTEN/NOTIFY)
+    supports_notify = False
+    # Чтение с реплик: те же операции на отдельном экземпляре только для чтения
+    supports_replicas = False
+
+    @abstractmethod
+    async def init(self) -> None: ...
+
+    @abstractmethod
+    async def close(self) -> None: ...
+
+    async def open_listener(self, channel: str, callback: Callable[..., Any]) -> Any:
+        raise NotImplementedError(f"{self.name} не поддерживает оповещения")
+
+    async def replication_lag(self) -> Optional[float]:
+        """Отставание реплики в секундах; ``None``, если экземпляр не реплика."""
+        raise NotImplementedError(f"{self.name} не поддерживает реплики")
+
+    @abstractmethod
+    async def get_user_balance(self, uid: str) -> int: ...
+
+    @abstractmethod
+    async def fetch_user_balance(self, uid: str) -> Optional[int]:
+        """Баланс без создания пользователя: годится для реплики."""
+
+    @abstractmethod
+    async def set_user_balance(self, uid: str, balance: int, reason: str, ref: Optional[str]) -> bool: ...
+
+    @abstractmethod
+    async def add_currency(self, uid: str, amount: int, reason: str, ref: Optional[str]) -> int: ...
+
+    @abstractmethod
+    async def credit_many(self, entries: Sequence[LedgerEntry]) -> None: ...
+
+    @abstractmethod
+    async def create_bet(self, uid: str, game_id: str, team: int, amount: int) -> None: ...
+
+    @abstractmethod
+    async def place_bet(self, uid: str, game_id: str, team: int, amount: int) -> Optional[int]: ...
+
+    @abstractmethod
+    async def payout_bets(self, game_id: str, winning_team: int) -> Optional[dict[str, int]]: ...
+
+    @abstractmethod
+    async def refund_bets(self, game_id: str) -> int: ...
+
+    @abstractmethod
+    async def record_game_start(self, game_id: str, game: str, roster: Sequence[tuple[str, int]]) -> None: ...
+
+    @abstractmethod
+    async def record_game_result(
+        self,
+        game_id: str,
+        winning_team: Optional[int],
+        game: str,
+        rating_changes: dict[str, float],
+        default_rating: float,
+    ) -> bool:
+        """Фиксирует исход, статистику и рейтинги одной транзакцией."""
+
+    @abstractmethod
+    async def get_player_stats(self, uid: str) -> Optional[Row]: ...
+
+    @abstractmethod
+    async def get_bets_for_game(self, game_id: str) -> list[Row]: ...
+
+    @abstractmethod
+    async def clear_bets_for_game(self, game_id: str) -> None: ...
+
+    @abstractmethod
+    async def record_purchase(self, uid: str, item_key: str, item_name: str, price: int) -> None: ...
+
+    @abstractmethod
+    async def get_shop_items(self) -> list[Row]: ...
+
+    @abstractmethod
+    async def set_shop_item_price(self, item_key: str, price: int) -> bool: ...
+
+    @abstractmethod
+    async def purchase_item(
+        self,
+        uid: str,
+        item_key: str,
+        item_name: str,
+        price: int,
+        interaction_id: str,
+    ) -> PurchaseResult:
+        """При повторе ``interaction_id`` возвращает уже записанную покупку."""
+
+    @abstractmethod
+    async def mark_purchase_fulfilled(self, purchase_id: int) -> bool:
+        """Отмечает выдачу; ``False``, если покупка уже возвращена."""
+
+    @abstractmethod
+    async def refund_unfulfilled_purchases(self, older_than: float) -> list[Row]:
+        """Возвращает деньги за покупки, не выданные за ``older_than`` секунд.
+
+        Возвращает строки возвращенных покупок: id, user_id, item_name, price.
+        """
+
+    @abstractmethod
+    async def get_player_ratings(self, game: str, uids: Sequence[str]) -> dict[str, float]:
+        """Сохраненные рейтинги; у новых игроков записи нет."""
+
+    @abstractmethod
+    async def get_guild_settings(self, guild_id: Optional[str]) -> list[Row]: ...
+
+    @abstractmethod
+    async def set_guild_setting(self, guild_id: str, column: str, value: Optional[int | str]) -> None: ...
+
+    @abstractmethod
+    async def create_complaint(
+        self,
+        guild_id: Optional[str],
+        author_id: str,
+        voice_channel_id: Optional[str],
+        body: str,
+    ) -> int: ...
+
+    @abstractmethod
+    async def search_complaints(
+        self,
+        guild_id: str,
+        text: Optional[str],
+        author_id: Optional[str],
+        before_id: Optional[int],
+        limit: int,
+    ) -> list[Row]: ...
+
+    @abstractmethod
+    async def export_table_csv(self, table: str, output: IO[bytes]) -> None: ...
+
+    @abstractmethod
+    async def import_balances(self, records: Iterable[tuple[int, str, int]], mode: str, ref: Optional[str]) -> int: ...
+
+    @abstractmethod
+    def reconcile_ledger(self, batch_size: int) -> AsyncIterator[Row]: ...
+
+    async def ensure_ledger_partitions(self, months_ahead: int) -> None:
+        """Разделы журнала есть только у Postgres; остальным делать нечего."""
+
+    @abstractmethod
+    async def detach_ledger_partitions(self, keep_months: int) -> list[str]: ...
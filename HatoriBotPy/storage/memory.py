@@ -0,0 +1,482 @@
+from __future__ import annotations
+
+import csv
+import io
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import IO, Any, AsyncIterator, Iterable, Optional, Sequence
+
+from HatoriBotPy.constants import SHOP_ITEMS
+
+from .base import (
+    COMPLAINT_SNIPPET_CHARS,
+    EXPORT_COLUMNS,
+    IMPORT_MODE_ADD,
+    LEDGER_ADJUST,
+    LEDGER_BET,
+    LEDGER_PURCHASE,
+    LEDGER_PURCHASE_REFUND,
+    LEDGER_REFUND,
+    PURCHASE_DUPLICATE,
+    PURCHASE_INSUFFICIENT,
+    PURCHASE_OK,
+    LedgerEntry,
+    PurchaseResult,
+    Row,
+    Storage,
+    bet_totals,
+    month_start,
+    next_streak,
+    split_pot,
+)
+
+_TERM_RE = re.compile(r'(-?)"([^"]*)"|(\S+)')
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _parse_terms(text: str) -> tuple[list[list[str]], list[str]]:
+    """Разбирает запрос как ``websearch_to_tsquery``: группы через ``or`` и исключения."""
+    groups: list[list[str]] = [[]]
+    excluded: list[str] = []
+    for match in _TERM_RE.finditer(text.lower()):
+        negated = bool(match.group(1))
+        term = match.group(2)
+        if term is None:
+            term = match.group(3)
+            if term == "or":
+                groups.append([])
+                continue
+            if term.startswith("-") and len(term) > 1:
+                negated, term = True, term[1:]
+        term = term.strip()
+        if term:
+            (excluded if negated else groups[-1]).append(term)
+    return [group for group in groups if group], excluded
+
+
+class MemoryStorage(Storage):
+    """Хранилище в памяти процесса: для тестов, замеров и запуска без базы.
+
+    Данные теряются при остановке. Тела операций не уступают управление
+    циклу событий, поэтому каждая выполняется атомарно без блокировок.
+    Поиск жалоб — подстрока без учета регистра, без морфологии.
+    """
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        self.users: dict[str, int] = {}
+        self.bets: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        self.purchases: list[dict[str, Any]] = []
+        self.shop_items: dict[str, dict[str, Any]] = {}
+        self.ratings: dict[tuple[str, str], tuple[float, int]] = {}
+        self.games: dict[str, dict[str, Any]] = {}
+        self.rosters: dict[str, dict[str, int]] = defaultdict(dict)
+        self.bet_results: list[dict[str, Any]] = []
+        self.player_stats: dict[str, dict[str, Any]] = {}
+        self.ledger: list[dict[str, Any]] = []
+        self.ledger_archive: dict[str, int] = defaultdict(int)
+        self.complaints: list[dict[str, Any]] = []
+        self.guild_settings: dict[str, dict[str, Any]] = {}
+        self._interaction_ids: dict[str, int] = {}
+        self._ids: dict[str, int] = defaultdict(int)
+
+    def _next_id(self, table: str) -> int:
+        self._ids[table] += 1
+        return self._ids[table]
+
+    async def init(self) -> None:
+        if not self.shop_items:
+            for position, item in enumerate(SHOP_ITEMS):
+                self.shop_items[item["key"]] = {
+                    "key": item["key"],
+                    "name": item["name"],
+                    "price": item["price"],
+                    "type": item["type"],
+                    "duration_days": item.get("duration_days"),
+                    "position": position,
+                    "enabled": True,
+                }
+
+    async def close(self) -> None:
+        return None
+
+    def _write_ledger(self, entries: Sequence[LedgerEntry]) -> None:
+        created_at = _now()
+        for user_id, delta, reason, ref in entries:
+            self.ledger.append(
+                {"user_id": user_id, "delta": delta, "reason": reason, "ref": ref, "created_at": created_at}
+            )
+
+    def _credit_many(self, entries: Sequence[LedgerEntry]) -> None:
+        for user_id, delta, _, _ in entries:
+            self.users[user_id] = self.users.get(user_id, 0) + delta
+        self._write_ledger(entries)
+
+    def _stats(self, uid: str) -> dict[str, Any]:
+        stats = self.player_stats.get(uid)
+        if stats is None:
+            stats = self.player_stats[uid] = {
+                "user_id": uid,
+                "games_played": 0,
+                "wins": 0,
+                "current_streak": 0,
+                "best_streak": 0,
+                "bets_placed": 0,
+                "bets_won": 0,
+                "bet_profit": 0,
+            }
+        return stats
+
+    def _record_bet_results(
+        self,
+        game_id: str,
+        bets: Sequence[Row],
+        bet_payouts: Sequence[int],
+        settled: bool,
+    ) -> None:
+        settled_at = _now()
+        for bet, payout in zip(bets, bet_payouts):
+            self.bet_results.append(
+                {
+                    "id": self._next_id("bet_results"),
+                    "game_id": game_id,
+                    "user_id": bet["user_id"],
+                    "team": bet["team"],
+                    "amount": bet["amount"],
+                    "payout": payout,
+                    "settled_at": settled_at,
+                }
+            )
+        if not settled:
+            return
+        for uid, (placed, won, profit) in bet_totals(bets, bet_payouts).items():
+            stats = self._stats(uid)
+            stats["bets_placed"] += placed
+            stats["bets_won"] += won
+            stats["bet_profit"] += profit
+
+    async def get_user_balance(self, uid: str) -> int:
+        return self.users.setdefault(uid, 0)
+
+    async def fetch_user_balance(self, uid: str) -> Optional[int]:
+        return self.users.get(uid)
+
+    async def set_user_balance(self, uid: str, balance: int, reason: str, ref: Optional[str]) -> bool:
+        previous = self.users.get(uid)
+        if previous is None:
+            return False
+        self.users[uid] = balance
+        self._write_ledger([(uid, balance - previous, reason, ref)])
+        return True
+
+    async def add_currency(self, uid: str, amount: int, reason: str, ref: Optional[str]) -> int:
+        self._credit_many([(uid, amount, reason, ref)])
+        return self.users[uid]
+
+    async def credit_many(self, entries: Sequence[LedgerEntry]) -> None:
+        self._credit_many(entries)
+
+    async def create_bet(self, uid: str, game_id: str, team: int, amount: int) -> None:
+        self.bets[game_id].append(
+            {
+                "id": self._next_id("bets"),
+                "user_id": uid,
+                "game_id": game_id,
+                "team": team,
+                "amount": amount,
+                "created_at": _now(),
+            }
+        )
+
+    async def place_bet(self, uid: str, game_id: str, team: int, amount: int) -> Optional[int]:
+        balance = self.users.get(uid)
+        if balance is None or balance < amount:
+            return None
+        self.users[uid] = balance - amount
+        await self.create_bet(uid, game_id, team, amount)
+        self._write_ledger([(uid, -amount, LEDGER_BET, game_id)])
+        return balance - amount
+
+    async def payout_bets(self, game_id: str, winning_team: int) -> Optional[dict[str, int]]:
+        bets = self.bets.get(game_id)
+        if not bets:
+            return None
+        entries, payouts, bet_payouts = split_pot(bets, game_id, winning_team)
+        if not entries:
+            return {}
+        self._credit_many(entries)
+        self._record_bet_results(game_id, bets, bet_payouts, settled=True)
+        del self.bets[game_id]
+        return payouts
+
+    async def refund_bets(self, game_id: str) -> int:
+        bets = self.bets.pop(game_id, [])
+        if bets:
+            self._credit_many([(bet["user_id"], bet["amount"], LEDGER_REFUND, game_id) for bet in bets])
+            self._record_bet_results(game_id, bets, [bet["amount"] for bet in bets], settled=False)
+        return len(bets)
+
+    async def record_game_start(self, game_id: str, game: str, roster: Sequence[tuple[str, int]]) -> None:
+        if game_id not in self.games:
+            self.games[game_id] = {"game_id": game_id, "game": game, "started_at": _now(), "finished_at": None}
+        for uid, team in roster:
+            self.rosters[game_id].setdefault(uid, team)
+
+    async def record_game_result(
+        self,
+        game_id: str,
+        winning_team: Optional[int],
+        game: str,
+        rating_changes: dict[str, float],
+        default_rating: float,
+    ) -> bool:
+        record = self.games.get(game_id)
+        if record is None or record["finished_at"] is not None:
+            return False
+        record["finished_at"] = _now()
+        record["winner_team"] = winning_team
+        if winning_team is None:
+            return True
+        for uid, team in self.rosters.get(game_id, {}).items():
+            won = team == winning_team
+            stats = self._stats(uid)
+            stats["games_played"] += 1
+            stats["wins"] += 1 if won else 0
+            stats["current_streak"] = next_streak(stats["current_streak"], won)
+            stats["best_streak"] = max(stats["best_streak"], stats["current_streak"])
+        for uid, delta in rating_changes.items():
+            rating, games = self.ratings.get((uid, game), (default_rating, 0))
+            self.ratings[(uid, game)] = (rating + delta, games + 1)
+        return True
+
+    async def get_player_stats(self, uid: str) -> Optional[Row]:
+        stats = self.player_stats.get(uid)
+        return dict(stats) if stats is not None else None
+
+    async def get_bets_for_game(self, game_id: str) -> list[Row]:
+        return [
+            {"user_id": bet["user_id"], "team": bet["team"], "amount": bet["amount"]}
+            for bet in self.bets.get(game_id, ())
+        ]
+
+    async def clear_bets_for_game(self, game_id: str) -> None:
+        self.bets.pop(game_id, None)
+
+    def _add_purchase(self, uid: str, item_key: str, item_name: str, price: int, interaction_id: Optional[str]) -> int:
+        purchase_id = self._next_id("purchases")
+        self.purchases.append(
+            {
+                "id": purchase_id,
+                "user_id": uid,
+                "item_key": item_key,
+                "item_name": item_name,
+                "price": price,
+                "purchased_at": _now(),
+                "interaction_id": interaction_id,
+                "fulfilled_at": None,
+                "refunded_at": None,
+            }
+        )
+        return purchase_id
+
+    async def record_purchase(self, uid: str, item_key: str, item_name: str, price: int) -> None:
+        self._add_purchase(uid, item_key, item_name, price, None)
+
+    async def get_shop_items(self) -> list[Row]:
+        items = sorted(
+            (item for item in self.shop_items.values() if item["enabled"]),
+            key=lambda item: (item["position"], item["key"]),
+        )
+        return [
+            {key: item[key] for key in ("key", "name", "price", "type", "duration_days")}
+            for item in items
+        ]
+
+    async def set_shop_item_price(self, item_key: str, price: int) -> bool:
+        item = self.shop_items.get(item_key)
+        if item is None:
+            return False
+        item["price"] = price
+        return True
+
+    async def purchase_item(
+        self,
+        uid: str,
+        item_key: str,
+        item_name: str,
+        price: int,
+        interaction_id: str,
+    ) -> PurchaseResult:
+        if interaction_id in self._interaction_ids:
+            purchase = self._purchase(self._interaction_ids[interaction_id])
+            return PurchaseResult(
+                PURCHASE_DUPLICATE, self.users.get(uid), purchase["id"], purchase["fulfilled_at"] is not None
+            )
+        balance = self.users.get(uid)
+        if balance is None or balance < price:
+            return PurchaseResult(PURCHASE_INSUFFICIENT)
+        purchase_id = self._add_purchase(uid, item_key, item_name, price, interaction_id)
+        self._interaction_ids[interaction_id] = purchase_id
+        self.users[uid] = balance - price
+        self._write_ledger([(uid, -price, LEDGER_PURCHASE, f"{item_key}:{purchase_id}")])
+        return PurchaseResult(PURCHASE_OK, balance - price, purchase_id)
+
+    def _purchase(self, purchase_id: int) -> dict[str, Any]:
+        return next(purchase for purchase in reversed(self.purchases) if purchase["id"] == purchase_id)
+
+    async def mark_purchase_fulfilled(self, purchase_id: int) -> bool:
+        purchase = self._purchase(purchase_id)
+        if purchase["refunded_at"] is not None:
+            return False
+        if purchase["fulfilled_at"] is None:
+            purchase["fulfilled_at"] = _now()
+        return True
+
+    async def refund_unfulfilled_purchases(self, older_than: float) -> list[Row]:
+        now = _now()
+        cutoff = now - timedelta(seconds=older_than)
+        refunded = [
+            purchase
+            for purchase in self.purchases
+            if purchase["fulfilled_at"] is None
+            and purchase["refunded_at"] is None
+            and purchase["interaction_id"] is not None
+            and purchase["purchased_at"] < cutoff
+        ]
+        for purchase in refunded:
+            purchase["refunded_at"] = now
+        self._credit_many(
+            [
+                (purchase["user_id"], purchase["price"], LEDGER_PURCHASE_REFUND, f"{purchase['item_key']}:{purchase['id']}")
+                for purchase in refunded
+            ]
+        )
+        keys = ("id", "user_id", "item_key", "item_name", "price")
+        return [{key: purchase[key] for key in keys} for purchase in refunded]
+
+    async def get_player_ratings(self, game: str, uids: Sequence[str]) -> dict[str, float]:
+        return {uid: self.ratings[(uid, game)][0] for uid in uids if (uid, game) in self.ratings}
+
+    async def get_guild_settings(self, guild_id: Optional[str]) -> list[Row]:
+        if guild_id is None:
+            return [dict(row) for row in self.guild_settings.values()]
+        row = self.guild_settings.get(guild_id)
+        return [dict(row)] if row is not None else []
+
+    async def set_guild_setting(self, guild_id: str, column: str, value: Optional[int | str]) -> None:
+        row = self.guild_settings.setdefault(guild_id, {"guild_id": guild_id})
+        row[column] = value
+        row["updated_at"] = _now()
+
+    async def create_complaint(
+        self,
+        guild_id: Optional[str],
+        author_id: str,
+        voice_channel_id: Optional[str],
+        body: str,
+    ) -> int:
+        complaint_id = self._next_id("complaints")
+        self.complaints.append(
+            {
+                "id": complaint_id,
+                "guild_id": guild_id,
+                "author_id": author_id,
+                "voice_channel_id": voice_channel_id,
+                "body": body,
+                "created_at": _now(),
+            }
+        )
+        return complaint_id
+
+    async def search_complaints(
+        self,
+        guild_id: str,
+        text: Optional[str],
+        author_id: Optional[str],
+        before_id: Optional[int],
+        limit: int,
+    ) -> list[Row]:
+        groups, excluded = _parse_terms(text or "")
+        terms = [term for group in groups for term in group]
+        highlight = re.compile("|".join(map(re.escape, terms)), re.IGNORECASE) if terms else None
+        rows: list[Row] = []
+        for complaint in reversed(self.complaints):
+            if complaint["guild_id"] != guild_id:
+                continue
+            if before_id and complaint["id"] >= before_id:
+                continue
+            if author_id and complaint["author_id"] != author_id:
+                continue
+            body = complaint["body"].lower()
+            if groups and not any(all(term in body for term in group) for group in groups):
+                continue
+            if any(term in body for term in excluded):
+                continue
+            snippet = complaint["body"][:COMPLAINT_SNIPPET_CHARS]
+            if highlight is not None:
+                snippet = highlight.sub(lambda match: f"**{match.group(0)}**", snippet)
+            rows.append(
+                {
+                    "id": complaint["id"],
+                    "author_id": complaint["author_id"],
+                    "voice_channel_id": complaint["voice_channel_id"],
+                    "created_at": complaint["created_at"],
+                    "snippet": snippet,
+                }
+            )
+            if len(rows) >= limit:
+                break
+        return rows
+
+    async def export_table_csv(self, table: str, output: IO[bytes]) -> None:
+        if table == "users":
+            rows: list[dict[str, Any]] = [{"id": uid, "balance": balance} for uid, balance in self.users.items()]
+        else:
+            rows = self.purchases if table == "purchases" else [bet for bets in self.bets.values() for bet in bets]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        columns = EXPORT_COLUMNS[table]
+        writer.writerow(columns)
+        for row in sorted(rows, key=lambda row: row["id"]):
+            writer.writerow([row[column] for column in columns])
+        output.write(buffer.getvalue().encode("utf-8"))
+
+    async def import_balances(self, records: Iterable[tuple[int, str, int]], mode: str, ref: Optional[str]) -> int:
+        amounts: dict[str, int] = {}
+        for _, uid, amount in records:
+            amounts[uid] = amounts.get(uid, 0) + amount if mode == IMPORT_MODE_ADD else amount
+        entries = []
+        for uid, amount in amounts.items():
+            previous = self.users.get(uid, 0)
+            delta = amount if mode == IMPORT_MODE_ADD else amount - previous
+            self.users[uid] = previous + delta
+            if delta:
+                entries.append((uid, delta, LEDGER_ADJUST, ref))
+        self._write_ledger(entries)
+        return len(amounts)
+
+    async def reconcile_ledger(self, batch_size: int) -> AsyncIterator[Row]:
+        totals: dict[str, int] = defaultdict(int, self.ledger_archive)
+        for entry in self.ledger:
+            totals[entry["user_id"]] += entry["delta"]
+        for uid, balance in list(self.users.items()):
+            if balance != totals.get(uid, 0):
+                yield {"user_id": uid, "balance": balance, "ledger_total": totals.get(uid, 0)}
+
+    async def detach_ledger_partitions(self, keep_months: int) -> list[str]:
+        cutoff = datetime.combine(month_start(_now().date(), -keep_months), datetime.min.time(), timezone.utc)
+        months: set[str] = set()
+        kept = []
+        for entry in self.ledger:
+            if entry["created_at"] < cutoff:
+                self.ledger_archive[entry["user_id"]] += entry["delta"]
+                months.add(f"ledger_y{entry['created_at'].year:04d}m{entry['created_at'].month:02d}")
+            else:
+                kept.append(entry)
+        self.ledger = kept
+        return sorted(months)
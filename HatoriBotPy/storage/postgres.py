@@ -0,0 +1,993 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import IO, Any, AsyncIterator, Callable, Iterable, Optional, Sequence
+
+import asyncpg
+
+from HatoriBotPy.constants import SHOP_ITEMS
+from HatoriBotPy.tracing import record_query, tracing_enabled
+
+from .base import (
+    EXPORT_COLUMNS,
+    GUILD_SETTINGS_CHANNEL,
+    GUILD_SETTINGS_COLUMNS,
+    IMPORT_MODE_ADD,
+    LEDGER_ADJUST,
+    LEDGER_BET,
+    LEDGER_OPENING,
+    LEDGER_PARTITIONS_AHEAD,
+    LEDGER_PURCHASE,
+    LEDGER_PURCHASE_REFUND,
+    LEDGER_REFUND,
+    PURCHASE_DUPLICATE,
+    PURCHASE_INSUFFICIENT,
+    PURCHASE_OK,
+    LedgerEntry,
+    PurchaseResult,
+    Storage,
+    bet_totals,
+    month_start,
+    split_pot,
+)
+
+logger = logging.getLogger("HatoriBotPy.storage.postgres")
+
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 10
+# Начисления, накопившиеся за время записи предыдущей пачки, пишутся одной транзакцией
+CREDIT_BATCH_SIZE = 500
+
+_LEDGER_PARTITION_RE = re.compile(r"^ledger_y(\d{4})m(\d{2})$")
+# Ошибки данных одной записи (переполнение баланса, нарушение ограничения);
+# прочие сбои относятся ко всей пачке начислений
+_ENTRY_ERRORS = (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError)
+
+
+class _InsufficientFunds(Exception):
+    pass
+
+
+async def _trace_connection(conn: asyncpg.Connection) -> None:
+    conn.add_query_logger(record_query)
+
+
+async def _write_ledger(conn: asyncpg.Connection, entries: Sequence[LedgerEntry]) -> None:
+    if not entries:
+        return
+    user_ids, deltas, reasons, refs = zip(*entries)
+    await conn.execute(
+        """
+        INSERT INTO ledger (user_id, delta, reason, ref)
+        SELECT * FROM unnest($1::text[], $2::integer[], $3::text[], $4::text[])
+        """,
+        list(user_ids),
+        list(deltas),
+        list(reasons),
+        list(refs),
+    )
+
+
+async def _credit_many(conn: asyncpg.Connection, entries: Sequence[LedgerEntry]) -> dict[str, int]:
+    """Начисляет суммы и пишет журнал; возвращает новые балансы."""
+    totals: dict[str, int] = {}
+    for user_id, delta, _, _ in entries:
+        totals[user_id] = totals.get(user_id, 0) + delta
+    rows = await conn.fetch(
+        """
+        INSERT INTO users (id, balance)
+        SELECT * FROM unnest($1::text[], $2::integer[])
+        ON CONFLICT (id) DO UPDATE SET balance = users.balance + EXCLUDED.balance
+        RETURNING id, balance
+        """,
+        list(totals.keys()),
+        list(totals.values()),
+    )
+    await _write_ledger(conn, entries)
+    return {row["id"]: int(row["balance"]) for row in rows}
+
+
+async def _apply_rating_changes(
+    conn: asyncpg.Connection, game: str, changes: dict[str, float], default: float
+) -> None:
+    await conn.execute(
+        """
+        INSERT INTO player_ratings (user_id, game, rating, games)
+        SELECT user_id, $1, $4 + delta, 1
+        FROM unnest($2::text[], $3::double precision[]) AS changes(user_id, delta)
+        ON CONFLICT (user_id, game) DO UPDATE
+        SET rating = player_ratings.rating + (EXCLUDED.rating - $4),
+            games = player_ratings.games + 1
+        """,
+        game,
+        list(changes.keys()),
+        list(changes.values()),
+        default,
+    )
+
+
+async def _ensure_ledger_partitions(conn: asyncpg.Connection, months_ahead: int = LEDGER_PARTITIONS_AHEAD) -> None:
+    today = datetime.now(timezone.utc).date()
+    for offset in range(months_ahead + 1):
+        start = month_start(today, offset)
+        end = month_start(today, offset + 1)
+        await conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS ledger_y{start.year:04d}m{start.month:02d}
+            PARTITION OF ledger FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+            """
+        )
+
+
+async def _record_bet_results(
+    conn: asyncpg.Connection,
+    game_id: str,
+    bets: Sequence[asyncpg.Record],
+    bet_payouts: Sequence[int],
+    settled: bool,
+) -> None:
+    """Сохраняет исходы ставок и инкрементально обновляет агрегаты игроков.
+
+    ``bet_payouts`` выровнен по ``bets``. Возвраты (``settled=False``)
+    сохраняются в истории, но не влияют на статистику.
+    """
+    await conn.execute(
+        """
+        INSERT INTO bet_results (game_id, user_id, team, amount, payout)
+        SELECT $1, * FROM unnest($2::text[], $3::integer[], $4::integer[], $5::integer[])
+        """,
+        game_id,
+        [bet["user_id"] for bet in bets],
+        [int(bet["team"]) for bet in bets],
+        [int(bet["amount"]) for bet in bets],
+        list(bet_payouts),
+    )
+    if not settled:
+        return
+
+    totals = bet_totals(bets, bet_payouts)
+    await conn.execute(
+        """
+        INSERT INTO player_stats (user_id, bets_placed, bets_won, bet_profit)
+        SELECT * FROM unnest($1::text[], $2::integer[], $3::integer[], $4::bigint[])
+        ON CONFLICT (user_id) DO UPDATE SET
+            bets_placed = player_stats.bets_placed + EXCLUDED.bets_placed,
+            bets_won = player_stats.bets_won + EXCLUDED.bets_won,
+            bet_profit = player_stats.bet_profit + EXCLUDED.bet_profit
+        """,
+        list(totals.keys()),
+        [placed for placed, _, _ in totals.values()],
+        [won for _, won, _ in totals.values()],
+        [profit for _, _, profit in totals.values()],
+    )
+
+
+class PostgresStorage(Storage):
+    """Основное хранилище: пул asyncpg поверх Postgres."""
+
+    name = "postgres"
+    supports_notify = True
+    supports_replicas = True
+
+    def __init__(self, dsn: str, pool: Optional[asyncpg.Pool] = None) -> None:
+        self.dsn = dsn
+        self._pool = pool
+        self._credits: list[tuple[LedgerEntry, asyncio.Future[int]]] = []
+        self._credit_task: Optional[asyncio.Task[None]] = None
+        self.credit_batches = 0
+        self.credit_entries = 0
+
+    async def get_pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            logger.info("Подключение к базе данных %s", self.dsn)
+            try:
+                self._pool = await asyncpg.create_pool(
+                    dsn=self.dsn,
+                    min_size=POOL_MIN_SIZE,
+                    max_size=POOL_MAX_SIZE,
+                    init=_trace_connection if tracing_enabled() else None,
+                )
+            except Exception:
+                logger.exception("Не удалось создать пул подключений к базе данных")
+                raise
+            else:
+                logger.info("Пул подключений к базе данных создан")
+        return self._pool
+
+    async def close(self) -> None:
+        if self._credit_task is not None:
+            # Ожидающие начисления дописываются до закрытия пула
+            await self._credit_task
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+
+    async def open_listener(self, channel: str, callback: Callable[..., Any]) -> asyncpg.Connection:
+        # Отдельное соединение: пул сбрасывает подписки при возврате соединения
+        conn = await asyncpg.connect(self.dsn)
+        await conn.add_listener(channel, callback)
+        return conn
+
+    async def replication_lag(self) -> Optional[float]:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                SELECT pg_is_in_recovery() AS replica,
+                       CASE
+                           WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                           ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                       END AS lag
+                """
+            )
+        if not row["replica"]:
+            return None
+        # Реплика еще не воспроизвела ни одной транзакции: отставание неизвестно
+        return float(row["lag"]) if row["lag"] is not None else float("inf")
+
+    async def query(self, sql: str, *params: Any) -> list[asyncpg.Record]:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            return await conn.fetch(sql, *params)
+
+    async def execute(self, sql: str, *params: Any) -> str:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            return await conn.execute(sql, *params)
+
+    async def init(self) -> None:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            ledger_exists = await conn.fetchval("SELECT to_regclass('ledger') IS NOT NULL")
+            await conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS users (
+                    id TEXT PRIMARY KEY,
+                    balance INTEGER DEFAULT 0
+                );
+
+                CREATE TABLE IF NOT EXISTS bets (
+                    id SERIAL PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    game_id TEXT NOT NULL,
+                    team INTEGER NOT NULL,
+                    amount INTEGER NOT NULL,
+                    created_at TIMESTAMP DEFAULT NOW()
+                );
+
+                CREATE TABLE IF NOT EXISTS purchases (
+                    id SERIAL PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    item_key TEXT NOT NULL,
+                    item_name TEXT NOT NULL,
+                    price INTEGER NOT NULL,
+                    purchased_at TIMESTAMP DEFAULT NOW()
+                );
+
+                ALTER TABLE purchases ADD COLUMN IF NOT EXISTS interaction_id TEXT;
+                CREATE UNIQUE INDEX IF NOT EXISTS purchases_interaction_id_idx ON purchases (interaction_id);
+                ALTER TABLE purchases ADD COLUMN IF NOT EXISTS fulfilled_at TIMESTAMP;
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_name = 'purchases' AND column_name = 'refunded_at'
+                    ) THEN
+                        ALTER TABLE purchases ADD COLUMN refunded_at TIMESTAMP;
+                        -- Покупки, сделанные до учета выдачи, считаются выданными
+                        UPDATE purchases SET fulfilled_at = purchased_at WHERE fulfilled_at IS NULL;
+                    END IF;
+                END $$;
+                CREATE INDEX IF NOT EXISTS purchases_unfulfilled_idx ON purchases (purchased_at)
+                    WHERE fulfilled_at IS NULL AND refunded_at IS NULL;
+
+                CREATE TABLE IF NOT EXISTS shop_items (
+                    key TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    price INTEGER NOT NULL,
+                    type TEXT NOT NULL,
+                    duration_days INTEGER,
+                    position INTEGER NOT NULL DEFAULT 0,
+                    enabled BOOLEAN NOT NULL DEFAULT TRUE
+                );
+
+                CREATE TABLE IF NOT EXISTS player_ratings (
+                    user_id TEXT NOT NULL,
+                    game TEXT NOT NULL,
+                    rating DOUBLE PRECISION NOT NULL,
+                    games INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, game)
+                );
+
+                CREATE TABLE IF NOT EXISTS games (
+                    game_id TEXT PRIMARY KEY,
+                    game TEXT NOT NULL,
+                    started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    finished_at TIMESTAMPTZ,
+                    winner_team INTEGER
+                );
+
+                CREATE TABLE IF NOT EXISTS game_rosters (
+                    game_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    team INTEGER NOT NULL,
+                    PRIMARY KEY (game_id, user_id)
+                );
+                CREATE INDEX IF NOT EXISTS game_rosters_user_id_idx ON game_rosters (user_id);
+
+                CREATE TABLE IF NOT EXISTS bet_results (
+                    id BIGSERIAL PRIMARY KEY,
+                    game_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    team INTEGER NOT NULL,
+                    amount INTEGER NOT NULL,
+                    payout INTEGER NOT NULL,
+                    settled_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                );
+                CREATE INDEX IF NOT EXISTS bet_results_user_id_idx ON bet_results (user_id);
+
+                CREATE TABLE IF NOT EXISTS player_stats (
+                    user_id TEXT PRIMARY KEY,
+                    games_played INTEGER NOT NULL DEFAULT 0,
+                    wins INTEGER NOT NULL DEFAULT 0,
+                    current_streak INTEGER NOT NULL DEFAULT 0,
+                    best_streak INTEGER NOT NULL DEFAULT 0,
+                    bets_placed INTEGER NOT NULL DEFAULT 0,
+                    bets_won INTEGER NOT NULL DEFAULT 0,
+                    bet_profit BIGINT NOT NULL DEFAULT 0
+                );
+
+                CREATE TABLE IF NOT EXISTS ledger (
+                    id BIGSERIAL,
+                    user_id TEXT NOT NULL,
+                    delta INTEGER NOT NULL,
+                    reason TEXT NOT NULL,
+                    ref TEXT,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                ) PARTITION BY RANGE (created_at);
+
+                CREATE TABLE IF NOT EXISTS ledger_default PARTITION OF ledger DEFAULT;
+
+                CREATE INDEX IF NOT EXISTS ledger_created_at_brin ON ledger USING BRIN (created_at);
+                CREATE INDEX IF NOT EXISTS ledger_user_id_idx ON ledger (user_id);
+
+                CREATE TABLE IF NOT EXISTS ledger_archive (
+                    user_id TEXT PRIMARY KEY,
+                    total BIGINT NOT NULL DEFAULT 0
+                );
+
+                CREATE TABLE IF NOT EXISTS complaints (
+                    id BIGSERIAL PRIMARY KEY,
+                    guild_id TEXT,
+                    author_id TEXT NOT NULL,
+                    voice_channel_id TEXT,
+                    body TEXT NOT NULL,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    search TSVECTOR GENERATED ALWAYS AS (to_tsvector('russian', body)) STORED
+                );
+                CREATE INDEX IF NOT EXISTS complaints_search_idx ON complaints USING GIN (search);
+                CREATE INDEX IF NOT EXISTS complaints_author_id_idx ON complaints (author_id, id);
+                CREATE INDEX IF NOT EXISTS complaints_guild_id_idx ON complaints (guild_id, id);
+
+                CREATE TABLE IF NOT EXISTS guild_settings (
+                    guild_id TEXT PRIMARY KEY,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                );
+                """
+            )
+            await conn.execute(
+                "".join(
+                    f"ALTER TABLE guild_settings ADD COLUMN IF NOT EXISTS {column} {kind};"
+                    for column, kind in GUILD_SETTINGS_COLUMNS.items()
+                )
+            )
+            # Изменение строки оповещает все процессы бота, каждый перечитывает только эту гильдию
+            await conn.execute(
+                f"""
+                CREATE OR REPLACE FUNCTION notify_guild_settings() RETURNS trigger AS $$
+                BEGIN
+                    PERFORM pg_notify('{GUILD_SETTINGS_CHANNEL}', COALESCE(NEW.guild_id, OLD.guild_id));
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql;
+
+                DROP TRIGGER IF EXISTS guild_settings_notify ON guild_settings;
+                CREATE TRIGGER guild_settings_notify
+                    AFTER INSERT OR UPDATE OR DELETE ON guild_settings
+                    FOR EACH ROW EXECUTE FUNCTION notify_guild_settings();
+                """
+            )
+            await _ensure_ledger_partitions(conn)
+
+            if not await conn.fetchval("SELECT EXISTS (SELECT 1 FROM shop_items)"):
+                await conn.executemany(
+                    """
+                    INSERT INTO shop_items (key, name, price, type, duration_days, position)
+                    VALUES ($1, $2, $3, $4, $5, $6)
+                    ON CONFLICT (key) DO NOTHING
+                    """,
+                    [
+                        (item["key"], item["name"], item["price"], item["type"], item.get("duration_days"), position)
+                        for position, item in enumerate(SHOP_ITEMS)
+                    ],
+                )
+
+            if not ledger_exists:
+                # Балансы, накопленные до появления журнала, фиксируются одной записью
+                await conn.execute(
+                    """
+                    INSERT INTO ledger (user_id, delta, reason)
+                    SELECT id, balance, $1 FROM users WHERE balance <> 0
+                    """,
+                    LEDGER_OPENING,
+                )
+
+    async def ensure_ledger_partitions(self, months_ahead: int) -> None:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            await _ensure_ledger_partitions(conn, months_ahead)
+
+    async def detach_ledger_partitions(self, keep_months: int) -> list[str]:
+        cutoff = month_start(datetime.now(timezone.utc).date(), -keep_months)
+        pool = await self.get_pool()
+        detached: list[str] = []
+        async with pool.acquire() as conn:
+            names = await conn.fetch(
+                """
+                SELECT c.relname FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_class p ON p.oid = i.inhparent
+                WHERE p.relname = 'ledger'
+                """
+            )
+            for record in names:
+                name = record["relname"]
+                match = _LEDGER_PARTITION_RE.match(name)
+                if match is None:
+                    continue
+                if month_start(date(int(match.group(1)), int(match.group(2)), 1), 1) > cutoff:
+                    continue
+                async with conn.transaction():
+                    await conn.execute(
+                        f"""
+                        INSERT INTO ledger_archive (user_id, total)
+                        SELECT user_id, SUM(delta) FROM {name} GROUP BY user_id
+                        ON CONFLICT (user_id) DO UPDATE SET total = ledger_archive.total + EXCLUDED.total
+                        """
+                    )
+                    await conn.execute(f"ALTER TABLE ledger DETACH PARTITION {name}")
+                detached.append(name)
+                logger.info("Раздел журнала %s отсоединен", name)
+        return detached
+
+    async def reconcile_ledger(self, batch_size: int) -> AsyncIterator[asyncpg.Record]:
+        # Агрегация на сервере, расхождения читаются серверным курсором порциями
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                cursor = conn.cursor(
+                    """
+                    SELECT u.id AS user_id,
+                           u.balance,
+                           COALESCE(a.total, 0) + COALESCE(l.total, 0) AS ledger_total
+                    FROM users u
+                    LEFT JOIN ledger_archive a ON a.user_id = u.id
+                    LEFT JOIN (
+                        SELECT user_id, SUM(delta) AS total FROM ledger GROUP BY user_id
+                    ) l ON l.user_id = u.id
+                    WHERE u.balance <> COALESCE(a.total, 0) + COALESCE(l.total, 0)
+                    """,
+                    prefetch=batch_size,
+                )
+                async for row in cursor:
+                    yield row
+
+    async def get_user_balance(self, uid: str) -> int:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                row = await conn.fetchrow("SELECT balance FROM users WHERE id=$1", uid)
+                if row is None:
+                    await conn.execute("INSERT INTO users (id, balance) VALUES ($1, 0)", uid)
+                    return 0
+                return int(row["balance"])
+
+    async def fetch_user_balance(self, uid: str) -> Optional[int]:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            balance = await conn.fetchval("SELECT balance FROM users WHERE id = $1", uid)
+            return int(balance) if balance is not None else None
+
+    async def set_user_balance(self, uid: str, balance: int, reason: str, ref: Optional[str]) -> bool:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                previous = await conn.fetchval("SELECT balance FROM users WHERE id = $1 FOR UPDATE", uid)
+                if previous is None:
+                    return False
+                await conn.execute("UPDATE users SET balance = $1 WHERE id = $2", balance, uid)
+                await _write_ledger(conn, [(uid, balance - int(previous), reason, ref)])
+                return True
+
+    async def add_currency(self, uid: str, amount: int, reason: str, ref: Optional[str]) -> int:
+        """Ставит начисление в пачку и ждет ее фиксации.
+
+        Одиночный вызов пишется сразу; пока пачка пишется, следующие
+        начисления (награды за голос и сообщения) копятся и уходят одной
+        транзакцией с одной вставкой в журнал.
+        """
+        future: asyncio.Future[int] = asyncio.get_running_loop().create_future()
+        self._credits.append(((uid, amount, reason, ref), future))
+        if self._credit_task is None or self._credit_task.done():
+            # Задача принадлежит хранилищу, а не супервизору: супервизор гасит
+            # задачи раньше закрытия базы, а close() дожидается этой пачки
+            self._credit_task = asyncio.create_task(self._flush_credits(), name="postgres-credits")
+        return await future
+
+    async def _flush_credits(self) -> None:
+        while self._credits:
+            batch = self._credits[:CREDIT_BATCH_SIZE]
+            del self._credits[:CREDIT_BATCH_SIZE]
+            # Вызов, отмененный по сроку до записи, в базу не попадает
+            batch = [(entry, future) for entry, future in batch if not future.done()]
+            if not batch:
+                continue
+            entries = [entry for entry, _ in batch]
+            results: list[int | BaseException]
+            try:
+                try:
+                    balances = await self._credit_batch(entries)
+                    results = [balances.get(uid, 0) for uid, _, _, _ in entries]
+                except _ENTRY_ERRORS:
+                    if len(entries) == 1:
+                        raise
+                    # Ошибка одной записи не отменяет остальные: пачка
+                    # повторяется по одной записи под точками сохранения
+                    results = await self._credit_each(entries)
+            except Exception as e:
+                results = [e] * len(batch)
+            credited = sum(1 for result in results if not isinstance(result, BaseException))
+            if credited:
+                self.credit_batches += 1
+                self.credit_entries += credited
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def _credit_batch(self, entries: Sequence[LedgerEntry]) -> dict[str, int]:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                return await _credit_many(conn, entries)
+
+    async def _credit_each(self, entries: Sequence[LedgerEntry]) -> list[int | BaseException]:
+        results: list[int | BaseException] = []
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                for entry in entries:
+                    try:
+                        async with conn.transaction():
+                            balances = await _credit_many(conn, [entry])
+                    except _ENTRY_ERRORS as e:
+                        results.append(e)
+                    else:
+                        results.append(balances.get(entry[0], 0))
+        return results
+
+    def report(self) -> list[str]:
+        average = self.credit_entries / self.credit_batches if self.credit_batches else 0.0
+        return [
+            f"Postgres: начислений {self.credit_entries}, пачек {self.credit_batches} (в среднем {average:.1f} на пачку)"
+        ]
+
+    async def credit_many(self, entries: Sequence[LedgerEntry]) -> None:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await _credit_many(conn, entries)
+
+    async def create_bet(self, uid: str, game_id: str, team: int, amount: int) -> None:
+        await self.execute(
+            "INSERT INTO bets (user_id, game_id, team, amount) VALUES ($1, $2, $3, $4)",
+            uid,
+            game_id,
+            team,
+            amount,
+        )
+
+    async def place_bet(self, uid: str, game_id: str, team: int, amount: int) -> Optional[int]:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                balance = await conn.fetchval(
+                    "UPDATE users SET balance = balance - $2 WHERE id = $1 AND balance >= $2 RETURNING balance",
+                    uid,
+                    amount,
+                )
+                if balance is None:
+                    return None
+                await conn.execute(
+                    "INSERT INTO bets (user_id, game_id, team, amount) VALUES ($1, $2, $3, $4)",
+                    uid,
+                    game_id,
+                    team,
+                    amount,
+                )
+                await _write_ledger(conn, [(uid, -amount, LEDGER_BET, game_id)])
+                return int(balance)
+
+    async def payout_bets(self, game_id: str, winning_team: int) -> Optional[dict[str, int]]:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                bets = await conn.fetch(
+                    "SELECT user_id, team, amount FROM bets WHERE game_id = $1 FOR UPDATE",
+                    game_id,
+                )
+                if not bets:
+                    return None
+                entries, payouts, bet_payouts = split_pot(bets, game_id, winning_team)
+                if not entries:
+                    return {}
+                await _credit_many(conn, entries)
+                await _record_bet_results(conn, game_id, bets, bet_payouts, settled=True)
+                await conn.execute("DELETE FROM bets WHERE game_id = $1", game_id)
+                return payouts
+
+    async def refund_bets(self, game_id: str) -> int:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                bets = await conn.fetch(
+                    "DELETE FROM bets WHERE game_id = $1 RETURNING user_id, team, amount",
+                    game_id,
+                )
+                if bets:
+                    await _credit_many(
+                        conn,
+                        [(bet["user_id"], int(bet["amount"]), LEDGER_REFUND, game_id) for bet in bets],
+                    )
+                    await _record_bet_results(
+                        conn, game_id, bets, [int(bet["amount"]) for bet in bets], settled=False
+                    )
+                return len(bets)
+
+    async def record_game_start(self, game_id: str, game: str, roster: Sequence[tuple[str, int]]) -> None:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    "INSERT INTO games (game_id, game) VALUES ($1, $2) ON CONFLICT (game_id) DO NOTHING",
+                    game_id,
+                    game,
+                )
+                await conn.execute(
+                    """
+                    INSERT INTO game_rosters (game_id, user_id, team)
+                    SELECT $1, * FROM unnest($2::text[], $3::integer[])
+                    ON CONFLICT (game_id, user_id) DO NOTHING
+                    """,
+                    game_id,
+                    [uid for uid, _ in roster],
+                    [team for _, team in roster],
+                )
+
+    async def record_game_result(
+        self,
+        game_id: str,
+        winning_team: Optional[int],
+        game: str,
+        rating_changes: dict[str, float],
+        default_rating: float,
+    ) -> bool:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                finished = await conn.fetchval(
+                    """
+                    UPDATE games SET finished_at = NOW(), winner_team = $2
+                    WHERE game_id = $1 AND finished_at IS NULL
+                    RETURNING game_id
+                    """,
+                    game_id,
+                    winning_team,
+                )
+                if finished is None:
+                    return False
+                if winning_team is None:
+                    return True
+                await conn.execute(
+                    """
+                    INSERT INTO player_stats (user_id, games_played, wins, current_streak, best_streak)
+                    SELECT user_id, 1, (team = $2)::integer,
+                           CASE WHEN team = $2 THEN 1 ELSE -1 END, (team = $2)::integer
+                    FROM game_rosters WHERE game_id = $1
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        games_played = player_stats.games_played + 1,
+                        wins = player_stats.wins + EXCLUDED.wins,
+                        current_streak = CASE
+                            WHEN EXCLUDED.wins = 1 THEN GREATEST(player_stats.current_streak, 0) + 1
+                            ELSE LEAST(player_stats.current_streak, 0) - 1
+                        END,
+                        best_streak = GREATEST(
+                            player_stats.best_streak,
+                            CASE WHEN EXCLUDED.wins = 1 THEN GREATEST(player_stats.current_streak, 0) + 1 ELSE 0 END
+                        )
+                    """,
+                    game_id,
+                    winning_team,
+                )
+                if rating_changes:
+                    await _apply_rating_changes(conn, game, rating_changes, default_rating)
+                return True
+
+    async def get_player_stats(self, uid: str) -> Optional[asyncpg.Record]:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            return await conn.fetchrow("SELECT * FROM player_stats WHERE user_id = $1", uid)
+
+    async def get_bets_for_game(self, game_id: str) -> list[asyncpg.Record]:
+        return await self.query("SELECT user_id, team, amount FROM bets WHERE game_id = $1", game_id)
+
+    async def clear_bets_for_game(self, game_id: str) -> None:
+        await self.execute("DELETE FROM bets WHERE game_id = $1", game_id)
+
+    async def record_purchase(self, uid: str, item_key: str, item_name: str, price: int) -> None:
+        await self.execute(
+            "INSERT INTO purchases (user_id, item_key, item_name, price) VALUES ($1, $2, $3, $4)",
+            uid,
+            item_key,
+            item_name,
+            price,
+        )
+
+    async def get_shop_items(self) -> list[asyncpg.Record]:
+        return await self.query(
+            """
+            SELECT key, name, price, type, duration_days FROM shop_items
+            WHERE enabled ORDER BY position, key
+            """
+        )
+
+    async def set_shop_item_price(self, item_key: str, price: int) -> bool:
+        result = await self.execute("UPDATE shop_items SET price = $2 WHERE key = $1", item_key, price)
+        return result != "UPDATE 0"
+
+    async def purchase_item(
+        self,
+        uid: str,
+        item_key: str,
+        item_name: str,
+        price: int,
+        interaction_id: str,
+    ) -> PurchaseResult:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            try:
+                async with conn.transaction():
+                    purchase_id = await conn.fetchval(
+                        """
+                        INSERT INTO purchases (user_id, item_key, item_name, price, interaction_id)
+                        VALUES ($1, $2, $3, $4, $5)
+                        ON CONFLICT (interaction_id) DO NOTHING
+                        RETURNING id
+                        """,
+                        uid,
+                        item_key,
+                        item_name,
+                        price,
+                        interaction_id,
+                    )
+                    if purchase_id is None:
+                        row = await conn.fetchrow(
+                            """
+                            SELECT p.id, p.fulfilled_at IS NOT NULL AS fulfilled, u.balance
+                            FROM purchases p LEFT JOIN users u ON u.id = p.user_id
+                            WHERE p.interaction_id = $1
+                            """,
+                            interaction_id,
+                        )
+                        return PurchaseResult(PURCHASE_DUPLICATE, row["balance"], row["id"], row["fulfilled"])
+                    balance = await conn.fetchval(
+                        "UPDATE users SET balance = balance - $2 WHERE id = $1 AND balance >= $2 RETURNING balance",
+                        uid,
+                        price,
+                    )
+                    if balance is None:
+                        raise _InsufficientFunds
+                    await _write_ledger(conn, [(uid, -price, LEDGER_PURCHASE, f"{item_key}:{purchase_id}")])
+                    return PurchaseResult(PURCHASE_OK, int(balance), purchase_id)
+            except _InsufficientFunds:
+                return PurchaseResult(PURCHASE_INSUFFICIENT)
+
+    async def mark_purchase_fulfilled(self, purchase_id: int) -> bool:
+        result = await self.execute(
+            "UPDATE purchases SET fulfilled_at = COALESCE(fulfilled_at, NOW()) WHERE id = $1 AND refunded_at IS NULL",
+            purchase_id,
+        )
+        return result != "UPDATE 0"
+
+    async def refund_unfulfilled_purchases(self, older_than: float) -> list[asyncpg.Record]:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(
+                    """
+                    UPDATE purchases SET refunded_at = NOW()
+                    WHERE fulfilled_at IS NULL AND refunded_at IS NULL AND interaction_id IS NOT NULL
+                      AND purchased_at < NOW() - make_interval(secs => $1)
+                    RETURNING id, user_id, item_key, item_name, price
+                    """,
+                    older_than,
+                )
+                if rows:
+                    await _credit_many(
+                        conn,
+                        [
+                            (row["user_id"], row["price"], LEDGER_PURCHASE_REFUND, f"{row['item_key']}:{row['id']}")
+                            for row in rows
+                        ],
+                    )
+                return rows
+
+    async def get_player_ratings(self, game: str, uids: Sequence[str]) -> dict[str, float]:
+        rows = await self.query(
+            "SELECT user_id, rating FROM player_ratings WHERE game = $1 AND user_id = ANY($2::text[])",
+            game,
+            list(uids),
+        )
+        return {row["user_id"]: float(row["rating"]) for row in rows}
+
+    async def get_guild_settings(self, guild_id: Optional[str]) -> list[asyncpg.Record]:
+        if guild_id is None:
+            return await self.query("SELECT * FROM guild_settings")
+        return await self.query("SELECT * FROM guild_settings WHERE guild_id = $1", guild_id)
+
+    async def set_guild_setting(self, guild_id: str, column: str, value: Optional[int | str]) -> None:
+        # Имя столбца проверено по GUILD_SETTINGS_COLUMNS в db.py
+        await self.execute(
+            f"""
+            INSERT INTO guild_settings (guild_id, {column}) VALUES ($1, $2)
+            ON CONFLICT (guild_id) DO UPDATE SET {column} = EXCLUDED.{column}, updated_at = NOW()
+            """,
+            guild_id,
+            value,
+        )
+
+    async def create_complaint(
+        self,
+        guild_id: Optional[str],
+        author_id: str,
+        voice_channel_id: Optional[str],
+        body: str,
+    ) -> int:
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            return await conn.fetchval(
+                """
+                INSERT INTO complaints (guild_id, author_id, voice_channel_id, body)
+                VALUES ($1, $2, $3, $4)
+                RETURNING id
+                """,
+                guild_id,
+                author_id,
+                voice_channel_id,
+                body,
+            )
+
+    async def search_complaints(
+        self,
+        guild_id: str,
+        text: Optional[str],
+        author_id: Optional[str],
+        before_id: Optional[int],
+        limit: int,
+    ) -> list[asyncpg.Record]:
+        # Условия собираются из фиксированных фрагментов: у каждого сочетания
+        # фильтров свой подготовленный запрос и свой план с индексом
+        conditions = ["guild_id = $1"]
+        params: list[Any] = [guild_id]
+        snippet = "left(body, 200)"
+        if text:
+            params.append(text)
+            conditions.append(f"search @@ websearch_to_tsquery('russian', ${len(params)})")
+            snippet = (
+                f"ts_headline('russian', body, websearch_to_tsquery('russian', ${len(params)}), "
+                "'StartSel=**, StopSel=**, MaxWords=30, MinWords=10')"
+            )
+        if author_id:
+            params.append(author_id)
+            conditions.append(f"author_id = ${len(params)}")
+        if before_id:
+            params.append(before_id)
+            conditions.append(f"id < ${len(params)}")
+        params.append(limit)
+
+        return await self.query(
+            f"""
+            SELECT id, author_id, voice_channel_id, created_at, {snippet} AS snippet
+            FROM complaints WHERE {' AND '.join(conditions)}
+            ORDER BY id DESC
+            LIMIT ${len(params)}
+            """,
+            *params,
+        )
+
+    async def export_table_csv(self, table: str, output: IO[bytes]) -> None:
+        # Потоковая выгрузка через COPY ... TO STDOUT
+        sql = f"SELECT {', '.join(EXPORT_COLUMNS[table])} FROM {table} ORDER BY id"
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            await conn.copy_from_query(sql, output=output, format="csv", header=True)
+
+    async def import_balances(self, records: Iterable[tuple[int, str, int]], mode: str, ref: Optional[str]) -> int:
+        # Поток строк загружается через COPY во временную таблицу и не материализуется в памяти
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    """
+                    CREATE TEMP TABLE balance_import (
+                        line INTEGER NOT NULL,
+                        user_id TEXT NOT NULL,
+                        amount INTEGER NOT NULL
+                    ) ON COMMIT DROP
+                    """
+                )
+                await conn.copy_records_to_table(
+                    "balance_import",
+                    records=records,
+                    columns=("line", "user_id", "amount"),
+                )
+                if mode == IMPORT_MODE_ADD:
+                    return await conn.fetchval(
+                        """
+                        WITH src AS (
+                            SELECT user_id, SUM(amount)::integer AS amount
+                            FROM balance_import GROUP BY user_id
+                        ), upserted AS (
+                            INSERT INTO users (id, balance) SELECT user_id, amount FROM src
+                            ON CONFLICT (id) DO UPDATE SET balance = users.balance + EXCLUDED.balance
+                            RETURNING id
+                        ), entries AS (
+                            INSERT INTO ledger (user_id, delta, reason, ref)
+                            SELECT user_id, amount, $1, $2 FROM src WHERE amount <> 0
+                        )
+                        SELECT count(*) FROM upserted
+                        """,
+                        LEDGER_ADJUST,
+                        ref,
+                    )
+
+                await conn.execute(
+                    "SELECT 1 FROM users WHERE id IN (SELECT user_id FROM balance_import) FOR UPDATE"
+                )
+                return await conn.fetchval(
+                    """
+                    WITH src AS (
+                        SELECT DISTINCT ON (user_id) user_id, amount
+                        FROM balance_import ORDER BY user_id, line DESC
+                    ), prev AS (
+                        SELECT src.user_id, src.amount, COALESCE(users.balance, 0) AS previous
+                        FROM src LEFT JOIN users ON users.id = src.user_id
+                    ), upserted AS (
+                        INSERT INTO users (id, balance) SELECT user_id, amount FROM prev
+                        ON CONFLICT (id) DO UPDATE SET balance = EXCLUDED.balance
+                        RETURNING id
+                    ), entries AS (
+                        INSERT INTO ledger (user_id, delta, reason, ref)
+                        SELECT user_id, amount - previous, $1, $2 FROM prev WHERE amount <> previous
+                    )
+                    SELECT count(*) FROM upserted
+                    """,
+                    LEDGER_ADJUST,
+                    ref,
+                )
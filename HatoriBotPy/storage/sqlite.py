@@ -0,0 +1,932 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import functools
+import io
+import logging
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import IO, Any, AsyncIterator, Callable, Iterable, Optional, Sequence, TypeVar
+
+from HatoriBotPy.constants import SHOP_ITEMS
+
+from .base import (
+    COMPLAINT_SNIPPET_CHARS,
+    EXPORT_COLUMNS,
+    GUILD_SETTINGS_COLUMNS,
+    IMPORT_MODE_ADD,
+    LEDGER_ADJUST,
+    LEDGER_BET,
+    LEDGER_OPENING,
+    LEDGER_PURCHASE,
+    LEDGER_PURCHASE_REFUND,
+    LEDGER_REFUND,
+    PURCHASE_DUPLICATE,
+    PURCHASE_INSUFFICIENT,
+    PURCHASE_OK,
+    LedgerEntry,
+    PurchaseResult,
+    Row,
+    Storage,
+    StorageBusy,
+    bet_totals,
+    month_start,
+    split_pot,
+)
+
+logger = logging.getLogger("HatoriBotPy.storage.sqlite")
+
+# Сколько операций записи попадает в одну транзакцию
+WRITE_BATCH_SIZE = 64
+READER_THREADS = 4
+BUSY_TIMEOUT_MS = 5000
+EXPORT_FETCH_SIZE = 1000
+
+_NOW = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+_TIMESTAMP_COLUMNS = frozenset(
+    {"created_at", "purchased_at", "started_at", "finished_at", "settled_at", "updated_at"}
+)
+_TERM_RE = re.compile(r'(-?)"([^"]*)"|(\S+)')
+_WORD_RE = re.compile(r"\w+")
+
+T = TypeVar("T")
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    balance INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS bets (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    game_id TEXT NOT NULL,
+    team INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    created_at TEXT NOT NULL DEFAULT ({_NOW})
+);
+CREATE INDEX IF NOT EXISTS bets_game_id_idx ON bets (game_id);
+
+CREATE TABLE IF NOT EXISTS purchases (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    item_name TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    purchased_at TEXT NOT NULL DEFAULT ({_NOW}),
+    interaction_id TEXT UNIQUE,
+    fulfilled_at TEXT,
+    refunded_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS shop_items (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    duration_days INTEGER,
+    position INTEGER NOT NULL DEFAULT 0,
+    enabled INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS player_ratings (
+    user_id TEXT NOT NULL,
+    game TEXT NOT NULL,
+    rating REAL NOT NULL,
+    games INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, game)
+);
+
+CREATE TABLE IF NOT EXISTS games (
+    game_id TEXT PRIMARY KEY,
+    game TEXT NOT NULL,
+    started_at TEXT NOT NULL DEFAULT ({_NOW}),
+    finished_at TEXT,
+    winner_team INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS game_rosters (
+    game_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    team INTEGER NOT NULL,
+    PRIMARY KEY (game_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS game_rosters_user_id_idx ON game_rosters (user_id);
+
+CREATE TABLE IF NOT EXISTS bet_results (
+    id INTEGER PRIMARY KEY,
+    game_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    team INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    payout INTEGER NOT NULL,
+    settled_at TEXT NOT NULL DEFAULT ({_NOW})
+);
+CREATE INDEX IF NOT EXISTS bet_results_user_id_idx ON bet_results (user_id);
+
+CREATE TABLE IF NOT EXISTS player_stats (
+    user_id TEXT PRIMARY KEY,
+    games_played INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    current_streak INTEGER NOT NULL DEFAULT 0,
+    best_streak INTEGER NOT NULL DEFAULT 0,
+    bets_placed INTEGER NOT NULL DEFAULT 0,
+    bets_won INTEGER NOT NULL DEFAULT 0,
+    bet_profit INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS ledger (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    delta INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    ref TEXT,
+    created_at TEXT NOT NULL DEFAULT ({_NOW})
+);
+CREATE INDEX IF NOT EXISTS ledger_user_id_idx ON ledger (user_id);
+CREATE INDEX IF NOT EXISTS ledger_created_at_idx ON ledger (created_at);
+
+CREATE TABLE IF NOT EXISTS ledger_archive (
+    user_id TEXT PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS complaints (
+    id INTEGER PRIMARY KEY,
+    guild_id TEXT,
+    author_id TEXT NOT NULL,
+    voice_channel_id TEXT,
+    body TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT ({_NOW})
+);
+CREATE INDEX IF NOT EXISTS complaints_author_id_idx ON complaints (author_id, id);
+CREATE INDEX IF NOT EXISTS complaints_guild_id_idx ON complaints (guild_id, id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS complaints_fts USING fts5(
+    body, content='complaints', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS complaints_fts_insert AFTER INSERT ON complaints BEGIN
+    INSERT INTO complaints_fts (rowid, body) VALUES (new.id, new.body);
+END;
+
+CREATE TABLE IF NOT EXISTS guild_settings (
+    guild_id TEXT PRIMARY KEY,
+    updated_at TEXT NOT NULL DEFAULT ({_NOW})
+);
+"""
+
+
+class _InsufficientFunds(Exception):
+    pass
+
+
+def _dict_row(cursor: sqlite3.Cursor, row: tuple) -> dict[str, Any]:
+    values = {}
+    for (name, *_), value in zip(cursor.description, row):
+        if name in _TIMESTAMP_COLUMNS and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        values[name] = value
+    return values
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # Транзакциями управляет писатель явно, поэтому автокоммит модуля sqlite3 выключен
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.row_factory = _dict_row
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def _busy(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def _reraise_busy(func: Callable[..., T]) -> Callable[..., T]:
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        try:
+            return func(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            if _busy(e):
+                raise StorageBusy(str(e)) from e
+            raise
+
+    return wrapper
+
+
+def _fts_term(term: str, phrase: bool) -> str:
+    words = _WORD_RE.findall(term)
+    if not words:
+        return ""
+    if phrase or len(words) > 1:
+        return '"' + " ".join(words) + '"'
+    word = words[0]
+    # Морфологии у unicode61 нет: окончание отбрасывается, остаток ищется по префиксу
+    if len(word) > 4:
+        return f'"{word[:max(4, len(word) - 2)]}"*'
+    return f'"{word}"'
+
+
+def fts_query(text: str) -> tuple[str, str]:
+    """Переводит запрос в стиле ``websearch_to_tsquery`` в выражения FTS5.
+
+    Возвращает искомое и исключаемое: ``NOT`` в FTS5 бинарный, поэтому
+    исключения проверяются отдельным условием.
+    """
+    groups: list[list[str]] = [[]]
+    excluded: list[str] = []
+    for match in _TERM_RE.finditer(text.lower()):
+        negated = bool(match.group(1))
+        phrase = match.group(2) is not None
+        term = match.group(2) if phrase else match.group(3)
+        if not phrase:
+            if term == "or":
+                groups.append([])
+                continue
+            if term.startswith("-") and len(term) > 1:
+                negated, term = True, term[1:]
+        expression = _fts_term(term, phrase)
+        if expression:
+            (excluded if negated else groups[-1]).append(expression)
+    included = " OR ".join(f"({' AND '.join(group)})" for group in groups if group)
+    return included, " OR ".join(excluded)
+
+
+class SQLiteStorage(Storage):
+    """Хранилище в файле SQLite для небольших установок без Postgres.
+
+    База работает в режиме WAL: читатели не ждут писателя. Все записи идут
+    через одну задачу-писателя и один поток с собственным соединением;
+    накопившиеся за время предыдущего коммита операции попадают в одну
+    транзакцию, каждая под своей точкой сохранения, так что ошибка одной
+    операции не откатывает соседние. Результат операции возвращается после
+    коммита, поэтому следующее чтение уже видит запись.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, *, batch_size: int = WRITE_BATCH_SIZE, readers: int = READER_THREADS) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self._writer_pool = ThreadPoolExecutor(1, thread_name_prefix="sqlite-writer")
+        self._reader_pool = ThreadPoolExecutor(readers, thread_name_prefix="sqlite-reader")
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        self._local = threading.local()
+        self._reader_conns: list[sqlite3.Connection] = []
+        self._queue: asyncio.Queue[Optional[tuple[Callable[[sqlite3.Connection], Any], asyncio.Future]]] = asyncio.Queue()
+        self._writer_task: Optional[asyncio.Task[None]] = None
+        self._ledger_existed = True
+        self.batches = 0
+        self.writes = 0
+
+    async def init(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._writer_pool, self._open_writer)
+        # Задача писателя принадлежит хранилищу, а не супервизору: супервизор
+        # гасит задачи раньше, чем бот перестает писать в базу
+        self._writer_task = loop.create_task(self._write_loop(), name="sqlite-writer")
+        await self._write(self._init_schema)
+        logger.info("База SQLite открыта: %s", self.path)
+
+    def _open_writer(self) -> None:
+        conn = _connect(self.path)
+        mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()["journal_mode"]
+        if mode != "wal":
+            logger.warning("SQLite не перешла в режим WAL (%s): читатели будут ждать писателя", mode)
+        # В режиме WAL NORMAL не теряет целостность, а коммит не ждет fsync
+        conn.execute("PRAGMA synchronous = NORMAL")
+        # Схема создается до запуска писателя: executescript коммитит открытую транзакцию
+        ledger_exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'ledger'").fetchone() is not None
+        conn.executescript(_SCHEMA)
+        self._writer_conn = conn
+        self._ledger_existed = ledger_exists
+
+    def _init_schema(self, conn: sqlite3.Connection) -> None:
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(guild_settings)")}
+        for column, kind in GUILD_SETTINGS_COLUMNS.items():
+            if column not in columns:
+                conn.execute(f"ALTER TABLE guild_settings ADD COLUMN {column} {kind}")
+        purchase_columns = {row["name"] for row in conn.execute("PRAGMA table_info(purchases)")}
+        if "fulfilled_at" not in purchase_columns:
+            conn.execute("ALTER TABLE purchases ADD COLUMN fulfilled_at TEXT")
+        if "refunded_at" not in purchase_columns:
+            conn.execute("ALTER TABLE purchases ADD COLUMN refunded_at TEXT")
+            # Покупки, сделанные до учета выдачи, считаются выданными
+            conn.execute("UPDATE purchases SET fulfilled_at = purchased_at WHERE fulfilled_at IS NULL")
+        # Индекс создается после переноса столбцов: в старой базе их еще нет при выполнении схемы
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS purchases_unfulfilled_idx ON purchases (purchased_at) "
+            "WHERE fulfilled_at IS NULL AND refunded_at IS NULL"
+        )
+        if conn.execute("SELECT 1 FROM shop_items LIMIT 1").fetchone() is None:
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO shop_items (key, name, price, type, duration_days, position)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (item["key"], item["name"], item["price"], item["type"], item.get("duration_days"), position)
+                    for position, item in enumerate(SHOP_ITEMS)
+                ],
+            )
+        if not self._ledger_existed:
+            conn.execute(
+                "INSERT INTO ledger (user_id, delta, reason) SELECT id, balance, ? FROM users WHERE balance <> 0",
+                (LEDGER_OPENING,),
+            )
+
+    async def close(self) -> None:
+        if self._writer_task is not None:
+            # Операции, уже стоящие в очереди, дописываются до закрытия
+            self._queue.put_nowait(None)
+            await self._writer_task
+            self._writer_task = None
+        self._reader_pool.shutdown(wait=True)
+        self._writer_pool.shutdown(wait=True)
+        for conn in self._reader_conns:
+            conn.close()
+        if self._writer_conn is not None:
+            self._writer_conn.close()
+            self._writer_conn = None
+
+    # --- писатель ---
+
+    async def _write(self, job: Callable[[sqlite3.Connection], T]) -> T:
+        if self._writer_task is None:
+            raise RuntimeError("Хранилище SQLite не открыто")
+        future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((job, future))
+        return await future
+
+    async def _write_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                outcomes = await loop.run_in_executor(self._writer_pool, self._commit, [job for job, _ in batch])
+            except Exception as e:
+                outcomes = [(False, e)] * len(batch)
+            self.batches += 1
+            self.writes += len(batch)
+            for (_, future), (ok, value) in zip(batch, outcomes):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+            if stop:
+                return
+
+    def _commit(self, jobs: Sequence[Callable[[sqlite3.Connection], Any]]) -> list[tuple[bool, Any]]:
+        conn = self._writer_conn
+        assert conn is not None
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            error: Exception = StorageBusy(str(e)) if _busy(e) else e
+            return [(False, error)] * len(jobs)
+        outcomes: list[tuple[bool, Any]] = []
+        for job in jobs:
+            conn.execute("SAVEPOINT job")
+            try:
+                value = job(conn)
+            except Exception as e:
+                conn.execute("ROLLBACK TO job")
+                conn.execute("RELEASE job")
+                outcomes.append((False, e))
+            else:
+                conn.execute("RELEASE job")
+                outcomes.append((True, value))
+        try:
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError as e:
+            conn.execute("ROLLBACK")
+            error = StorageBusy(str(e)) if _busy(e) else e
+            return [(False, error)] * len(jobs)
+        return outcomes
+
+    # --- читатели ---
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+            conn.execute("PRAGMA query_only = ON")
+            self._reader_conns.append(conn)
+        return conn
+
+    async def _read(self, job: Callable[[sqlite3.Connection], T]) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reader_pool, _reraise_busy(lambda: job(self._reader())))
+
+    async def _fetch(self, sql: str, *params: Any) -> list[dict[str, Any]]:
+        return await self._read(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def _fetchone(self, sql: str, *params: Any) -> Optional[dict[str, Any]]:
+        return await self._read(lambda conn: conn.execute(sql, params).fetchone())
+
+    # --- операции ---
+
+    @staticmethod
+    def _write_ledger(conn: sqlite3.Connection, entries: Sequence[LedgerEntry]) -> None:
+        conn.executemany("INSERT INTO ledger (user_id, delta, reason, ref) VALUES (?, ?, ?, ?)", entries)
+
+    @classmethod
+    def _credit_many(cls, conn: sqlite3.Connection, entries: Sequence[LedgerEntry]) -> None:
+        totals: dict[str, int] = {}
+        for user_id, delta, _, _ in entries:
+            totals[user_id] = totals.get(user_id, 0) + delta
+        conn.executemany(
+            """
+            INSERT INTO users (id, balance) VALUES (?, ?)
+            ON CONFLICT (id) DO UPDATE SET balance = balance + excluded.balance
+            """,
+            totals.items(),
+        )
+        cls._write_ledger(conn, entries)
+
+    @staticmethod
+    def _record_bet_results(
+        conn: sqlite3.Connection,
+        game_id: str,
+        bets: Sequence[Row],
+        bet_payouts: Sequence[int],
+        settled: bool,
+    ) -> None:
+        conn.executemany(
+            "INSERT INTO bet_results (game_id, user_id, team, amount, payout) VALUES (?, ?, ?, ?, ?)",
+            [
+                (game_id, bet["user_id"], int(bet["team"]), int(bet["amount"]), payout)
+                for bet, payout in zip(bets, bet_payouts)
+            ],
+        )
+        if not settled:
+            return
+        conn.executemany(
+            """
+            INSERT INTO player_stats (user_id, bets_placed, bets_won, bet_profit) VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                bets_placed = bets_placed + excluded.bets_placed,
+                bets_won = bets_won + excluded.bets_won,
+                bet_profit = bet_profit + excluded.bet_profit
+            """,
+            [(uid, *totals) for uid, totals in bet_totals(bets, bet_payouts).items()],
+        )
+
+    async def get_user_balance(self, uid: str) -> int:
+        balance = await self.fetch_user_balance(uid)
+        if balance is not None:
+            return balance
+        await self._write(lambda conn: conn.execute("INSERT OR IGNORE INTO users (id, balance) VALUES (?, 0)", (uid,)))
+        return 0
+
+    async def fetch_user_balance(self, uid: str) -> Optional[int]:
+        row = await self._fetchone("SELECT balance FROM users WHERE id = ?", uid)
+        return int(row["balance"]) if row is not None else None
+
+    async def set_user_balance(self, uid: str, balance: int, reason: str, ref: Optional[str]) -> bool:
+        def job(conn: sqlite3.Connection) -> bool:
+            row = conn.execute("SELECT balance FROM users WHERE id = ?", (uid,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("UPDATE users SET balance = ? WHERE id = ?", (balance, uid))
+            self._write_ledger(conn, [(uid, balance - int(row["balance"]), reason, ref)])
+            return True
+
+        return await self._write(job)
+
+    async def add_currency(self, uid: str, amount: int, reason: str, ref: Optional[str]) -> int:
+        def job(conn: sqlite3.Connection) -> int:
+            row = conn.execute(
+                """
+                INSERT INTO users (id, balance) VALUES (?, ?)
+                ON CONFLICT (id) DO UPDATE SET balance = balance + excluded.balance
+                RETURNING balance
+                """,
+                (uid, amount),
+            ).fetchone()
+            self._write_ledger(conn, [(uid, amount, reason, ref)])
+            return int(row["balance"])
+
+        return await self._write(job)
+
+    async def credit_many(self, entries: Sequence[LedgerEntry]) -> None:
+        await self._write(lambda conn: self._credit_many(conn, entries))
+
+    async def create_bet(self, uid: str, game_id: str, team: int, amount: int) -> None:
+        await self._write(
+            lambda conn: conn.execute(
+                "INSERT INTO bets (user_id, game_id, team, amount) VALUES (?, ?, ?, ?)",
+                (uid, game_id, team, amount),
+            )
+        )
+
+    async def place_bet(self, uid: str, game_id: str, team: int, amount: int) -> Optional[int]:
+        def job(conn: sqlite3.Connection) -> Optional[int]:
+            row = conn.execute(
+                "UPDATE users SET balance = balance - ? WHERE id = ? AND balance >= ? RETURNING balance",
+                (amount, uid, amount),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "INSERT INTO bets (user_id, game_id, team, amount) VALUES (?, ?, ?, ?)",
+                (uid, game_id, team, amount),
+            )
+            self._write_ledger(conn, [(uid, -amount, LEDGER_BET, game_id)])
+            return int(row["balance"])
+
+        return await self._write(job)
+
+    async def payout_bets(self, game_id: str, winning_team: int) -> Optional[dict[str, int]]:
+        def job(conn: sqlite3.Connection) -> Optional[dict[str, int]]:
+            bets = conn.execute("SELECT user_id, team, amount FROM bets WHERE game_id = ?", (game_id,)).fetchall()
+            if not bets:
+                return None
+            entries, payouts, bet_payouts = split_pot(bets, game_id, winning_team)
+            if not entries:
+                return {}
+            self._credit_many(conn, entries)
+            self._record_bet_results(conn, game_id, bets, bet_payouts, settled=True)
+            conn.execute("DELETE FROM bets WHERE game_id = ?", (game_id,))
+            return payouts
+
+        return await self._write(job)
+
+    async def refund_bets(self, game_id: str) -> int:
+        def job(conn: sqlite3.Connection) -> int:
+            bets = conn.execute(
+                "DELETE FROM bets WHERE game_id = ? RETURNING user_id, team, amount", (game_id,)
+            ).fetchall()
+            if bets:
+                self._credit_many(conn, [(bet["user_id"], int(bet["amount"]), LEDGER_REFUND, game_id) for bet in bets])
+                self._record_bet_results(conn, game_id, bets, [int(bet["amount"]) for bet in bets], settled=False)
+            return len(bets)
+
+        return await self._write(job)
+
+    async def record_game_start(self, game_id: str, game: str, roster: Sequence[tuple[str, int]]) -> None:
+        def job(conn: sqlite3.Connection) -> None:
+            conn.execute("INSERT OR IGNORE INTO games (game_id, game) VALUES (?, ?)", (game_id, game))
+            conn.executemany(
+                "INSERT OR IGNORE INTO game_rosters (game_id, user_id, team) VALUES (?, ?, ?)",
+                [(game_id, uid, team) for uid, team in roster],
+            )
+
+        await self._write(job)
+
+    async def record_game_result(
+        self,
+        game_id: str,
+        winning_team: Optional[int],
+        game: str,
+        rating_changes: dict[str, float],
+        default_rating: float,
+    ) -> bool:
+        def job(conn: sqlite3.Connection) -> bool:
+            finished = conn.execute(
+                f"""
+                UPDATE games SET finished_at = {_NOW}, winner_team = ?
+                WHERE game_id = ? AND finished_at IS NULL
+                RETURNING game_id
+                """,
+                (winning_team, game_id),
+            ).fetchone()
+            if finished is None:
+                return False
+            if winning_team is None:
+                return True
+            # WHERE true отделяет SELECT от ON CONFLICT для разборщика SQLite
+            conn.execute(
+                """
+                INSERT INTO player_stats (user_id, games_played, wins, current_streak, best_streak)
+                SELECT user_id, 1, team = :team, CASE WHEN team = :team THEN 1 ELSE -1 END, team = :team
+                FROM game_rosters WHERE game_id = :game_id AND true
+                ON CONFLICT (user_id) DO UPDATE SET
+                    games_played = games_played + 1,
+                    wins = wins + excluded.wins,
+                    current_streak = CASE
+                        WHEN excluded.wins = 1 THEN max(current_streak, 0) + 1
+                        ELSE min(current_streak, 0) - 1
+                    END,
+                    best_streak = max(
+                        best_streak,
+                        CASE WHEN excluded.wins = 1 THEN max(current_streak, 0) + 1 ELSE 0 END
+                    )
+                """,
+                {"team": winning_team, "game_id": game_id},
+            )
+            conn.executemany(
+                """
+                INSERT INTO player_ratings (user_id, game, rating, games) VALUES (?, ?, ?, 1)
+                ON CONFLICT (user_id, game) DO UPDATE
+                SET rating = rating + (excluded.rating - ?), games = games + 1
+                """,
+                [(uid, game, default_rating + delta, default_rating) for uid, delta in rating_changes.items()],
+            )
+            return True
+
+        return await self._write(job)
+
+    async def get_player_stats(self, uid: str) -> Optional[Row]:
+        return await self._fetchone("SELECT * FROM player_stats WHERE user_id = ?", uid)
+
+    async def get_bets_for_game(self, game_id: str) -> list[Row]:
+        return await self._fetch("SELECT user_id, team, amount FROM bets WHERE game_id = ?", game_id)
+
+    async def clear_bets_for_game(self, game_id: str) -> None:
+        await self._write(lambda conn: conn.execute("DELETE FROM bets WHERE game_id = ?", (game_id,)))
+
+    async def record_purchase(self, uid: str, item_key: str, item_name: str, price: int) -> None:
+        await self._write(
+            lambda conn: conn.execute(
+                "INSERT INTO purchases (user_id, item_key, item_name, price) VALUES (?, ?, ?, ?)",
+                (uid, item_key, item_name, price),
+            )
+        )
+
+    async def get_shop_items(self) -> list[Row]:
+        return await self._fetch(
+            "SELECT key, name, price, type, duration_days FROM shop_items WHERE enabled ORDER BY position, key"
+        )
+
+    async def set_shop_item_price(self, item_key: str, price: int) -> bool:
+        return await self._write(
+            lambda conn: conn.execute("UPDATE shop_items SET price = ? WHERE key = ?", (price, item_key)).rowcount > 0
+        )
+
+    async def purchase_item(
+        self,
+        uid: str,
+        item_key: str,
+        item_name: str,
+        price: int,
+        interaction_id: str,
+    ) -> PurchaseResult:
+        def job(conn: sqlite3.Connection) -> PurchaseResult:
+            row = conn.execute(
+                """
+                INSERT INTO purchases (user_id, item_key, item_name, price, interaction_id) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (interaction_id) DO NOTHING
+                RETURNING id
+                """,
+                (uid, item_key, item_name, price, interaction_id),
+            ).fetchone()
+            if row is None:
+                row = conn.execute(
+                    """
+                    SELECT p.id, p.fulfilled_at IS NOT NULL AS fulfilled, u.balance
+                    FROM purchases p LEFT JOIN users u ON u.id = p.user_id
+                    WHERE p.interaction_id = ?
+                    """,
+                    (interaction_id,),
+                ).fetchone()
+                return PurchaseResult(PURCHASE_DUPLICATE, row["balance"], row["id"], bool(row["fulfilled"]))
+            balance = conn.execute(
+                "UPDATE users SET balance = balance - ? WHERE id = ? AND balance >= ? RETURNING balance",
+                (price, uid, price),
+            ).fetchone()
+            if balance is None:
+                # Точка сохранения операции откатывает и запись покупки
+                raise _InsufficientFunds
+            self._write_ledger(conn, [(uid, -price, LEDGER_PURCHASE, f"{item_key}:{row['id']}")])
+            return PurchaseResult(PURCHASE_OK, int(balance["balance"]), row["id"])
+
+        try:
+            return await self._write(job)
+        except _InsufficientFunds:
+            return PurchaseResult(PURCHASE_INSUFFICIENT)
+
+    async def mark_purchase_fulfilled(self, purchase_id: int) -> bool:
+        return await self._write(
+            lambda conn: conn.execute(
+                f"UPDATE purchases SET fulfilled_at = COALESCE(fulfilled_at, {_NOW}) WHERE id = ? AND refunded_at IS NULL",
+                (purchase_id,),
+            ).rowcount
+            > 0
+        )
+
+    async def refund_unfulfilled_purchases(self, older_than: float) -> list[Row]:
+        def job(conn: sqlite3.Connection) -> list[Row]:
+            rows = conn.execute(
+                f"""
+                UPDATE purchases SET refunded_at = {_NOW}
+                WHERE fulfilled_at IS NULL AND refunded_at IS NULL AND interaction_id IS NOT NULL
+                  AND purchased_at < strftime('%Y-%m-%dT%H:%M:%fZ', 'now', ?)
+                RETURNING id, user_id, item_key, item_name, price
+                """,
+                (f"-{older_than} seconds",),
+            ).fetchall()
+            if rows:
+                self._credit_many(
+                    conn,
+                    [
+                        (row["user_id"], row["price"], LEDGER_PURCHASE_REFUND, f"{row['item_key']}:{row['id']}")
+                        for row in rows
+                    ],
+                )
+            return [dict(row) for row in rows]
+
+        return await self._write(job)
+
+    async def get_player_ratings(self, game: str, uids: Sequence[str]) -> dict[str, float]:
+        if not uids:
+            return {}
+        rows = await self._fetch(
+            f"SELECT user_id, rating FROM player_ratings WHERE game = ? AND user_id IN ({', '.join('?' * len(uids))})",
+            game,
+            *uids,
+        )
+        return {row["user_id"]: float(row["rating"]) for row in rows}
+
+    async def get_guild_settings(self, guild_id: Optional[str]) -> list[Row]:
+        if guild_id is None:
+            return await self._fetch("SELECT * FROM guild_settings")
+        return await self._fetch("SELECT * FROM guild_settings WHERE guild_id = ?", guild_id)
+
+    async def set_guild_setting(self, guild_id: str, column: str, value: Optional[int | str]) -> None:
+        # Имя столбца проверено по GUILD_SETTINGS_COLUMNS в db.py
+        await self._write(
+            lambda conn: conn.execute(
+                f"""
+                INSERT INTO guild_settings (guild_id, {column}) VALUES (?, ?)
+                ON CONFLICT (guild_id) DO UPDATE SET {column} = excluded.{column}, updated_at = {_NOW}
+                """,
+                (guild_id, value),
+            )
+        )
+
+    async def create_complaint(
+        self,
+        guild_id: Optional[str],
+        author_id: str,
+        voice_channel_id: Optional[str],
+        body: str,
+    ) -> int:
+        return await self._write(
+            lambda conn: conn.execute(
+                "INSERT INTO complaints (guild_id, author_id, voice_channel_id, body) VALUES (?, ?, ?, ?) RETURNING id",
+                (guild_id, author_id, voice_channel_id, body),
+            ).fetchone()["id"]
+        )
+
+    async def search_complaints(
+        self,
+        guild_id: str,
+        text: Optional[str],
+        author_id: Optional[str],
+        before_id: Optional[int],
+        limit: int,
+    ) -> list[Row]:
+        conditions: list[str] = []
+        params: list[Any] = []
+        snippet = f"substr(body, 1, {COMPLAINT_SNIPPET_CHARS})"
+        included, excluded = fts_query(text) if text else ("", "")
+        if included:
+            snippet = (
+                "(SELECT snippet(complaints_fts, 0, '**', '**', '…', 30) FROM complaints_fts "
+                "WHERE complaints_fts MATCH ? AND rowid = complaints.id)"
+            )
+            params.append(included)
+            conditions.append("id IN (SELECT rowid FROM complaints_fts WHERE complaints_fts MATCH ?)")
+            params.append(included)
+        if excluded:
+            conditions.append("id NOT IN (SELECT rowid FROM complaints_fts WHERE complaints_fts MATCH ?)")
+            params.append(excluded)
+        # При поиске по тексту индекс гильдии не нужен: с ним план сортирует все
+        # совпадения и строит фрагмент для каждого. Унарный плюс исключает его
+        # из выбора, порядок по id берется из первичного ключа
+        conditions.append("+guild_id = ?" if included else "guild_id = ?")
+        params.append(guild_id)
+        if author_id:
+            conditions.append("author_id = ?")
+            params.append(author_id)
+        if before_id:
+            conditions.append("id < ?")
+            params.append(before_id)
+        params.append(limit)
+        return await self._fetch(
+            f"""
+            SELECT id, author_id, voice_channel_id, created_at, {snippet} AS snippet
+            FROM complaints WHERE {' AND '.join(conditions)}
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            *params,
+        )
+
+    async def export_table_csv(self, table: str, output: IO[bytes]) -> None:
+        columns = EXPORT_COLUMNS[table]
+
+        def job(conn: sqlite3.Connection) -> None:
+            # Курсор читается порциями: таблица не материализуется в памяти
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id")
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            while rows := cursor.fetchmany(EXPORT_FETCH_SIZE):
+                writer.writerows(rows)
+                output.write(buffer.getvalue().encode("utf-8"))
+                buffer.seek(0)
+                buffer.truncate()
+            output.write(buffer.getvalue().encode("utf-8"))
+
+        await self._read(job)
+
+    async def import_balances(self, records: Iterable[tuple[int, str, int]], mode: str, ref: Optional[str]) -> int:
+        # Поток строк сворачивается в суммы по пользователям еще до очереди писателя
+        amounts: dict[str, int] = {}
+        for _, uid, amount in records:
+            amounts[uid] = amounts.get(uid, 0) + amount if mode == IMPORT_MODE_ADD else amount
+
+        def job(conn: sqlite3.Connection) -> int:
+            entries: list[LedgerEntry] = []
+            for uid, amount in amounts.items():
+                row = conn.execute("SELECT balance FROM users WHERE id = ?", (uid,)).fetchone()
+                previous = int(row["balance"]) if row is not None else 0
+                delta = amount if mode == IMPORT_MODE_ADD else amount - previous
+                if delta:
+                    entries.append((uid, delta, LEDGER_ADJUST, ref))
+            self._credit_many(conn, entries)
+            conn.executemany("INSERT OR IGNORE INTO users (id, balance) VALUES (?, 0)", [(uid,) for uid in amounts])
+            return len(amounts)
+
+        return await self._write(job)
+
+    async def reconcile_ledger(self, batch_size: int) -> AsyncIterator[Row]:
+        # Отдельное соединение держит один снимок WAL на все порции
+        loop = asyncio.get_running_loop()
+        conn = await loop.run_in_executor(self._reader_pool, _connect, self.path)
+        try:
+            cursor = await loop.run_in_executor(
+                self._reader_pool,
+                _reraise_busy(
+                    lambda: conn.execute("BEGIN").execute(
+                        """
+                        SELECT u.id AS user_id,
+                               u.balance,
+                               COALESCE(a.total, 0) + COALESCE(l.total, 0) AS ledger_total
+                        FROM users u
+                        LEFT JOIN ledger_archive a ON a.user_id = u.id
+                        LEFT JOIN (
+                            SELECT user_id, SUM(delta) AS total FROM ledger GROUP BY user_id
+                        ) l ON l.user_id = u.id
+                        WHERE u.balance <> COALESCE(a.total, 0) + COALESCE(l.total, 0)
+                        """
+                    )
+                ),
+            )
+            while rows := await loop.run_in_executor(self._reader_pool, cursor.fetchmany, batch_size):
+                for row in rows:
+                    yield row
+        finally:
+            await loop.run_in_executor(self._reader_pool, conn.close)
+
+    async def detach_ledger_partitions(self, keep_months: int) -> list[str]:
+        # Разделов нет: старые записи сворачиваются в ledger_archive и удаляются
+        cutoff = month_start(datetime.now(timezone.utc).date(), -keep_months).isoformat()
+
+        def job(conn: sqlite3.Connection) -> list[str]:
+            months = conn.execute(
+                "SELECT DISTINCT substr(created_at, 1, 7) AS month FROM ledger WHERE created_at < ? ORDER BY month",
+                (cutoff,),
+            ).fetchall()
+            if not months:
+                return []
+            conn.execute(
+                """
+                INSERT INTO ledger_archive (user_id, total)
+                SELECT user_id, SUM(delta) FROM ledger WHERE created_at < ? GROUP BY user_id
+                ON CONFLICT (user_id) DO UPDATE SET total = total + excluded.total
+                """,
+                (cutoff,),
+            )
+            conn.execute("DELETE FROM ledger WHERE created_at < ?", (cutoff,))
+            return [f"ledger_y{row['month'][:4]}m{row['month'][5:]}" for row in months]
+
+        names = await self._write(job)
+        for name in names:
+            logger.info("Записи журнала %s перенесены в архив", name)
+        return names
+
+    def report(self) -> list[str]:
+        average = self.writes / self.batches if self.batches else 0.0
+        return [f"SQLite: записей {self.writes}, коммитов {self.batches} (в среднем {average:.1f} на коммит)"]
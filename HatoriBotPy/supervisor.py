@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Coroutine, Dict, Optional, TypeVar
+
+logger = logging.getLogger("HatoriBotPy.supervisor")
+
+SHUTDOWN_TIMEOUT = 10.0
+
+T = TypeVar("T")
+
+
+@dataclass(slots=True)
+class CategoryStats:
+    started: int = 0
+    finished: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    running: int = 0
+    waiting: int = 0
+    limit: Optional[int] = None
+
+
+class TaskSupervisor:
+    """Владелец всех фоновых задач бота.
+
+    Каждая задача получает имя и категорию, на нее хранится сильная ссылка,
+    а ошибки логируются и считаются. Для категории можно задать предел
+    одновременно выполняемых задач: остальные ждут своей очереди. При
+    остановке задачи с ``graceful=True`` дорабатывают, прочие отменяются.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[asyncio.Task[Any], tuple[str, bool, Coroutine[Any, Any, Any]]] = {}
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self.stats: Dict[str, CategoryStats] = defaultdict(CategoryStats)
+        self.closing = False
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def set_limit(self, category: str, limit: int) -> None:
+        self._limits[category] = asyncio.Semaphore(limit)
+        self.stats[category].limit = limit
+
+    def spawn(
+        self,
+        coro: Coroutine[Any, Any, T],
+        *,
+        name: str,
+        category: str,
+        graceful: bool = False,
+    ) -> asyncio.Task[T]:
+        if self.closing:
+            coro.close()
+            raise RuntimeError(f"Бот останавливается, задача {name} не запущена")
+        stats = self.stats[category]
+        stats.started += 1
+        task = asyncio.get_running_loop().create_task(self._run(coro, category), name=name)
+        self._tasks[task] = (category, graceful, coro)
+        task.add_done_callback(self._on_done)
+        return task
+
+    async def _run(self, coro: Coroutine[Any, Any, T], category: str) -> T:
+        stats = self.stats[category]
+        semaphore = self._limits.get(category)
+        if semaphore is not None:
+            stats.waiting += 1
+            try:
+                await semaphore.acquire()
+            finally:
+                stats.waiting -= 1
+        stats.running += 1
+        try:
+            return await coro
+        finally:
+            stats.running -= 1
+            if semaphore is not None:
+                semaphore.release()
+
+    def _on_done(self, task: asyncio.Task[Any]) -> None:
+        category, _, coro = self._tasks.pop(task)
+        # Задача, отмененная до начала, не успела запустить свою корутину
+        coro.close()
+        stats = self.stats[category]
+        if task.cancelled():
+            stats.cancelled += 1
+            return
+        error = task.exception()
+        if error is None:
+            stats.finished += 1
+            return
+        stats.failed += 1
+        logger.error(
+            "Фоновая задача %s (%s) завершилась ошибкой",
+            task.get_name(),
+            category,
+            exc_info=(type(error), error, error.__traceback__),
+        )
+
+    async def shutdown(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        """Останавливает прием задач, дожидается бережных и отменяет остальные.
+
+        Общий срок ``timeout`` делится пополам: половина на доработку
+        бережных задач, остаток на завершение отмененных.
+        """
+        self.closing = True
+        if not self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        graceful = [task for task, (_, keep, _) in self._tasks.items() if keep]
+        if graceful:
+            logger.info("Ожидание %d фоновых задач перед остановкой", len(graceful))
+            await asyncio.wait(graceful, timeout=timeout / 2)
+
+        pending = list(self._tasks)
+        for task in pending:
+            task.cancel()
+        if pending:
+            _, still_running = await asyncio.wait(pending, timeout=max(0.0, deadline - loop.time()))
+            for task in still_running:
+                logger.warning("Фоновая задача %s не завершилась к сроку остановки", task.get_name())
+        logger.info("Фоновые задачи остановлены: %d", len(pending))
+
+    def report(self) -> list[str]:
+        lines = []
+        for category, stats in sorted(self.stats.items()):
+            limit = f"/{stats.limit}" if stats.limit else ""
+            lines.append(
+                f"{category:<24} активно {stats.running}{limit}, ждут {stats.waiting}, "
+                f"запущено {stats.started}, ошибок {stats.failed}, отменено {stats.cancelled}"
+            )
+        return lines
+
+
+supervisor = TaskSupervisor()
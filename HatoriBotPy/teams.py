@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import bisect
+import itertools
+from typing import Sequence
+
+DEFAULT_RATING = 1000.0
+ELO_K = 32.0
+
+# До этого размера лобби перебираются все разбиения, до следующего —
+# используется meet-in-the-middle, для больших лобби — эвристика
+EXACT_LIMIT = 12
+MEET_IN_THE_MIDDLE_LIMIT = 24
+MAX_SWAP_PASSES = 50
+
+Split = tuple[list[int], list[int]]
+
+
+def balance_teams(ratings: Sequence[float]) -> Split:
+    """Делит игроков на две команды с минимальной разницей суммарного рейтинга.
+
+    Возвращает индексы игроков первой и второй команды. Размеры команд
+    отличаются не более чем на одного игрока.
+    """
+    n = len(ratings)
+    if n < 2:
+        return list(range(n)), []
+    if n <= EXACT_LIMIT:
+        return _exact_split(ratings)
+    if n <= MEET_IN_THE_MIDDLE_LIMIT:
+        return _meet_in_the_middle_split(ratings)
+    return _local_search_split(ratings)
+
+
+def team_difference(ratings: Sequence[float], split: Split) -> float:
+    team_one, team_two = split
+    return abs(sum(ratings[i] for i in team_one) - sum(ratings[i] for i in team_two))
+
+
+def _complement(n: int, team: Sequence[int]) -> list[int]:
+    chosen = set(team)
+    return [i for i in range(n) if i not in chosen]
+
+
+def _exact_split(ratings: Sequence[float]) -> Split:
+    n = len(ratings)
+    size = n // 2
+    total = sum(ratings)
+    # При четном числе игроков первый игрок фиксируется в команде,
+    # чтобы не перебирать зеркальные разбиения
+    if n % 2 == 0:
+        candidates = ((0, *rest) for rest in itertools.combinations(range(1, n), size - 1))
+    else:
+        candidates = itertools.combinations(range(n), size)
+
+    best: tuple[int, ...] = ()
+    best_diff = float("inf")
+    for team in candidates:
+        diff = abs(total - 2 * sum(ratings[i] for i in team))
+        if diff < best_diff:
+            best, best_diff = team, diff
+            if diff == 0:
+                break
+    return list(best), _complement(n, best)
+
+
+def _subset_sums(ratings: Sequence[float], offset: int) -> list[list[tuple[float, int]]]:
+    by_size: list[list[tuple[float, int]]] = [[] for _ in range(len(ratings) + 1)]
+    by_size[0].append((0.0, 0))
+    for index, rating in enumerate(ratings):
+        bit = 1 << (offset + index)
+        for size in range(index, -1, -1):
+            by_size[size + 1].extend((total + rating, mask | bit) for total, mask in by_size[size])
+    return by_size
+
+
+def _meet_in_the_middle_split(ratings: Sequence[float]) -> Split:
+    n = len(ratings)
+    size = n // 2
+    half = n // 2
+    target = sum(ratings) / 2
+
+    left = _subset_sums(ratings[:half], 0)
+    right = _subset_sums(ratings[half:], half)
+    for bucket in right:
+        bucket.sort()
+    right_totals = [[total for total, _ in bucket] for bucket in right]
+
+    best_mask = 0
+    best_diff = float("inf")
+    for left_size, bucket in enumerate(left):
+        right_size = size - left_size
+        if right_size < 0 or right_size >= len(right) or not right[right_size]:
+            continue
+        totals = right_totals[right_size]
+        masks = right[right_size]
+        for left_total, left_mask in bucket:
+            wanted = target - left_total
+            pos = bisect.bisect_left(totals, wanted)
+            for candidate in (pos - 1, pos):
+                if 0 <= candidate < len(totals):
+                    diff = abs(wanted - totals[candidate])
+                    if diff < best_diff:
+                        best_diff = diff
+                        best_mask = left_mask | masks[candidate][1]
+        if best_diff == 0:
+            break
+
+    team_one = [i for i in range(n) if best_mask >> i & 1]
+    return team_one, _complement(n, team_one)
+
+
+def _local_search_split(ratings: Sequence[float]) -> Split:
+    n = len(ratings)
+    size = n // 2
+    order = sorted(range(n), key=lambda i: ratings[i], reverse=True)
+
+    # Жадное начальное разбиение: сильнейший из оставшихся уходит в более
+    # слабую команду, пока в ней есть место
+    team_one: list[int] = []
+    team_two: list[int] = []
+    sum_one = sum_two = 0.0
+    for i in order:
+        if len(team_one) < size and (sum_one <= sum_two or len(team_two) >= n - size):
+            team_one.append(i)
+            sum_one += ratings[i]
+        else:
+            team_two.append(i)
+            sum_two += ratings[i]
+
+    # Улучшение обменами: для каждого игрока первой команды ищем в
+    # отсортированной второй команде напарника, лучше всего гасящего разницу
+    for _ in range(MAX_SWAP_PASSES):
+        diff = sum_one - sum_two
+        if diff == 0:
+            break
+        team_two.sort(key=lambda i: ratings[i])
+        two_ratings = [ratings[i] for i in team_two]
+        best_gain = 0.0
+        best_swap: tuple[int, int] | None = None
+        for pos_one, i in enumerate(team_one):
+            wanted = ratings[i] - diff / 2
+            pos = bisect.bisect_left(two_ratings, wanted)
+            for pos_two in (pos - 1, pos):
+                if 0 <= pos_two < len(two_ratings):
+                    new_diff = abs(diff - 2 * (ratings[i] - two_ratings[pos_two]))
+                    gain = abs(diff) - new_diff
+                    if gain > best_gain:
+                        best_gain = gain
+                        best_swap = (pos_one, pos_two)
+        if best_swap is None:
+            break
+        pos_one, pos_two = best_swap
+        i, j = team_one[pos_one], team_two[pos_two]
+        team_one[pos_one], team_two[pos_two] = j, i
+        sum_one += ratings[j] - ratings[i]
+        sum_two += ratings[i] - ratings[j]
+
+    return sorted(team_one), sorted(team_two)
+
+
+def rating_delta(team_one: Sequence[float], team_two: Sequence[float], winner: int) -> float:
+    """Изменение рейтинга каждого игрока первой команды по формуле Эло.
+
+    Игроки второй команды получают то же изменение с обратным знаком.
+    """
+    if not team_one or not team_two:
+        return 0.0
+    average_one = sum(team_one) / len(team_one)
+    average_two = sum(team_two) / len(team_two)
+    expected_one = 1.0 / (1.0 + 10 ** ((average_two - average_one) / 400.0))
+    score_one = 1.0 if winner == 1 else 0.0
+    return ELO_K * (score_one - expected_one)
@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import contextvars
+import functools
+import logging
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+import aiohttp
+
+from .runtime import json_dumps
+
+logger = logging.getLogger("HatoriBotPy.tracing")
+
+TRACE_EXPORT_OFF = "off"
+TRACE_EXPORT_FILE = "file"
+TRACE_EXPORT_OTLP = "otlp"
+
+EXPORT_BATCH_SIZE = 256
+EXPORT_INTERVAL = 5.0
+MAX_STATEMENT_LENGTH = 120
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    sampled = True
+
+    def __init__(self, name: str, trace_id: int, parent_id: Optional[int], attributes: Dict[str, Any]) -> None:
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = type(error).__name__
+        exporter = _exporter
+        if exporter is not None:
+            exporter.submit(self)
+
+
+class _UnsampledSpan:
+    """Заглушка для трасс, не попавших в выборку: дочерние спаны тоже не пишутся."""
+
+    __slots__ = ()
+
+    sampled = False
+
+    def set(self, key: str, value: Any) -> None:
+        return
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        return
+
+
+UNSAMPLED = _UnsampledSpan()
+AnySpan = Any  # Span | _UnsampledSpan
+
+_current: contextvars.ContextVar[Optional[AnySpan]] = contextvars.ContextVar("hatori_span", default=None)
+_sample_rate = 0.0
+_exporter: Optional["_BatchExporter"] = None
+
+
+def current_span() -> Optional[AnySpan]:
+    return _current.get()
+
+
+def start_span(name: str, parent: Optional[AnySpan] = None, *, root: bool = False, **attributes: Any) -> AnySpan:
+    """Открывает спан; его нужно закрыть через ``end()``.
+
+    Родителем по умолчанию служит текущий спан задачи. Решение о выборке
+    принимается один раз для корня и наследуется всеми потомками.
+    """
+    if parent is None and not root:
+        parent = _current.get()
+    if parent is None:
+        if _exporter is None or random.random() >= _sample_rate:
+            return UNSAMPLED
+        return Span(name, random.getrandbits(128), None, attributes)
+    if not parent.sampled:
+        return UNSAMPLED
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+@contextmanager
+def span(name: str, parent: Optional[AnySpan] = None, **attributes: Any) -> Iterator[AnySpan]:
+    current = start_span(name, parent, **attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+
+def trace_task(name: str, **attributes: Any) -> AnySpan:
+    """Открывает спан на все оставшееся время текущей задачи.
+
+    Используется там, где нельзя обернуть обработчик целиком, например в
+    ``interaction_check`` дерева команд: спан закрывается вместе с задачей.
+    """
+    task = asyncio.current_task()
+    current = start_span(name, **attributes)
+    if not current.sampled or task is None:
+        return current
+    _current.set(current)
+
+    def _finish(done: asyncio.Task[Any]) -> None:
+        current.end(None if done.cancelled() else done.exception())
+
+    task.add_done_callback(_finish)
+    return current
+
+
+@contextmanager
+def use_span(current: Optional[AnySpan]) -> Iterator[None]:
+    """Делает спан текущим, не закрывая его при выходе."""
+    token = _current.set(current)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def traced(name: Optional[str] = None) -> Callable[[F], F]:
+    def decorator(func: F) -> F:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(span_name):
+                return await func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def record_query(query: Any) -> None:
+    """Колбэк ``add_query_logger`` asyncpg: спан строится задним числом по ``elapsed``.
+
+    asyncpg вызывает колбэк через ``call_soon`` с контекстом вызвавшей задачи,
+    поэтому родителем становится спан, из которого был сделан запрос.
+    """
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return
+    statement = " ".join(query.query.split())[:MAX_STATEMENT_LENGTH]
+    child = Span("db.query", parent.trace_id, parent.span_id, {"db.statement": statement})
+    child.start_ns = time.time_ns() - int(query.elapsed * 1e9)
+    child.end(query.exception)
+
+
+async def _on_request_start(_: aiohttp.ClientSession, ctx: Any, params: aiohttp.TraceRequestStartParams) -> None:
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        ctx.span = None
+        return
+    ctx.span = start_span("discord.http", parent, method=params.method, path=params.url.path)
+
+
+async def _on_request_end(_: aiohttp.ClientSession, ctx: Any, params: aiohttp.TraceRequestEndParams) -> None:
+    if getattr(ctx, "span", None) is not None:
+        ctx.span.set("status", params.response.status)
+        ctx.span.end()
+
+
+async def _on_request_exception(_: aiohttp.ClientSession, ctx: Any, params: aiohttp.TraceRequestExceptionParams) -> None:
+    if getattr(ctx, "span", None) is not None:
+        ctx.span.end(params.exception)
+
+
+def http_trace_config() -> aiohttp.TraceConfig:
+    """Трассировка REST-запросов discord.py (параметр ``http_trace`` клиента)."""
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(_on_request_start)
+    config.on_request_end.append(_on_request_end)
+    config.on_request_exception.append(_on_request_exception)
+    return config
+
+
+class _BatchExporter:
+    """Копит закрытые спаны и выгружает их пачками из фонового потока."""
+
+    def __init__(self, mode: str, path: str, url: str) -> None:
+        self.mode = mode
+        self.path = Path(path)
+        self.url = url
+        self._queue: queue.SimpleQueue[Optional[Span]] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="TraceExporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Span) -> None:
+        self._queue.put(item)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=EXPORT_INTERVAL)
+
+    def _run(self) -> None:
+        batch: list[Span] = []
+        deadline = time.monotonic() + EXPORT_INTERVAL
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = ...
+            if isinstance(item, Span):
+                batch.append(item)
+                if len(batch) < EXPORT_BATCH_SIZE:
+                    continue
+            if batch:
+                try:
+                    self._export(batch)
+                except Exception:
+                    logger.exception("Не удалось выгрузить %d спанов", len(batch))
+                batch = []
+            if item is None:
+                return
+            deadline = time.monotonic() + EXPORT_INTERVAL
+
+    def _export(self, batch: list[Span]) -> None:
+        if self.mode == TRACE_EXPORT_OTLP:
+            body = json_dumps(_to_otlp(batch)).encode()
+            request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(request, timeout=10):
+                pass
+            return
+        # Компактная строка на спан: [trace, span, parent, имя, начало, длительность, атрибуты, ошибка]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as fp:
+            for item in batch:
+                row = [
+                    f"{item.trace_id:032x}",
+                    f"{item.span_id:016x}",
+                    f"{item.parent_id:016x}" if item.parent_id else None,
+                    item.name,
+                    item.start_ns,
+                    item.end_ns - item.start_ns,
+                    item.attributes or None,
+                    item.error,
+                ]
+                fp.write(json_dumps(row))
+                fp.write("\n")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _to_otlp(batch: list[Span]) -> Dict[str, Any]:
+    spans = []
+    for item in batch:
+        entry: Dict[str, Any] = {
+            "traceId": f"{item.trace_id:032x}",
+            "spanId": f"{item.span_id:016x}",
+            "name": item.name,
+            "kind": 1,
+            "startTimeUnixNano": str(item.start_ns),
+            "endTimeUnixNano": str(item.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in item.attributes.items()],
+        }
+        if item.parent_id:
+            entry["parentSpanId"] = f"{item.parent_id:016x}"
+        if item.error:
+            entry["status"] = {"code": 2, "message": item.error}
+        spans.append(entry)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "hatoribot"}}]},
+                "scopeSpans": [{"scope": {"name": "HatoriBotPy"}, "spans": spans}],
+            }
+        ]
+    }
+
+
+def tracing_enabled() -> bool:
+    return _exporter is not None
+
+
+def setup_tracing(mode: str, sample_rate: float, path: str, url: str) -> None:
+    """Включает трассировку. При ``mode=off`` все спаны — пустые заглушки."""
+    global _exporter, _sample_rate
+    if mode == TRACE_EXPORT_OFF or sample_rate <= 0 or _exporter is not None:
+        return
+    _sample_rate = min(1.0, sample_rate)
+    _exporter = _BatchExporter(mode, path, url)
+    atexit.register(shutdown_tracing)
+    logger.info("Трассировка включена: %s, доля трасс %.3f", mode, _sample_rate)
+
+
+def shutdown_tracing() -> None:
+    global _exporter
+    exporter, _exporter = _exporter, None
+    if exporter is not None:
+        exporter.close()
@@ -12,8 +12,12 @@ def _normalize(name: str | None) -> str:
     return (name or "").strip()
 
 
+def game_key(game: str | None) -> str:
+    return _normalize(game).lower()
+
+
 def get_team_names(game: str | None) -> list[str]:
-    return _TEAM_NAME_MAP.get(_normalize(game).lower(), ["Команда 1", "Команда 2"])
+    return _TEAM_NAME_MAP.get(game_key(game), ["Команда 1", "Команда 2"])
 
 
 def format_currency(amount: int) -> str:
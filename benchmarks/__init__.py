@@ -0,0 +1,3 @@
+"""
+Benchmarks for HatoriBotPy.
+"""
\ No newline at end of file
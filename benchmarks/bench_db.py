@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+import asyncpg
+
+from HatoriBotPy import db
+from HatoriBotPy.storage.postgres import POOL_MAX_SIZE, POOL_MIN_SIZE, PostgresStorage
+
+CONCURRENCY = (1, 8, 32)
+OPS_PER_LEVEL = 2000
+WARMUP_OPS = 100
+DEFAULT_THRESHOLD = 0.2
+RESULTS_DIR = Path("data") / "benchmarks"
+
+USERS = 50_000
+GAMES = 5_000
+BETS_PER_GAME = 20
+PURCHASES = 100_000
+LEDGER_PER_USER = 10
+SHOP_ITEMS = (("vip_7", "VIP на 7 дней", 500), ("color", "Цветная роль", 300), ("badge", "Значок", 150))
+
+# Таблицы, которые сид очищает перед заполнением
+SEEDED_TABLES = ("users", "bets", "purchases", "ledger", "ledger_archive")
+
+
+@dataclass
+class Workload:
+    name: str
+    run: Callable[[int], Awaitable[Any]]
+    # Подготовка данных для уровня, вне замера
+    prepare: Optional[Callable[[int, int], Awaitable[None]]] = None
+
+
+def _uid(index: int) -> str:
+    return str(100_000_000_000_000_000 + index)
+
+
+def _game_id(index: int) -> str:
+    return f"bench-{index}"
+
+
+async def seed(pool: asyncpg.Pool, rng: random.Random) -> None:
+    """Заполняет базу объемами, близкими к живому серверу."""
+    await db.init_db()
+    async with pool.acquire() as conn:
+        await conn.execute(f"TRUNCATE {', '.join(SEEDED_TABLES)}")
+        balances = [(_uid(i), rng.randint(0, 20_000)) for i in range(USERS)]
+        await conn.copy_records_to_table("users", records=balances, columns=("id", "balance"))
+        await conn.copy_records_to_table(
+            "ledger",
+            records=(
+                (uid, rng.randint(1, 50), db.LEDGER_MESSAGE)
+                for uid, _ in balances
+                for _ in range(LEDGER_PER_USER)
+            ),
+            columns=("user_id", "delta", "reason"),
+        )
+        await conn.copy_records_to_table(
+            "bets",
+            records=(
+                (_uid(rng.randrange(USERS)), _game_id(game), rng.randint(1, 2), rng.randint(10, 1000))
+                for game in range(GAMES)
+                for _ in range(BETS_PER_GAME)
+            ),
+            columns=("user_id", "game_id", "team", "amount"),
+        )
+        await conn.copy_records_to_table(
+            "purchases",
+            records=(
+                (_uid(rng.randrange(USERS)), *rng.choice(SHOP_ITEMS))
+                for _ in range(PURCHASES)
+            ),
+            columns=("user_id", "item_key", "item_name", "price"),
+        )
+        # Статистика нужна планировщику сразу после массовой вставки
+        await conn.execute(f"ANALYZE {', '.join(SEEDED_TABLES)}")
+
+
+def workloads(pool: asyncpg.Pool, rng: random.Random) -> list[Workload]:
+    clear_level = 0
+
+    async def prepare_clear(level: int, ops: int) -> None:
+        # У каждой операции очистки своя игра со ставками
+        nonlocal clear_level
+        clear_level = level
+        async with pool.acquire() as conn:
+            await conn.copy_records_to_table(
+                "bets",
+                records=(
+                    (_uid(rng.randrange(USERS)), f"clear-{level}-{op}", rng.randint(1, 2), 100)
+                    for op in range(ops)
+                    for _ in range(BETS_PER_GAME)
+                ),
+                columns=("user_id", "game_id", "team", "amount"),
+            )
+
+    async def clear(op: int) -> None:
+        await db.clear_bets_for_game(f"clear-{clear_level}-{op}")
+
+    return [
+        Workload("add_currency", lambda op: db.add_currency(_uid(rng.randrange(USERS)), 10, db.LEDGER_MESSAGE)),
+        Workload("get_user_balance", lambda op: db.get_user_balance(_uid(rng.randrange(USERS)))),
+        Workload(
+            "create_bet",
+            lambda op: db.create_bet(_uid(rng.randrange(USERS)), _game_id(rng.randrange(GAMES)), 1, 100),
+        ),
+        Workload("get_bets_for_game", lambda op: db.get_bets_for_game(_game_id(rng.randrange(GAMES)))),
+        Workload(
+            "record_purchase",
+            lambda op: db.record_purchase(_uid(rng.randrange(USERS)), *rng.choice(SHOP_ITEMS)),
+        ),
+        Workload("clear_bets_for_game", clear, prepare_clear),
+    ]
+
+
+async def measure(workload: Workload, concurrency: int, ops: int) -> dict[str, float]:
+    if workload.prepare is not None:
+        await workload.prepare(concurrency, ops + WARMUP_OPS)
+
+    latencies: list[float] = []
+
+    async def worker(ops: range, record: bool) -> None:
+        for op in ops:
+            started = time.perf_counter()
+            await workload.run(op)
+            if record:
+                latencies.append(time.perf_counter() - started)
+
+    # Прогрев: подготовленные выражения и соединения пула создаются вне замера
+    await asyncio.gather(*(worker(range(i, WARMUP_OPS, concurrency), False) for i in range(concurrency)))
+
+    started = time.perf_counter()
+    timed = range(WARMUP_OPS, WARMUP_OPS + ops)
+    await asyncio.gather(*(worker(timed[i::concurrency], True) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "ops_per_sec": ops / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Регрессии относительно базовой линии: падение ops/s или рост p99 больше порога."""
+    regressions = []
+    for name, levels in results["results"].items():
+        for level, current in levels.items():
+            base = baseline.get("results", {}).get(name, {}).get(level)
+            if base is None:
+                continue
+            if current["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+                regressions.append(
+                    f"{name} x{level}: {current['ops_per_sec']:.0f} оп/с против {base['ops_per_sec']:.0f}"
+                )
+            if current["p99_ms"] > base["p99_ms"] * (1 + threshold):
+                regressions.append(f"{name} x{level}: p99 {current['p99_ms']:.2f} мс против {base['p99_ms']:.2f}")
+    return regressions
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    # Тот же размер пула, что у бота: при конкуренции выше него операции ждут соединение
+    pool = await asyncpg.create_pool(dsn=args.dsn, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE)
+    db.use_storage(PostgresStorage(args.dsn, pool=pool))
+    try:
+        if not args.skip_seed:
+            started = time.perf_counter()
+            await seed(pool, rng)
+            print(f"Сид: {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+        results: dict[str, dict[str, dict[str, float]]] = {}
+        print(f"{'функция':<20} {'потоков':>8} {'оп/с':>9} {'p50, мс':>9} {'p99, мс':>9}", file=sys.stderr)
+        for workload in workloads(pool, rng):
+            if args.only and workload.name not in args.only:
+                continue
+            for concurrency in args.concurrency:
+                result = await measure(workload, concurrency, args.ops)
+                results.setdefault(workload.name, {})[str(concurrency)] = result
+                print(
+                    f"{workload.name:<20} {concurrency:>8} {result['ops_per_sec']:>9.0f} "
+                    f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}",
+                    file=sys.stderr,
+                )
+        server_version = ".".join(map(str, pool.get_server_version()[:2]))
+    finally:
+        db.use_storage(None)
+        await pool.close()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": _git_revision(),
+            "postgres": server_version,
+            "ops_per_level": args.ops,
+            "seed": {"users": USERS, "games": GAMES, "bets_per_game": BETS_PER_GAME, "purchases": PURCHASES},
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Задержка и пропускная способность функций db.py на живом Postgres")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL"), help="База для замеров (BENCH_DATABASE_URL)")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=list(CONCURRENCY))
+    parser.add_argument("--ops", type=int, default=OPS_PER_LEVEL)
+    parser.add_argument("--only", nargs="*", help="Запустить только указанные функции")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-seed", action="store_true", help="Не пересоздавать данные")
+    parser.add_argument("--output", type=Path, help="Файл результатов; по умолчанию data/benchmarks/db-<время>.json")
+    parser.add_argument("--baseline", type=Path, help="Результаты, с которыми сравнивать")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Допустимое ухудшение, доля")
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("укажите --dsn или BENCH_DATABASE_URL")
+    # Сид очищает таблицы, поэтому рабочая база бота под замеры не подходит
+    database = args.dsn.rsplit("/", 1)[-1].split("?", 1)[0]
+    if not args.skip_seed and "bench" not in database and "test" not in database:
+        parser.error(f"база {database!r} будет очищена; имя базы для замеров должно содержать bench или test")
+
+    results = asyncio.run(run(args))
+
+    output = args.output or RESULTS_DIR / f"db-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Результаты сохранены в {output}", file=sys.stderr)
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Регрессии больше {args.threshold:.0%}:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Регрессий больше {args.threshold:.0%} нет", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from HatoriBotPy.matchmaker import MatchQueue
+
+QUEUE_SIZES = (1000, 5000, 20000)
+GAMES = ("valorant", "dota 2", "cs")
+LOBBY_SIZE = 10
+TICK = 5.0
+
+
+def run(sizes: tuple[int, ...], seed: int) -> None:
+    print(f"{'игроков':>8} {'вход, оп/с':>12} {'тиков':>6} {'лобби':>7} {'подбор, мс':>11} {'лобби/с':>10} {'осталось':>9}")
+    for size in sizes:
+        rng = random.Random(seed)
+        queue = MatchQueue(LOBBY_SIZE)
+        players = [
+            (uid, rng.choice(GAMES), rng.gauss(1000, 250), rng.uniform(0, 60))
+            for uid in range(size)
+        ]
+        players.sort(key=lambda player: player[3])
+
+        start = time.perf_counter()
+        for uid, game, rating, joined_at in players:
+            queue.join(uid, game, rating, now=joined_at)
+        join_rate = size / (time.perf_counter() - start)
+
+        # Тики подбора идут, пока очередь не перестанет уменьшаться
+        now = 60.0
+        lobbies = ticks = 0
+        matching = 0.0
+        while True:
+            ticks += 1
+            start = time.perf_counter()
+            formed = queue.form_lobbies(now=now)
+            matching += time.perf_counter() - start
+            lobbies += len(formed)
+            if not formed and now > 60.0 + queue.widen_interval * (queue.max_spread + 1):
+                break
+            now += TICK
+
+        print(
+            f"{size:>8} {join_rate:>12.0f} {ticks:>6} {lobbies:>7} {matching * 1000:>11.2f} "
+            f"{lobbies / matching if matching else 0:>10.0f} {len(queue):>9}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Пропускная способность подбора лобби")
+    parser.add_argument("--sizes", type=int, nargs="*", default=list(QUEUE_SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(tuple(args.sizes), args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+
+import discord
+from discord.member import Member
+from discord.state import ConnectionState
+
+from HatoriBotPy.members import MEMBER_CACHE_FULL, MEMBER_CACHE_LEAN, MemberResolver, member_cache_options
+
+GUILD_ID = 1_000_000_000_000_000_000
+ADMIN_ROLE_ID = GUILD_ID + 1
+MANAGER_ROLE_ID = GUILD_ID + 2
+CHUNK_SIZE = 1000
+
+
+def _member_payload(user_id: int, rng: random.Random) -> dict:
+    roles = []
+    if rng.random() < 0.001:
+        roles.append(str(ADMIN_ROLE_ID))
+    if rng.random() < 0.002:
+        roles.append(str(MANAGER_ROLE_ID))
+    return {
+        "user": {
+            "id": str(user_id),
+            "username": f"user{user_id}",
+            "global_name": None,
+            "discriminator": "0",
+            "avatar": None,
+        },
+        "roles": roles,
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def _guild_payload(voice_members: list[dict]) -> dict:
+    return {
+        "id": str(GUILD_ID),
+        "name": "Synthetic guild",
+        "owner_id": str(GUILD_ID + 10),
+        "member_count": 0,
+        "large": True,
+        "roles": [
+            {"id": str(GUILD_ID), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+             "hoist": False, "managed": False, "mentionable": False, "flags": 0},
+            {"id": str(ADMIN_ROLE_ID), "name": "admin", "permissions": "8", "position": 2, "color": 0,
+             "hoist": False, "managed": False, "mentionable": False, "flags": 0},
+            {"id": str(MANAGER_ROLE_ID), "name": "manager", "permissions": "0", "position": 1, "color": 0,
+             "hoist": False, "managed": False, "mentionable": False, "flags": 0},
+        ],
+        "channels": [],
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+        "members": voice_members,
+        "voice_states": [
+            {"user_id": member["user"]["id"], "channel_id": str(GUILD_ID + 100), "session_id": "s",
+             "deaf": False, "mute": False, "self_deaf": False, "self_mute": False, "self_video": False,
+             "suppress": False, "request_to_speak_timestamp": None}
+            for member in voice_members
+        ],
+    }
+
+
+def _rss_kb() -> int:
+    with open("/proc/self/status", encoding="utf-8") as fp:
+        for line in fp:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+async def _run_mode(mode: str, members: int, voice: int, lookups: int) -> dict:
+    rng = random.Random(0)
+    intents = discord.Intents.default()
+    intents.members = True
+    intents.voice_states = True
+    options = member_cache_options(mode, intents)
+    state = ConnectionState(
+        dispatch=lambda *args, **kwargs: None,
+        handlers={},
+        hooks={},
+        http=None,  # type: ignore[arg-type]
+        intents=intents,
+        **options,
+    )
+
+    # Полезная нагрузка генерируется заранее, чтобы измерять только кэш
+    payloads = [_member_payload(GUILD_ID + 1000 + i, rng) for i in range(members)]
+    voice_members = payloads[:voice]
+    baseline = _rss_kb()
+
+    started = time.perf_counter()
+    guild = discord.Guild(data=_guild_payload(voice_members), state=state)
+    state._add_guild(guild)
+    if mode == MEMBER_CACHE_FULL:
+        # Стартовый chunking: все участники приходят пачками и оседают в кэше
+        for offset in range(0, members, CHUNK_SIZE):
+            for data in payloads[offset:offset + CHUNK_SIZE]:
+                guild._add_member(Member(data=data, guild=guild, state=state))
+    startup = time.perf_counter() - started
+
+    # Поиск участников по требованию: в lean-режиме промахи обслуживает LRU,
+    # а загрузка участника имитируется построением объекта из payload
+    resolver = MemberResolver(mode, (ADMIN_ROLE_ID, MANAGER_ROLE_ID))
+    started = time.perf_counter()
+    fetched = 0
+    for _ in range(lookups):
+        data = payloads[int(rng.paretovariate(1.2)) % members]
+        user_id = int(data["user"]["id"])
+        if guild.get_member(user_id) is None and (guild.id, user_id) not in resolver._lru:
+            resolver.remember(Member(data=data, guild=guild, state=state))
+            fetched += 1
+        else:
+            await resolver.get_member(guild, user_id)
+    lookup = time.perf_counter() - started
+
+    return {
+        "mode": mode,
+        "cached_members": len(guild._members),
+        "startup_ms": startup * 1000,
+        "rss_mb": (_rss_kb() - baseline) / 1024,
+        "lookups_per_sec": lookups / lookup if lookup else 0.0,
+        "fetches": fetched,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Память и время запуска при разных политиках кэша участников")
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--voice", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--mode", choices=(MEMBER_CACHE_FULL, MEMBER_CACHE_LEAN))
+    args = parser.parse_args()
+
+    if args.mode:
+        result = asyncio.run(_run_mode(args.mode, args.members, args.voice, args.lookups))
+        print(json.dumps(result))
+        return
+
+    # Каждый режим запускается в отдельном процессе, чтобы RSS не смешивался
+    print(f"{'режим':>6} {'в кэше':>8} {'запуск, мс':>11} {'RSS, МБ':>8} {'поиск, оп/с':>12} {'загрузок':>9}")
+    for mode in (MEMBER_CACHE_FULL, MEMBER_CACHE_LEAN):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_member_cache", "--mode", mode,
+             "--members", str(args.members), "--voice", str(args.voice), "--lookups", str(args.lookups)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{result['mode']:>6} {result['cached_members']:>8} {result['startup_ms']:>11.0f} "
+            f"{result['rss_mb']:>8.1f} {result['lookups_per_sec']:>12.0f} {result['fetches']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import random
+import subprocess
+import sys
+import time
+
+import discord
+from discord.member import Member
+from discord.state import ConnectionState
+
+from HatoriBotPy.runtime import RUNTIME_DEFAULT, RUNTIME_FAST, apply_runtime_profile, freeze_heap
+
+GUILD_ID = 1_000_000_000_000_000_000
+CHANNEL_ID = GUILD_ID + 100
+HANDLER_BATCH = 500
+
+
+def _user(user_id: int) -> dict:
+    return {
+        "id": str(user_id),
+        "username": f"user{user_id}",
+        "global_name": None,
+        "discriminator": "0",
+        "avatar": None,
+    }
+
+
+def _guild_payload(members: int) -> dict:
+    return {
+        "id": str(GUILD_ID),
+        "name": "Synthetic guild",
+        "owner_id": str(GUILD_ID + 10),
+        "member_count": members,
+        "large": True,
+        "roles": [
+            {"id": str(GUILD_ID), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+             "hoist": False, "managed": False, "mentionable": False, "flags": 0},
+        ],
+        "channels": [
+            {"id": str(CHANNEL_ID), "type": 0, "name": "general", "position": 0,
+             "permission_overwrites": [], "nsfw": False, "parent_id": None},
+        ],
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+        "members": [],
+        "voice_states": [],
+    }
+
+
+def _gateway_messages(count: int, members: int, rng: random.Random) -> list[str]:
+    # Сырые сообщения шлюза: разбор JSON входит в измеряемую работу
+    events = []
+    for index in range(count):
+        user_id = GUILD_ID + 1000 + rng.randrange(members)
+        if index % 4 == 3:
+            event = {
+                "op": 0, "s": index, "t": "TYPING_START",
+                "d": {"channel_id": str(CHANNEL_ID), "guild_id": str(GUILD_ID), "user_id": str(user_id),
+                      "timestamp": 1700000000},
+            }
+        else:
+            event = {
+                "op": 0, "s": index, "t": "MESSAGE_CREATE",
+                "d": {
+                    "id": str(GUILD_ID + 10_000_000 + index),
+                    "channel_id": str(CHANNEL_ID),
+                    "guild_id": str(GUILD_ID),
+                    "author": _user(user_id),
+                    "member": {"roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False,
+                               "mute": False, "flags": 0},
+                    "content": "сообщение " * rng.randint(1, 20),
+                    "timestamp": "2024-01-01T00:00:00+00:00",
+                    "edited_timestamp": None,
+                    "tts": False,
+                    "mention_everyone": False,
+                    "mentions": [],
+                    "mention_roles": [],
+                    "attachments": [],
+                    "embeds": [],
+                    "pinned": False,
+                    "type": 0,
+                },
+            }
+        events.append(json.dumps(event, ensure_ascii=False))
+    return events
+
+
+async def _run_profile(profile: str, events: int, members: int) -> dict:
+    rng = random.Random(0)
+    raw_events = _gateway_messages(events, members, rng)
+    handled = 0
+
+    async def on_message(_: discord.Message) -> None:
+        nonlocal handled
+        await asyncio.sleep(0)
+        handled += 1
+
+    loop = asyncio.get_running_loop()
+    pending: list[asyncio.Task[None]] = []
+
+    def dispatch(event: str, *args: object) -> None:
+        if event == "message":
+            pending.append(loop.create_task(on_message(*args)))  # type: ignore[arg-type]
+
+    intents = discord.Intents.default()
+    intents.members = True
+    intents.message_content = True
+    state = ConnectionState(dispatch=dispatch, handlers={}, hooks={}, http=None, intents=intents)  # type: ignore[arg-type]
+    guild = discord.Guild(data=_guild_payload(members), state=state)
+    state._add_guild(guild)
+    # Долгоживущий кэш участников, который сборщик мусора обходит при каждой полной сборке
+    for i in range(members):
+        data = {"user": _user(GUILD_ID + 1000 + i), "roles": [], "joined_at": "2024-01-01T00:00:00+00:00",
+                "deaf": False, "mute": False, "flags": 0}
+        guild._add_member(Member(data=data, guild=guild, state=state))
+    if profile == RUNTIME_FAST:
+        freeze_heap()
+
+    parsers = state.parsers
+    collections_before = sum(stat["collections"] for stat in gc.get_stats())
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    for raw in raw_events:
+        msg = discord.utils._from_json(raw)
+        parsers[msg["t"]](msg["d"])
+        if len(pending) >= HANDLER_BATCH:
+            await asyncio.gather(*pending)
+            pending.clear()
+    await asyncio.gather(*pending)
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+
+    return {
+        "profile": profile,
+        "loop": type(loop).__module__.split(".")[0],
+        "events_per_sec": events / elapsed,
+        "cpu_us_per_event": cpu / events * 1e6,
+        "gc_collections": sum(stat["collections"] for stat in gc.get_stats()) - collections_before,
+        "handled": handled,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Пропускная способность событий шлюза с быстрым профилем и без него")
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--members", type=int, default=50_000)
+    parser.add_argument("--profile", choices=(RUNTIME_DEFAULT, RUNTIME_FAST))
+    args = parser.parse_args()
+
+    if args.profile:
+        if args.profile == RUNTIME_FAST:
+            apply_runtime_profile(RUNTIME_FAST)
+        else:
+            # Базовая линия — стандартный json, даже если orjson установлен
+            discord.utils._from_json = json.loads  # type: ignore[attr-defined]
+        result = asyncio.run(_run_profile(args.profile, args.events, args.members))
+        print(json.dumps(result))
+        return
+
+    # Каждый профиль запускается в отдельном процессе: политика цикла и
+    # настройки сборщика мусора глобальны для интерпретатора
+    print(f"{'профиль':>8} {'цикл':>8} {'событий/с':>10} {'CPU, мкс/соб.':>14} {'сборок GC':>10}")
+    for profile in (RUNTIME_DEFAULT, RUNTIME_FAST):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_runtime", "--profile", profile,
+             "--events", str(args.events), "--members", str(args.members)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{result['profile']:>8} {result['loop']:>8} {result['events_per_sec']:>10.0f} "
+            f"{result['cpu_us_per_event']:>14.1f} {result['gc_collections']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
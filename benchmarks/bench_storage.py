@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+from typing import Optional
+
+from HatoriBotPy import db
+from HatoriBotPy.storage import Storage, open_storage
+
+from benchmarks.bench_db import Workload, measure
+
+CONCURRENCY = (1, 8, 32)
+OPS_PER_LEVEL = 2000
+
+USERS = 10_000
+GAMES = 500
+BETS_PER_GAME = 20
+COMPLAINTS = 2000
+SHOP_ITEMS = (("vip_7", "VIP на 7 дней", 500), ("color", "Цветная роль", 300), ("badge", "Значок", 150))
+COMPLAINT_WORDS = ("игрок", "мешает", "кричит", "токсичный", "микрофон", "оскорбляет", "читер", "афк", "музыка")
+SEED_CHUNK = 500
+
+
+def _uid(index: int) -> str:
+    return str(200_000_000_000_000_000 + index)
+
+
+def _game_id(index: int) -> str:
+    return f"storage-bench-{index}"
+
+
+async def _in_chunks(coros: list) -> None:
+    for start in range(0, len(coros), SEED_CHUNK):
+        await asyncio.gather(*coros[start:start + SEED_CHUNK])
+
+
+async def seed(rng: random.Random) -> None:
+    """Заполняет хранилище через общий интерфейс, одинаково для всех движков."""
+    await db.import_balances(
+        ((i, _uid(i), rng.randint(0, 20_000)) for i in range(USERS)),
+        mode=db.IMPORT_MODE_SET,
+        ref="bench",
+    )
+    await _in_chunks(
+        [
+            db.create_bet(_uid(rng.randrange(USERS)), _game_id(game), rng.randint(1, 2), rng.randint(10, 1000))
+            for game in range(GAMES)
+            for _ in range(BETS_PER_GAME)
+        ]
+    )
+    await _in_chunks(
+        [
+            db.create_complaint(1, _uid(rng.randrange(USERS)), None, " ".join(rng.choices(COMPLAINT_WORDS, k=12)))
+            for _ in range(COMPLAINTS)
+        ]
+    )
+
+
+def workloads(rng: random.Random) -> list[Workload]:
+    purchases = iter(range(10**9))
+    return [
+        Workload("add_currency", lambda op: db.add_currency(_uid(rng.randrange(USERS)), 10, db.LEDGER_MESSAGE)),
+        Workload("get_user_balance", lambda op: db.get_user_balance(_uid(rng.randrange(USERS)))),
+        Workload(
+            "place_bet",
+            lambda op: db.place_bet(_uid(rng.randrange(USERS)), _game_id(rng.randrange(GAMES)), 1, 10),
+        ),
+        Workload("get_bets_for_game", lambda op: db.get_bets_for_game(_game_id(rng.randrange(GAMES)))),
+        Workload(
+            "purchase_item",
+            lambda op: db.purchase_item(
+                _uid(rng.randrange(USERS)), *rng.choice(SHOP_ITEMS), f"bench-{os.getpid()}-{next(purchases)}"
+            ),
+        ),
+        Workload("search_complaints", lambda op: db.search_complaints(1, rng.choice(COMPLAINT_WORDS))),
+    ]
+
+
+async def run_backend(name: str, storage: Storage, args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    db.use_storage(storage)
+    try:
+        await db.init_db()
+        await seed(rng)
+        for workload in workloads(rng):
+            if args.only and workload.name not in args.only:
+                continue
+            for concurrency in args.concurrency:
+                result = await measure(workload, concurrency, args.ops)
+                print(
+                    f"{name:<9} {workload.name:<20} {concurrency:>8} {result['ops_per_sec']:>9.0f} "
+                    f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}"
+                )
+        for line in getattr(storage, "report", lambda: [])():
+            print(f"{name:<9} {line}", file=sys.stderr)
+    finally:
+        await db.close_db()
+
+
+async def run(args: argparse.Namespace) -> None:
+    print(f"{'хранилище':<9} {'функция':<20} {'потоков':>8} {'оп/с':>9} {'p50, мс':>9} {'p99, мс':>9}")
+    workdir = tempfile.mkdtemp(prefix="bench-storage-")
+    urls = {"memory": "memory://", "sqlite": f"sqlite:///{os.path.join(workdir, 'bench.db')}"}
+    if args.dsn:
+        urls["postgres"] = args.dsn
+    try:
+        for name, url in urls.items():
+            if args.backends and name not in args.backends:
+                continue
+            await run_backend(name, open_storage(url), args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Задержка и пропускная способность хранилищ: память, SQLite, Postgres")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL"), help="Postgres для сравнения (BENCH_DATABASE_URL)")
+    parser.add_argument("--backends", nargs="*", help="Только указанные хранилища: memory, sqlite, postgres")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=list(CONCURRENCY))
+    parser.add_argument("--ops", type=int, default=OPS_PER_LEVEL)
+    parser.add_argument("--only", nargs="*", help="Запустить только указанные функции")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.dsn:
+        # Замеры дописывают ставки, покупки и жалобы, поэтому рабочая база бота не подходит
+        database = args.dsn.rsplit("/", 1)[-1].split("?", 1)[0]
+        if "bench" not in database and "test" not in database:
+            parser.error(f"в базу {database!r} будут записаны данные замеров; имя должно содержать bench или test")
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+
+from HatoriBotPy.teams import balance_teams, team_difference
+
+LOBBY_SIZES = (6, 10, 16, 20, 24, 30, 40)
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def run(runs: int, seed: int) -> None:
+    rng = random.Random(seed)
+    print(f"{'игроков':>8} {'средн, мс':>10} {'p99, мс':>10} {'макс, мс':>10} {'разница':>10}")
+    for size in LOBBY_SIZES:
+        timings: list[float] = []
+        diffs: list[float] = []
+        for _ in range(runs):
+            ratings = [rng.gauss(1000, 200) for _ in range(size)]
+            start = time.perf_counter()
+            split = balance_teams(ratings)
+            timings.append((time.perf_counter() - start) * 1000)
+            diffs.append(team_difference(ratings, split))
+        print(
+            f"{size:>8} {statistics.mean(timings):>10.3f} {_percentile(timings, 0.99):>10.3f} "
+            f"{max(timings):>10.3f} {statistics.mean(diffs):>10.3f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Скорость и качество балансировки команд")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.runs, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import Optional
+
+from HatoriBotPy import db
+from HatoriBotPy.config import settings
+from HatoriBotPy.storage import open_storage
+
+USERS = 200
+ROUNDS = 5
+AMOUNT = 7
+
+SETUP = """
+Две локальные копии Postgres (основная на 5432, реплика на 5433):
+
+  initdb -D /tmp/pg-primary
+  echo "wal_level = replica" >> /tmp/pg-primary/postgresql.conf
+  pg_ctl -D /tmp/pg-primary -o "-p 5432" start
+  createdb -p 5432 hatori_test
+  pg_basebackup -p 5432 -D /tmp/pg-replica -R
+  pg_ctl -D /tmp/pg-replica -o "-p 5433" start
+
+  python -m benchmarks.check_replicas postgres://localhost:5432/hatori_test \\
+      postgres://localhost:5433/hatori_test
+"""
+
+
+def _uid(index: int) -> str:
+    return str(300_000_000_000_000_000 + index)
+
+
+async def run(args: argparse.Namespace) -> int:
+    primary = open_storage(args.primary)
+    db.use_storage(primary)
+    await db.init_db()
+    db.replicas.configure(args.replicas, primary)
+    try:
+        await db.replicas.check()
+        await db.import_balances(((i, _uid(i), 0) for i in range(USERS)), mode=db.IMPORT_MODE_SET, ref="replicas")
+        # Ждем, пока массовая запись дойдет до реплик и закрепление снимется
+        deadline = time.monotonic() + settings.DB_REPLICA_MAX_LAG + settings.DB_REPLICA_CHECK_INTERVAL + 1
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.DB_REPLICA_CHECK_INTERVAL)
+            await db.replicas.check()
+
+        stale = 0
+        for round_no in range(1, args.rounds + 1):
+            for i in range(USERS):
+                await db.add_currency(_uid(i), AMOUNT, db.LEDGER_ADJUST, "replicas")
+                if await db.get_user_balance(_uid(i)) != AMOUNT * round_no:
+                    stale += 1
+            # Чужие балансы не закреплены и читаются с реплик
+            for i in range(USERS):
+                await db.get_player_stats(_uid(i))
+            await db.replicas.check()
+
+        health = db.database_health()
+        for replica in health["replicas"]:
+            print(
+                f"{replica['name']:<24} {'ok' if replica['healthy'] else 'исключена':<10} "
+                f"отставание {replica['lag']} с, чтений {replica['reads']}, сбоев {replica['failures']}"
+            )
+        print(
+            f"в основной базе: {health['primary_reads']}, после записи: {health['pinned_reads']}, "
+            f"после сбоя реплики: {health['fallbacks']}"
+        )
+        print(f"устаревших чтений своего баланса: {stale}")
+        return 1 if stale else 0
+    finally:
+        await db.close_db()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Проверка маршрутизации чтений на реплики и чтения своих записей",
+        epilog=SETUP,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("primary", help="Основная база")
+    parser.add_argument("replicas", nargs="+", help="Реплики для чтения")
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    args = parser.parse_args(argv)
+
+    # Проверка переписывает балансы, поэтому рабочая база бота не подходит
+    database = args.primary.rsplit("/", 1)[-1].split("?", 1)[0]
+    if "bench" not in database and "test" not in database:
+        parser.error(f"в базе {database!r} будут изменены балансы; имя должно содержать bench или test")
+
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
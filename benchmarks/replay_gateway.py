@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+import discord
+from discord.http import Route
+from discord.webhook import async_ as webhook_async
+
+from HatoriBotPy import db
+from HatoriBotPy.bot import HatoriBot
+from HatoriBotPy.config import settings
+from HatoriBotPy.interactions import handler_stats
+from HatoriBotPy.storage.postgres import PostgresStorage
+
+APPLICATION_ID = 900_000_000_000_000_001
+BOT_USER_ID = 900_000_000_000_000_002
+SETTLE_SECONDS = 2.0
+
+_snowflakes = itertools.count(950_000_000_000_000_000)
+
+
+def _user(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": data["id"],
+        "username": f"user{data['id'][-6:]}",
+        "global_name": None,
+        "discriminator": "0",
+        "avatar": None,
+        "bot": data.get("bot", False),
+    }
+
+
+def _member(data: Dict[str, Any], user: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    member = {
+        "roles": data.get("roles", []),
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+    if "permissions" in data:
+        member["permissions"] = data["permissions"]
+    source = data.get("user") or user
+    if source is not None:
+        member["user"] = _user(source)
+    return member
+
+
+def _bot_user() -> Dict[str, Any]:
+    return _user({"id": str(BOT_USER_ID), "bot": True})
+
+
+def _message(message_id: Any, channel_id: Any, **extra: Any) -> Dict[str, Any]:
+    payload = {
+        "id": str(message_id),
+        "channel_id": str(channel_id),
+        "author": _bot_user(),
+        "content": "",
+        "timestamp": "2024-01-01T00:00:00+00:00",
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+    }
+    payload.update(extra)
+    return payload
+
+
+def _guild(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": data["id"],
+        "name": "Replay guild",
+        "owner_id": data.get("owner_id") or "0",
+        "member_count": 0,
+        "large": True,
+        "roles": [
+            {"id": role["id"], "name": "role", "permissions": role.get("permissions", "0"), "position": index,
+             "color": 0, "hoist": False, "managed": False, "mentionable": False, "flags": 0}
+            for index, role in enumerate(data.get("roles", []))
+        ],
+        "channels": [
+            {"id": channel["id"], "type": channel["type"], "name": f"channel-{channel['id'][-4:]}",
+             "position": index, "permission_overwrites": [], "nsfw": False, "parent_id": channel.get("parent_id"),
+             "bitrate": 64000, "user_limit": 0}
+            for index, channel in enumerate(data.get("channels", []))
+        ],
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+        "members": [],
+        "voice_states": [],
+    }
+
+
+def _complete(event: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Дополняет обезличенную запись полями, которых требует discord.py."""
+    if event == "MESSAGE_CREATE":
+        payload = _message(data["id"], data["channel_id"], guild_id=data.get("guild_id"), type=data.get("type", 0))
+        payload["author"] = _user(data["author"])
+        payload["content"] = data.get("content", "")
+        if "member" in data:
+            payload["member"] = _member(data["member"])
+        return payload
+    if event == "VOICE_STATE_UPDATE":
+        payload = dict(data)
+        payload["session_id"] = "replay"
+        payload["request_to_speak_timestamp"] = None
+        payload["member"] = _member(data.get("member", {}), {"id": data["user_id"]})
+        return payload
+    if event.startswith("MESSAGE_REACTION_"):
+        payload = dict(data)
+        payload["burst"] = False
+        if "member" in data:
+            payload["member"] = _member(data["member"], {"id": data["user_id"]})
+        return payload
+    if event == "INTERACTION_CREATE":
+        payload = dict(data)
+        payload["application_id"] = str(APPLICATION_ID)
+        payload["token"] = f"replay-{data['id']}"
+        payload["version"] = 1
+        payload["app_permissions"] = "0"
+        payload["attachment_size_limit"] = 10 * 2**20
+        payload["entitlements"] = []
+        payload["authorizing_integration_owners"] = {}
+        if "member" in data:
+            payload["member"] = _member(data["member"])
+        elif "user" in data:
+            payload["user"] = _user(data["user"])
+        if "message" in data:
+            payload["message"] = _message(data["message"]["id"], data["message"]["channel_id"])
+        return payload
+    return data
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.events: Counter = Counter()
+        self.handler_latency: Dict[str, list[float]] = defaultdict(list)
+        self.ack_latency: list[float] = []
+        self.rest_calls: Counter = Counter()
+        self.db_calls: Counter = Counter()
+        self.interaction_started: Dict[str, float] = {}
+
+    def report(self, dispatch: float, wall: float) -> Dict[str, Any]:
+        def summary(samples: list[float]) -> Dict[str, float]:
+            ordered = sorted(samples)
+            return {
+                "count": len(ordered),
+                "p50_ms": statistics.median(ordered) * 1000,
+                "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+
+        return {
+            "dispatch_seconds": dispatch,
+            "wall_seconds": wall,
+            "events": dict(self.events),
+            "events_per_sec": sum(self.events.values()) / dispatch if dispatch else 0.0,
+            "handlers": {name: summary(samples) for name, samples in sorted(self.handler_latency.items()) if samples},
+            "interaction_ack": summary(self.ack_latency) if self.ack_latency else None,
+            "view_handlers": {
+                name: {"calls": stats.calls, "deferred": stats.deferred, "avg_ms": stats.average_time * 1000}
+                for name, stats in handler_stats.items()
+            },
+            "db_calls": dict(self.db_calls.most_common()),
+            "rest_calls": dict(self.rest_calls.most_common()),
+        }
+
+
+class _Row(dict):
+    def __missing__(self, key: str) -> int:
+        return 0
+
+
+class _Transaction:
+    async def __aenter__(self) -> "_Transaction":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        return None
+
+
+class StandInConnection:
+    """Подмена соединения asyncpg: считает вызовы и отвечает пустыми строками."""
+
+    def __init__(self, metrics: Metrics, latency: float) -> None:
+        self.metrics = metrics
+        self.latency = latency
+
+    async def _call(self, query: str) -> None:
+        self.metrics.db_calls[query.split(None, 1)[0].upper() if query.strip() else "?"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def execute(self, query: str, *args: Any, **kwargs: Any) -> str:
+        await self._call(query)
+        return "OK"
+
+    async def executemany(self, query: str, *args: Any, **kwargs: Any) -> None:
+        await self._call(query)
+
+    async def fetch(self, query: str, *args: Any, **kwargs: Any) -> list:
+        await self._call(query)
+        return []
+
+    async def fetchrow(self, query: str, *args: Any, **kwargs: Any) -> _Row:
+        await self._call(query)
+        return _Row()
+
+    async def fetchval(self, query: str, *args: Any, **kwargs: Any) -> int:
+        await self._call(query)
+        return 0
+
+    def transaction(self, **kwargs: Any) -> _Transaction:
+        return _Transaction()
+
+
+class StandInPool(StandInConnection):
+    def acquire(self) -> "StandInPool":
+        return self
+
+    async def __aenter__(self) -> StandInConnection:
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        return None
+
+    async def close(self) -> None:
+        return None
+
+
+class StandInStorage(PostgresStorage):
+    """Postgres поверх подменного пула. Подписка LISTEN и реплики открыли бы
+    настоящие соединения, поэтому хранилище их не поддерживает: настройки
+    гильдий перечитываются опросом через тот же пул."""
+
+    supports_notify = False
+    supports_replicas = False
+
+
+class StandInREST:
+    """Подмена REST API Discord: считает маршруты и возвращает правдоподобные ответы."""
+
+    def __init__(self, metrics: Metrics, latency: float) -> None:
+        self.metrics = metrics
+        self.latency = latency
+
+    async def request(self, route: Route, **kwargs: Any) -> Any:
+        self.metrics.rest_calls[f"{route.method} {route.path}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        path = route.path
+        if path.startswith("/channels/{channel_id}/messages") and "reactions" not in path:
+            message_id = route.url.rsplit("/", 1)[-1] if "{message_id}" in path else next(_snowflakes)
+            return _message(message_id, route.channel_id)
+        if path == "/users/@me/channels":
+            return {"id": str(next(_snowflakes)), "type": 1, "recipients": []}
+        if path.startswith("/applications/") and route.method == "PUT":
+            return []
+        return {}
+
+
+class StandInWebhookAdapter(webhook_async.AsyncWebhookAdapter):
+    """Ответы на взаимодействия идут не через HTTPClient, а через адаптер вебхуков."""
+
+    def __init__(self, metrics: Metrics, latency: float) -> None:
+        super().__init__()
+        self.metrics = metrics
+        self.latency = latency
+
+    async def request(self, route: Route, session: Any, **kwargs: Any) -> Any:  # type: ignore[override]
+        self.metrics.rest_calls[f"{route.method} {route.path}"] += 1
+        if route.path.endswith("/callback"):
+            started = self.metrics.interaction_started.pop(str(route.webhook_id), None)
+            if started is not None:
+                self.metrics.ack_latency.append(time.perf_counter() - started)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if route.path.endswith("/callback"):
+            payload = kwargs.get("payload") or {}
+            return {"interaction": {"id": str(route.webhook_id), "type": payload.get("type", 4)}}
+        if route.method == "DELETE":
+            return None
+        return _message(next(_snowflakes), 0)
+
+
+def _read_recording(path: Path) -> Iterator[tuple[int, str, Dict[str, Any]]]:
+    with path.open(encoding="utf-8") as fp:
+        header = json.loads(fp.readline())
+        if header.get("v") != 1:
+            raise SystemExit(f"Неподдерживаемая версия записи: {header.get('v')}")
+        for line in fp:
+            if line.strip():
+                offset, event, data = json.loads(line)
+                yield offset, event, data
+
+
+async def replay(path: Path, speed: float, db_latency: float, rest_latency: float) -> Dict[str, Any]:
+    metrics = Metrics()
+    db.use_storage(StandInStorage(settings.DATABASE_URL, pool=StandInPool(metrics, db_latency)))  # type: ignore[arg-type]
+    webhook_async.async_context.set(StandInWebhookAdapter(metrics, rest_latency))
+
+    bot = HatoriBot()
+    # Состояние на диске не должно меняться от воспроизведения
+    bot._voice_channels_file = Path(tempfile.mkdtemp(prefix="replay-")) / "channels.json"
+    bot.http.request = StandInREST(metrics, rest_latency).request  # type: ignore[method-assign]
+    await bot._async_setup_hook()
+    state = bot._connection
+    state.user = discord.ClientUser(state=state, data=_bot_user())  # type: ignore[arg-type]
+    state.application_id = APPLICATION_ID
+    await bot.setup_hook()
+    if bot._scheduler_task is not None:
+        bot._scheduler_task.cancel()
+
+    schedule_event = bot._schedule_event
+
+    def timed_schedule(coro: Any, event_name: str, *args: Any, **kwargs: Any) -> asyncio.Task:
+        async def timed(*a: Any, **k: Any) -> None:
+            started = time.perf_counter()
+            try:
+                await coro(*a, **k)
+            finally:
+                metrics.handler_latency[event_name].append(time.perf_counter() - started)
+
+        return schedule_event(timed, event_name, *args, **kwargs)
+
+    bot._schedule_event = timed_schedule  # type: ignore[method-assign]
+
+    started = time.perf_counter()
+    for count, (offset, event, data) in enumerate(_read_recording(path), start=1):
+        if speed > 0:
+            delay = started + offset / 1000 / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif count % 100 == 0:
+            await asyncio.sleep(0)
+
+        metrics.events[event] += 1
+        payload = _complete(event, data)
+        try:
+            if event == "GUILD_CREATE":
+                # Разбор GUILD_CREATE запросил бы участников у шлюза, гильдия добавляется напрямую
+                state._add_guild(discord.Guild(data=_guild(payload), state=state))
+                continue
+            if event == "INTERACTION_CREATE":
+                metrics.interaction_started[payload["id"]] = time.perf_counter()
+            state.parsers[event](payload)
+        except Exception:
+            logging.getLogger("benchmarks.replay").exception("Не удалось воспроизвести %s", event)
+
+    dispatch = time.perf_counter() - started
+    # Даем обработчикам завершиться; долгие таймеры игр к замеру не относятся
+    await asyncio.sleep(SETTLE_SECONDS)
+    result = metrics.report(dispatch, time.perf_counter() - started)
+    result["recording"] = str(path)
+    result["speed"] = speed or "max"
+    result["unacknowledged_interactions"] = len(metrics.interaction_started)
+
+    for task in asyncio.all_tasks() - {asyncio.current_task()}:
+        task.cancel()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных событий шлюза на подменных REST и БД")
+    parser.add_argument("recording", type=Path)
+    parser.add_argument("--speed", type=float, default=0, help="1 — реальное время, 10 — в 10 раз быстрее, 0 — максимум")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0)
+    parser.add_argument("--rest-latency-ms", type=float, default=20.0)
+    parser.add_argument("--output", type=Path, help="Куда сохранить отчет в JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(replay(args.recording, args.speed, args.db_latency_ms / 1000, args.rest_latency_ms / 1000))
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
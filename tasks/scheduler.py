@@ -1,18 +1,61 @@
 from __future__ import annotations
 import asyncio
 import logging
-from HatoriBotPy.cogs.custom_game import ACTIVE_GAMES
+import time
+
+from HatoriBotPy.config import settings
+from HatoriBotPy.supervisor import supervisor
+from HatoriBotPy.db import (
+    detach_ledger_partitions,
+    ensure_ledger_partitions,
+    flush_deferred_rewards,
+    reconcile_ledger,
+    refund_unfulfilled_purchases,
+)
 
 log = logging.getLogger(__name__)
 
+SCHEDULER_INTERVAL = 30
+LEDGER_MAINTENANCE_INTERVAL = 24 * 60 * 60
+RECONCILE_REPORT_LIMIT = 20
+
 
 async def scheduler_loop(bot):
+    last_maintenance = 0.0
+    last_reconcile = time.monotonic()
     while True:
         try:
             await check_active_games(bot)
         except Exception as e:
             log.error(f'Scheduler loop error: {e}')
-        await asyncio.sleep(30)
+
+        try:
+            credited = await flush_deferred_rewards()
+            if credited:
+                log.info('Начислено отложенных наград: %d', credited)
+        except Exception:
+            log.exception('Не удалось начислить отложенные награды')
+
+        try:
+            await refund_purchases()
+        except Exception:
+            log.exception('Не удалось вернуть деньги за невыданные покупки')
+
+        now = time.monotonic()
+        if now - last_maintenance >= LEDGER_MAINTENANCE_INTERVAL:
+            last_maintenance = now
+            try:
+                await maintain_ledger()
+            except Exception:
+                log.exception('Не удалось обслужить разделы журнала')
+        if now - last_reconcile >= settings.LEDGER_RECONCILE_INTERVAL:
+            last_reconcile = now
+            try:
+                await reconcile_balances()
+            except Exception:
+                log.exception('Не удалось сверить балансы с журналом')
+
+        await asyncio.sleep(SCHEDULER_INTERVAL)
         
         
 #Проверка активных игр и выполнение необходимых действий        
@@ -20,8 +63,46 @@ async def check_active_games(bot):
     pass
 
 
-#Запуск фоновой задачи
-async def start_scheduler(bot):
-    pass
+#Создание разделов журнала наперед и отсоединение устаревших
+async def maintain_ledger():
+    await ensure_ledger_partitions()
+    if settings.LEDGER_RETENTION_MONTHS > 0:
+        await detach_ledger_partitions(settings.LEDGER_RETENTION_MONTHS)
+
+
+#Возврат денег за покупки, товар по которым так и не выдан
+async def refund_purchases() -> int:
+    rows = await refund_unfulfilled_purchases()
+    for row in rows:
+        log.warning(
+            'Покупка %s (%s) пользователя %s не выдана, возвращено %s монет',
+            row['id'],
+            row['item_name'],
+            row['user_id'],
+            row['price'],
+        )
+    return len(rows)
 
-    asyncio.create_task(scheduler_loop(bot))
\ No newline at end of file
+
+#Сверка балансов пользователей с журналом операций
+async def reconcile_balances() -> int:
+    mismatches = 0
+    async for row in reconcile_ledger():
+        mismatches += 1
+        if mismatches <= RECONCILE_REPORT_LIMIT:
+            log.warning(
+                'Баланс пользователя %s не сходится с журналом: %s != %s',
+                row['user_id'],
+                row['balance'],
+                row['ledger_total'],
+            )
+    if mismatches:
+        log.warning('Сверка журнала: расхождений %d', mismatches)
+    else:
+        log.info('Сверка журнала: расхождений нет')
+    return mismatches
+
+
+#Запуск фоновой задачи
+def start_scheduler(bot) -> asyncio.Task:
+    return supervisor.spawn(scheduler_loop(bot), name="scheduler", category="scheduler")
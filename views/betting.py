@@ -1,20 +1,22 @@
 from __future__ import annotations
 
-from typing import Awaitable, Callable
+from typing import Any, Awaitable, Callable
 
 import discord
 
 from HatoriBotPy.db import (
-    create_bet,
-    get_bets_for_game,
     get_user_balance,
-    set_user_balance,
-    clear_bets_for_game,
+    payout_bets,
+    place_bet,
+    refund_bets,
 )
+from HatoriBotPy.interactions import fast_ack, respond
+from HatoriBotPy.permissions import is_game_manager
+from HatoriBotPy.tracing import span
 from HatoriBotPy.utils import format_currency
 
 BetCallback = Callable[[discord.Interaction, int, int], Awaitable[None]]
-FinalizeCallback = Callable[[discord.Interaction, str], Awaitable[None]]
+FinalizeCallback = Callable[[discord.Interaction, int, str], Awaitable[None]]
 
 
 class BetModal(discord.ui.Modal):
@@ -38,41 +40,47 @@ class BetModal(discord.ui.Modal):
         )
         self.add_item(self.amount)
 
+    @fast_ack("BetModal.on_submit")
     async def on_submit(self, interaction: discord.Interaction) -> None:  # type: ignore[override]
         try:
             amount = int(self.amount.value)
         except ValueError:
-            await interaction.response.send_message(
+            await respond(
+                interaction,
                 "Пожалуйста, введите корректное число.",
                 ephemeral=True,
             )
             return
 
         if amount <= 0:
-            await interaction.response.send_message(
+            await respond(
+                interaction,
                 "Сумма должна быть положительной.",
                 ephemeral=True,
             )
             return
 
-        balance = await get_user_balance(interaction.user.id)
-        if balance < amount:
-            await interaction.response.send_message(
-                f"Недостаточно средств для ставки. У вас {format_currency(balance)}",
+        try:
+            new_balance = await place_bet(interaction.user.id, self.game_id, self.team_index, amount)
+        except Exception:
+            await respond(
+                interaction,
+                "Ошибка при создании ставки.",
                 ephemeral=True,
             )
             return
 
-        success = await create_bet(interaction.user.id, self.game_id, self.team_index, amount)
-        if not success:
-            await interaction.response.send_message(
-                "Ошибка при создании ставки.",
+        if new_balance is None:
+            balance = await get_user_balance(interaction.user.id)
+            await respond(
+                interaction,
+                f"Недостаточно средств для ставки. У вас {format_currency(balance)}",
                 ephemeral=True,
             )
             return
 
-        await set_user_balance(interaction.user.id, balance - amount)
-        await interaction.response.send_message(
+        await respond(
+            interaction,
             f"✅ Ставка на {self.team_name} в размере {format_currency(amount)} принята!",
             ephemeral=True,
         )
@@ -124,21 +132,9 @@ class BetView(discord.ui.View):
     async def bet_team2(self, interaction: discord.Interaction, _: discord.ui.Button) -> None:
         await self._show_modal(interaction, 2)
 
-    async def _is_admin(self, interaction: discord.Interaction) -> bool:
-        from HatoriBotPy.config import settings
-
-        if not isinstance(interaction.user, discord.Member):
-            return False
-
-        role_ids = {role.id for role in interaction.user.roles}
-        if settings.ADMIN_ROLE_ID and settings.ADMIN_ROLE_ID in role_ids:
-            return True
-        manager_role = settings.CUSTOM_GAME_MANAGER_ROLE_ID
-        return bool(manager_role and manager_role in role_ids)
-
     @discord.ui.button(label="Вернуть ставки", style=discord.ButtonStyle.secondary)
     async def refund(self, interaction: discord.Interaction, _: discord.ui.Button) -> None:
-        if not await self._is_admin(interaction):
+        if not is_game_manager(interaction.user):
             await interaction.response.send_message("Недостаточно прав.", ephemeral=True)
             return
         if self._on_refund is None:
@@ -157,6 +153,7 @@ class WinnerView(discord.ui.View):
         game_id: str,
         on_finalize: FinalizeCallback | None = None,
         on_refund: Callable[[discord.Interaction], Awaitable[None]] | None = None,
+        trace: Any = None,
     ) -> None:
         super().__init__(timeout=600)
         self.team1 = team1
@@ -164,97 +161,93 @@ class WinnerView(discord.ui.View):
         self.game_id = game_id
         self._on_finalize = on_finalize
         self._on_refund = on_refund
+        # Спан игровой сессии: расчет ставок попадает в трассу всей игры
+        self.trace = trace
+        # Повторное или одновременное нажатие не должно рассчитать игру дважды
+        self._settled = False
 
     def disable_all_items(self) -> None:
         for child in self.children:
             child.disabled = True
         self.stop()
 
-    async def _is_admin(self, interaction: discord.Interaction) -> bool:
-        from HatoriBotPy.config import settings
-
-        if not isinstance(interaction.user, discord.Member):
-            return False
-
-        role_ids = {role.id for role in interaction.user.roles}
-        if settings.ADMIN_ROLE_ID and settings.ADMIN_ROLE_ID in role_ids:
-            return True
-        manager_role = settings.CUSTOM_GAME_MANAGER_ROLE_ID
-        return bool(manager_role and manager_role in role_ids)
-
+    @fast_ack("WinnerView.process_winner")
     async def _process_winner(self, interaction: discord.Interaction, winning_team: int) -> None:
-        bets = await get_bets_for_game(self.game_id)
-        if not bets:
-            await interaction.response.send_message("Ставок не найдено.", ephemeral=True)
-            return
-
-        total_bets_team1 = sum(bet["amount"] for bet in bets if bet["team"] == 1)
-        total_bets_team2 = sum(bet["amount"] for bet in bets if bet["team"] == 2)
-        total_pot = total_bets_team1 + total_bets_team2
+        with span("game.settle", parent=self.trace, winner=winning_team):
+            await self._settle(interaction, winning_team)
 
-        winning_bets = [bet for bet in bets if bet["team"] == winning_team]
-        total_winning_bets = sum(bet["amount"] for bet in winning_bets)
-
-        if total_winning_bets == 0:
-            await interaction.response.send_message(
+    async def _settle(self, interaction: discord.Interaction, winning_team: int) -> None:
+        if self._settled:
+            await respond(interaction, "Результат игры уже записан.", ephemeral=True)
+            return
+        self._settled = True
+        try:
+            payouts = await payout_bets(self.game_id, winning_team)
+        except BaseException:
+            self._settled = False
+            raise
+        if payouts is not None and not payouts:
+            # Ставки остались: можно выбрать другой исход или вернуть их
+            self._settled = False
+            await respond(
+                interaction,
                 "На победившую команду не было ставок.",
                 ephemeral=True,
             )
             return
 
-        for bet in winning_bets:
-            win_amount = int((bet["amount"] / total_winning_bets) * total_pot)
-            current_balance = await get_user_balance(bet["user_id"])
-            await set_user_balance(bet["user_id"], current_balance + win_amount)
-
-        await clear_bets_for_game(self.game_id)
-
         winning_team_name = self.team1 if winning_team == 1 else self.team2
-        await interaction.response.send_message(
-            f"✅ Выплаты произведены! Победила {winning_team_name}.",
-            ephemeral=True,
-        )
+        if payouts is None:
+            result_msg = f"✅ Результат записан, ставок не было. Победила {winning_team_name}."
+        else:
+            result_msg = f"✅ Выплаты произведены! Победила {winning_team_name}."
+        await respond(interaction, result_msg, ephemeral=True)
 
         if self._on_finalize:
-            await self._on_finalize(interaction, winning_team_name)
+            await self._on_finalize(interaction, winning_team, winning_team_name)
 
         self.disable_all_items()
         await interaction.message.edit(view=self)
 
     @discord.ui.button(label="Победила команда 1", style=discord.ButtonStyle.success)
     async def win_team1(self, interaction: discord.Interaction, _: discord.ui.Button) -> None:
-        if not await self._is_admin(interaction):
+        if not is_game_manager(interaction.user):
             await interaction.response.send_message("Недостаточно прав.", ephemeral=True)
             return
         await self._process_winner(interaction, 1)
 
     @discord.ui.button(label="Победила команда 2", style=discord.ButtonStyle.primary)
     async def win_team2(self, interaction: discord.Interaction, _: discord.ui.Button) -> None:
-        if not await self._is_admin(interaction):
+        if not is_game_manager(interaction.user):
             await interaction.response.send_message("Недостаточно прав.", ephemeral=True)
             return
         await self._process_winner(interaction, 2)
 
     @discord.ui.button(label="Вернуть все ставки", style=discord.ButtonStyle.secondary)
+    @fast_ack("WinnerView.return_bets")
     async def return_bets(self, interaction: discord.Interaction, _: discord.ui.Button) -> None:
-        if not await self._is_admin(interaction):
-            await interaction.response.send_message("Недостаточно прав.", ephemeral=True)
+        if not is_game_manager(interaction.user):
+            await respond(interaction, "Недостаточно прав.", ephemeral=True)
             return
 
-        bets = await get_bets_for_game(self.game_id)
-        if not bets:
-            await interaction.response.send_message("Ставок не найдено.", ephemeral=True)
+        if self._settled:
+            await respond(interaction, "Результат игры уже записан.", ephemeral=True)
             return
-
-        for bet in bets:
-            current_balance = await get_user_balance(bet["user_id"])
-            await set_user_balance(bet["user_id"], current_balance + bet["amount"])
-
-        await clear_bets_for_game(self.game_id)
-
-        if self._on_refund:
-            await self._on_refund(interaction)
-
-        await interaction.response.send_message("Ставки возвращены игрокам.", ephemeral=True)
+        self._settled = True
+        with span("game.refund", parent=self.trace):
+            try:
+                refunded = await refund_bets(self.game_id)
+            except BaseException:
+                self._settled = False
+                raise
+            if not refunded:
+                self._settled = False
+                await respond(interaction, "Ставок не найдено.", ephemeral=True)
+                return
+
+            if self._on_refund:
+                await self._on_refund(interaction)
+
+        await respond(interaction, "Ставки возвращены игрокам.", ephemeral=True)
         self.disable_all_items()
         await interaction.message.edit(view=self)
\ No newline at end of file
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+import asyncpg
+import discord
+
+from HatoriBotPy.db import COMPLAINTS_PAGE_SIZE, DatabaseUnavailable, search_complaints
+from HatoriBotPy.interactions import notify_database_unavailable
+
+PAGE_TIMEOUT = 300
+
+
+async def fetch_complaints_page(
+    guild_id: int,
+    query: Optional[str],
+    author_id: Optional[int],
+    before_id: Optional[int] = None,
+) -> tuple[list[asyncpg.Record], bool]:
+    # Лишняя строка показывает, есть ли следующая страница, без отдельного COUNT
+    rows = await search_complaints(guild_id, query, author_id, before_id, COMPLAINTS_PAGE_SIZE + 1)
+    return rows[:COMPLAINTS_PAGE_SIZE], len(rows) > COMPLAINTS_PAGE_SIZE
+
+
+def build_complaints_embed(query: Optional[str], rows: Sequence[asyncpg.Record], page: int) -> discord.Embed:
+    embed = discord.Embed(
+        title=f'Жалобы: «{query}»' if query else 'Жалобы',
+        color=discord.Color.orange(),
+    )
+    if not rows:
+        embed.description = 'Ничего не найдено.'
+    for row in rows:
+        header = [f'#{row["id"]}', discord.utils.format_dt(row["created_at"], "f"), f'<@{row["author_id"]}>']
+        if row["voice_channel_id"]:
+            header.append(f'<#{row["voice_channel_id"]}>')
+        embed.add_field(name=' · '.join(header), value=row["snippet"][:1024] or '—', inline=False)
+    embed.set_footer(text=f'Страница {page}')
+    return embed
+
+
+class ComplaintsPageView(discord.ui.View):
+    """Листание результатов поиска; курсор — id последней показанной жалобы."""
+
+    def __init__(
+        self,
+        guild_id: int,
+        query: Optional[str],
+        author_id: Optional[int],
+        last_id: int,
+        owner_id: int,
+    ) -> None:
+        super().__init__(timeout=PAGE_TIMEOUT)
+        self.guild_id = guild_id
+        self.query = query
+        self.author_id = author_id
+        self.last_id = last_id
+        self.owner_id = owner_id
+        self.page = 1
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.owner_id
+
+    @discord.ui.button(label='Дальше', style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        try:
+            rows, has_more = await fetch_complaints_page(self.guild_id, self.query, self.author_id, self.last_id)
+        except DatabaseUnavailable:
+            await notify_database_unavailable(interaction)
+            return
+        self.page += 1
+        if rows:
+            self.last_id = rows[-1]["id"]
+        button.disabled = not has_more
+        if not has_more:
+            self.stop()
+        await interaction.response.edit_message(
+            embed=build_complaints_embed(self.query, rows, self.page),
+            view=self,
+        )
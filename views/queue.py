@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import discord
+
+QUEUE_JOIN = "join"
+QUEUE_LEAVE = "leave"
+
+
+class QueueButton(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"hatori:queue:(?P<action>join|leave):(?P<game>.+)",
+):
+    def __init__(self, action: str, game: str) -> None:
+        joining = action == QUEUE_JOIN
+        super().__init__(
+            discord.ui.Button(
+                label="Встать в очередь" if joining else "Покинуть очередь",
+                style=discord.ButtonStyle.success if joining else discord.ButtonStyle.secondary,
+                custom_id=f"hatori:queue:{action}:{game}",
+            )
+        )
+        self.action = action
+        self.game = game
+
+    @classmethod
+    async def from_custom_id(
+        cls,
+        interaction: discord.Interaction,
+        item: discord.ui.Button,
+        match,
+    ) -> "QueueButton":
+        return cls(match["action"], match["game"])
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        cog = interaction.client.get_cog("Matchmaking")  # type: ignore[union-attr]
+        if cog is None:
+            await interaction.response.send_message("Очередь подбора недоступна.", ephemeral=True)
+            return
+        if interaction.guild_id is None:
+            await interaction.response.send_message("Очередь доступна только на сервере.", ephemeral=True)
+            return
+        # Гильдия берется из нажатия: одна и та же кнопка есть в разных гильдиях
+        if self.action == QUEUE_JOIN:
+            message = await cog.join_queue(interaction.user.id, interaction.guild_id, self.game)
+        else:
+            message = cog.leave_queue(interaction.user.id)
+        await interaction.response.send_message(message, ephemeral=True)
+
+
+def build_queue_view(game: str) -> discord.ui.View:
+    view = discord.ui.View(timeout=None)
+    view.add_item(QueueButton(QUEUE_JOIN, game))
+    view.add_item(QueueButton(QUEUE_LEAVE, game))
+    return view
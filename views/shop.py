@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from typing import Awaitable, Callable, Sequence
+
+import discord
+
+SHOP_SELECT_CUSTOM_ID = "hatori:shop:select"
+
+SelectCallback = Callable[[discord.Interaction, str], Awaitable[None]]
+
+
+class ShopView(discord.ui.View):
+    def __init__(self, options: Sequence[discord.SelectOption], on_select: SelectCallback) -> None:
+        super().__init__(timeout=None)
+        self._on_select = on_select
+        self.select = discord.ui.Select(
+            custom_id=SHOP_SELECT_CUSTOM_ID,
+            placeholder="Выберите товар",
+            min_values=1,
+            max_values=1,
+            options=list(options),
+        )
+        self.select.callback = self._handle_select
+        self.add_item(self.select)
+
+    async def _handle_select(self, interaction: discord.Interaction) -> None:
+        # Один экземпляр обслуживает всех пользователей, поэтому значение
+        # берется из данных взаимодействия, а не из общего состояния Select
+        values = (interaction.data or {}).get("values") or []
+        if not values:
+            return
+        await self._on_select(interaction, values[0])
@@ -1,39 +1,37 @@
 from __future__ import annotations
 
+import logging
 import math
 import time
 from typing import Dict, Tuple
 
 import discord
 
-from HatoriBotPy.config import settings
+from HatoriBotPy.db import DatabaseUnavailable, create_complaint
+from HatoriBotPy.digest import admin_alerts
+from HatoriBotPy.entities import entities
+from HatoriBotPy.guild_config import guild_configs
+from HatoriBotPy.interactions import fast_ack, respond
 
 
 
-_action_cooldowns: Dict[Tuple[int, str], float] = {}
+logger = logging.getLogger("HatoriBotPy.voice")
 
+_action_cooldowns: Dict[Tuple[int | None, int, str], float] = {}
 
-async def _send_admin_alert(client: discord.Client, embed: discord.Embed, *, content: str | None = None) -> None:
-    cid = settings.ADMIN_ALERT_CHANNEL_ID
-    if not cid:
+
+def _send_admin_alert(guild_id: int, embed: discord.Embed, *, content: str | None = None, urgent: bool = False) -> None:
+    #Жалобы уходят сводкой, вызов администрации отправляется сразу
+    if entities.get(guild_id).admin_alert_channel is None:
         return
-    channel = client.get_channel(cid)
-    if channel is None:
-        try:
-            channel = await client.fetch_channel(cid)
-        except Exception:
-            return
-    if isinstance(channel, discord.TextChannel):
-        try:
-            await channel.send(content=content, embed=embed.copy())
-        except Exception:
-            pass
+    admin_alerts.add_embed(guild_id, embed, content=content, urgent=urgent)
 
 
-def _check_cooldown(user_id: int, action: str) -> tuple[bool, float]:
+def _check_cooldown(guild_id: int | None, user_id: int, action: str) -> tuple[bool, float]:
     now = time.monotonic()
-    cooldown = settings.ADMIN_NOTICE_COOLDOWN
-    key = (user_id, action)
+    cooldown = guild_configs.get(guild_id).admin_notice_cooldown
+    # Пауза своя в каждой гильдии: у гильдий своя длительность и своя администрация
+    key = (guild_id, user_id, action)
     last = _action_cooldowns.get(key)
     if last is not None and now - last < cooldown:
         return False, cooldown - (now - last)
@@ -41,8 +39,14 @@ def _check_cooldown(user_id: int, action: str) -> tuple[bool, float]:
     return True, 0.0
 
 
+VOICE_CALL_ADMINS_ID = 'hatori:voice:call_admins'
+VOICE_COMPLAINT_ID = 'hatori:voice:complaint'
+
+
 class ComplaintModal(discord.ui.Modal):
     def __init__(self):
+        #Без фиксированного custom_id: discord.py хранит одну форму на id, и
+        #одновременно открытые формы разных пользователей вытесняли бы друг друга
         super().__init__( title='Жалоба')
         self.details = discord.ui.TextInput(
             label = 'Опишите вашу жалобу',
@@ -54,15 +58,15 @@ class ComplaintModal(discord.ui.Modal):
         self.add_item(self.details)
         
         
+    @fast_ack("ComplaintModal.on_submit")
     async def on_submit(self, interaction: discord.Interaction):
-        cid = settings.COMPLAINTS_CHANNEL_ID
-        if not cid:
-            await interaction.response.send_message('Канал для жалоб не настроен.', ephemeral = True)
+        if not guild_configs.get(interaction.guild_id).complaints_channel_id:
+            await respond(interaction, 'Канал для жалоб не настроен.', ephemeral = True)
             return
         
-        channel = interaction.client.get_channel(cid)
+        channel = entities.get(interaction.guild_id).complaints_channel
         if channel is None:
-            await interaction.response.send_message('Канал для жалоб не найден.', ephemeral = True)
+            await respond(interaction, 'Канал для жалоб не найден.', ephemeral = True)
             return
         
         embed = discord.Embed(
@@ -75,35 +79,56 @@ class ComplaintModal(discord.ui.Modal):
             name = str(interaction.user),
             icon_url = interaction.user.display_avatar.url
         )
-        
+
+        #Жалоба сохраняется для поиска; без базы она все равно уходит в канал
+        voice_channel = interaction.channel if isinstance(interaction.channel, discord.VoiceChannel) else None
+        if voice_channel is None:
+            voice_channel = getattr(getattr(interaction.user, "voice", None), "channel", None)
+        try:
+            complaint_id = await create_complaint(
+                interaction.guild_id,
+                interaction.user.id,
+                voice_channel.id if voice_channel else None,
+                self.details.value,
+            )
+            embed.set_footer(text = f'Жалоба #{complaint_id}')
+        except DatabaseUnavailable:
+            logger.warning("Жалоба пользователя %s не сохранена: база недоступна", interaction.user.id)
+        if voice_channel:
+            embed.add_field(name = 'Голосовой канал', value = voice_channel.mention, inline = False)
+
         await channel.send(embed = embed)
-        await _send_admin_alert(interaction.client, embed)
-        await interaction.response.send_message("✅ Жалоба отправлена администрации.", ephemeral=True)
+        _send_admin_alert(interaction.guild_id, embed)
+        await respond(interaction, "✅ Жалоба отправлена администрации.", ephemeral=True)
         
         
 class VoiceWelcomeView(discord.ui.View):
-    def __init__(self, *, timeout: float | None = 180):
-        super().__init__(timeout = timeout)
+    #Постоянное представление: один экземпляр регистрируется через bot.add_view
+    #и обслуживает кнопки во всех голосовых каналах без ограничения по времени
+    def __init__(self):
+        super().__init__(timeout = None)
         
-    @discord.ui.button(label = 'Вызвать администрацию', style = discord.ButtonStyle.danger)
+    @discord.ui.button(label = 'Вызвать администрацию', style = discord.ButtonStyle.danger, custom_id = VOICE_CALL_ADMINS_ID)
+    @fast_ack("VoiceWelcomeView.call_admins")
     async def call_admins(self, interaction: discord.Interaction, button: discord.ui.Button):
-        rid = settings.ADMIN_ROLE_ID
+        rid = guild_configs.get(interaction.guild_id).admin_role_id
         if not rid:
-            await interaction.response.send_message('Роль администраторов не настроена', ephemeral = True)
+            await respond(interaction, 'Роль администраторов не настроена', ephemeral = True)
             return
         guild = interaction.guild
         if not guild:
-            await interaction.response.send_message('Эта команда доступна только на сервере', ephemeral = True)
+            await respond(interaction, 'Эта команда доступна только на сервере', ephemeral = True)
             return
         
-        role = guild.get_role(rid)
-        if not role:
-            await interaction.response.send_message('Роль администраторов не найдена.', ephemeral = True)
+        role = entities.get(guild.id).admin_role
+        if not role or role.guild.id != guild.id:
+            await respond(interaction, 'Роль администраторов не найдена.', ephemeral = True)
             return
         
-        allowed, remaining = _check_cooldown(interaction.user.id, "call_admins")
+        allowed, remaining = _check_cooldown(interaction.guild_id, interaction.user.id, "call_admins")
         if not allowed:
-            await interaction.response.send_message(
+            await respond(
+                interaction,
                 f'Эту кнопку можно использовать снова через {math.ceil(remaining)} секунд.',
                 ephemeral=True,
             )
@@ -127,11 +152,11 @@ class VoiceWelcomeView(discord.ui.View):
 
         try:
             await interaction.channel.send(f'{admin_mention}', embed = embed)
-            await interaction.response.send_message("✅ Администрация уведомлена.", ephemeral=True)
+            await respond(interaction, "✅ Администрация уведомлена.", ephemeral=True)
         except Exception:
-            await interaction.response.send_message("❌ Не удалось уведомить администрацию.", ephemeral=True)
+            await respond(interaction, "❌ Не удалось уведомить администрацию.", ephemeral=True)
 
-        for member in role.members:
+        for member in await interaction.client.member_resolver.role_members(guild, rid):
             if member.bot:
                 continue
             try:
@@ -145,11 +170,11 @@ class VoiceWelcomeView(discord.ui.View):
             except Exception:
                 continue
 
-        await _send_admin_alert(interaction.client, embed, content=admin_mention)
+        _send_admin_alert(guild.id, embed, content=admin_mention, urgent=True)
             
-    @discord.ui.button(label = 'Подать жалобу', style = discord.ButtonStyle.primary)
+    @discord.ui.button(label = 'Подать жалобу', style = discord.ButtonStyle.primary, custom_id = VOICE_COMPLAINT_ID)
     async def complaint(self, interaction: discord.Interaction, button: discord.ui.Button):
-        allowed, remaining = _check_cooldown(interaction.user.id, "complaint")
+        allowed, remaining = _check_cooldown(interaction.guild_id, interaction.user.id, "complaint")
         if not allowed:
             await interaction.response.send_message(
                 f'Эту кнопку можно использовать снова через {math.ceil(remaining)} секунд.',